@@ -11,11 +11,10 @@ from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 from dotenv import load_dotenv
-from flask import Flask, render_template
+from flask import Flask, jsonify, make_response, render_template, request
 from flask_login import LoginManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_wtf.csrf import CSRFProtect
 
@@ -29,18 +28,31 @@ from qrapp.models import db
 
 # Initialize other extensions
 login_manager = LoginManager()
-migrate = Migrate()
 cors = CORS()
 
 from qrapp.limiter import limiter
 from qrapp.csrf import csrf
-
-
-def create_app() -> Flask:
-    """Application factory: builds and configures the Flask app instance."""
+from qrapp.history_cache import history_cache
+from qrapp.budget import render_budget
+from qrapp.frames import frame_cache
+from qrapp.counters import download_counter, click_counter
+from qrapp.dynamic import link_cache
+from qrapp.passwords import password_hasher
+from qrapp.admission import load_shedder
+from qrapp.user_cache import user_cache
+from qrapp.database import engine_options, install_sqlite_pragmas, group_writer
+
+
+def create_app(instance_path: str | None = None) -> Flask:
+    """
+    Application factory: builds and configures the Flask app instance.
+    `instance_path` (or QR_INSTANCE_PATH) relocates instance/, e.g. for tests
+    and load runs against a throwaway folder.
+    """
     load_dotenv()
 
-    app = Flask(__name__, instance_relative_config=True)
+    instance_path = instance_path or os.getenv("QR_INSTANCE_PATH") or None
+    app = Flask(__name__, instance_path=instance_path, instance_relative_config=True)
 
     # Core config with safe defaults
     max_upload_mb = int(os.getenv("MAX_UPLOAD_MB", "5"))
@@ -53,25 +65,113 @@ def create_app() -> Flask:
         UPLOAD_FOLDER=os.path.join(app.instance_path, "uploads"),
         GENERATED_FOLDER=os.path.join(app.instance_path, "generated"),
         LOG_FOLDER=os.path.join(app.instance_path, "logs"),
+        METRICS_FOLDER=os.getenv("METRICS_DIR", os.path.join(app.instance_path, "metrics")),
+        STAGE_TIMING_ENABLED=os.getenv("STAGE_TIMING_ENABLED", "true").lower() == "true",
+        PROFILE_FOLDER=os.path.join(app.instance_path, "logs", "profiles"),
+        PROFILE_SAMPLE_RATE=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        PROFILE_TOKEN=os.getenv("PROFILE_TOKEN", ""),
+        PROFILE_TRACEMALLOC=os.getenv("PROFILE_TRACEMALLOC", "false").lower() == "true",
+        PROFILE_KEEP=int(os.getenv("PROFILE_KEEP", "50")),
+        NATIVE_ENCODER_ENABLED=os.getenv("NATIVE_ENCODER_ENABLED", "true").lower() == "true",
+        QR_OPTIMAL_SEGMENTS=os.getenv("QR_OPTIMAL_SEGMENTS", "true").lower() == "true",
+        QR_UPPERCASE_URL_HOST=os.getenv("QR_UPPERCASE_URL_HOST", "false").lower() == "true",
+        # Kanji mode only for Japanese script; other Shift JIS characters stay in byte mode
+        QR_KANJI_SEGMENTS=os.getenv("QR_KANJI_SEGMENTS", "true").lower() == "true",
+        SINGLE_FLIGHT_ENABLED=os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true",
+        SINGLE_FLIGHT_CROSS_WORKER=os.getenv("SINGLE_FLIGHT_CROSS_WORKER", "false").lower() == "true",
+        RENDER_SHARE_FOLDER=os.path.join(app.instance_path, "cache", "renders"),
+        RENDER_SHARE_TTL=float(os.getenv("RENDER_SHARE_TTL", "10")),
+        RENDER_MEMORY_BUDGET_MB=float(os.getenv("RENDER_MEMORY_BUDGET_MB", "512")),
+        RENDER_MEMORY_WAIT_SECONDS=float(os.getenv("RENDER_MEMORY_WAIT_SECONDS", "30")),
+        FRAME_CACHE_MB=int(os.getenv("FRAME_CACHE_MB", "256")),
+        COUNTER_BATCHING=os.getenv("COUNTER_BATCHING", "true").lower() == "true",
+        COUNTER_FLUSH_SECONDS=float(os.getenv("COUNTER_FLUSH_SECONDS", "5")),
+        COUNTER_MAX_PENDING=int(os.getenv("COUNTER_MAX_PENDING", "1000")),
+        IDEMPOTENCY_FOLDER=os.path.join(app.instance_path, "cache", "idempotency"),
+        IDEMPOTENCY_TTL=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+        # Shared renders and idempotency records are expired off the request
+        # path, at most this often per worker
+        CACHE_SWEEP_SECONDS=float(os.getenv("CACHE_SWEEP_SECONDS", "300")),
+        HISTORY_VERSION_FOLDER=os.path.join(app.instance_path, "cache", "history"),
+        HISTORY_CACHE_SIZE=int(os.getenv("HISTORY_CACHE_SIZE", "2048")),
+        # Any werkzeug method string; stored hashes are upgraded on login
+        PASSWORD_HASH_METHOD=os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1"),
+        # Hashes running at once across all workers of the host
+        PASSWORD_HASH_WORKERS=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+        PASSWORD_HASH_QUEUE=int(os.getenv("PASSWORD_HASH_QUEUE", "32")),
+        PASSWORD_HASH_WAIT_SECONDS=float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "5")),
+        PASSWORD_HASH_SLOT_FOLDER=os.path.join(app.instance_path, "cache", "password-slots"),
+        LINK_VERSION_FOLDER=os.path.join(app.instance_path, "cache", "links"),
+        LINK_CACHE_SIZE=int(os.getenv("LINK_CACHE_SIZE", "10000")),
+        # Public origin for dynamic-code short URLs; defaults to the request host
+        DYNAMIC_BASE_URL=os.getenv("DYNAMIC_BASE_URL", ""),
+        # Most render cost units (labels x admission.render_cost of their size)
+        # one /api/labels request may lay out; ~12ms per unit, so the default
+        # streams in about 30s, well inside the worker timeout
+        LABELS_MAX_COST=int(os.getenv("LABELS_MAX_COST", "2500")),
+        USER_CACHE_TTL=float(os.getenv("USER_CACHE_TTL", "60")),
+        USER_CACHE_SIZE=int(os.getenv("USER_CACHE_SIZE", "1024")),
+        USER_SESSION_FASTPATH=os.getenv("USER_SESSION_FASTPATH", "false").lower() == "true",
+        USER_SESSION_MAX_AGE=int(os.getenv("USER_SESSION_MAX_AGE", "300")),
         CLEANUP_MAX_AGE_HOURS=cleanup_hours,
+        WARMUP_ON_START=os.getenv("WARMUP_ON_START", "false").lower() == "true",
         ALLOWED_EXTENSIONS={"png", "jpg", "jpeg", "webp"},
         PREFERRED_URL_SCHEME="http",
         TEMPLATES_AUTO_RELOAD=True,
         SQLALCHEMY_DATABASE_URI=database_url,
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLITE_SYNCHRONOUS=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+        SQLITE_BUSY_TIMEOUT_MS=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        DB_POOL_SIZE=int(os.getenv("DB_POOL_SIZE", "5")),
+        DB_MAX_OVERFLOW=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        DB_POOL_TIMEOUT=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        DB_POOL_RECYCLE=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        DB_GROUP_COMMIT=os.getenv("DB_GROUP_COMMIT", "false").lower() == "true",
+        DB_GROUP_COMMIT_WINDOW_MS=float(os.getenv("DB_GROUP_COMMIT_WINDOW_MS", "5")),
+        DB_GROUP_COMMIT_MAX_BATCH=int(os.getenv("DB_GROUP_COMMIT_MAX_BATCH", "256")),
         WTF_CSRF_ENABLED=True,
+        RATELIMIT_ENABLED=os.getenv("RATELIMIT_ENABLED", "true").lower() == "true",
+        RATELIMIT_DEFAULT_LIMIT=os.getenv("RATELIMIT_DEFAULT_LIMIT", ""),
+        RATELIMIT_GENERATE_LIMIT=os.getenv("RATELIMIT_GENERATE_LIMIT", ""),
+        RATELIMIT_GENERATE_COST_LIMIT=os.getenv("RATELIMIT_GENERATE_COST_LIMIT", ""),
+        RATELIMIT_PREVIEW_LIMIT=os.getenv("RATELIMIT_PREVIEW_LIMIT", ""),
+        # moving-window only charges admitted requests, so retried large renders
+        # do not drain a user's cost budget the way fixed windows would
+        RATELIMIT_STRATEGY=os.getenv("RATELIMIT_STRATEGY", "moving-window"),
+        RATELIMIT_HEADERS_ENABLED=os.getenv("RATELIMIT_HEADERS_ENABLED", "true").lower() == "true",
+        SHED_MAX_IN_FLIGHT=int(os.getenv("SHED_MAX_IN_FLIGHT", "32")),
+        SHED_MAX_LATENCY_MS=float(os.getenv("SHED_MAX_LATENCY_MS", "5000")),
+        SHED_LATENCY_WINDOW_SECONDS=float(os.getenv("SHED_LATENCY_WINDOW_SECONDS", "10")),
+        SHED_LATENCY_QUANTILE=float(os.getenv("SHED_LATENCY_QUANTILE", "0.95")),
+        SHED_RETRY_AFTER_SECONDS=int(os.getenv("SHED_RETRY_AFTER_SECONDS", "2")),
     )
 
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+
     # Ensure instance/ subdirs exist
     for key in ("UPLOAD_FOLDER", "GENERATED_FOLDER", "LOG_FOLDER"):
         os.makedirs(app.config[key], exist_ok=True)
 
     # Initialize extensions
     db.init_app(app)
+    install_sqlite_pragmas(app)
+    group_writer.init_app(app)
+    download_counter.init_app(app)
+    click_counter.init_app(app)
     login_manager.init_app(app)
+    password_hasher.init_app(app)
     limiter.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate pulls in Alembic, a large share of import time, and only
+    # the `flask db` commands need it, so it is skipped when serving.
+    if os.getenv("FLASK_RUN_FROM_CLI") == "true":
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations"))
     csrf.init_app(app)
+    history_cache.init_app(app)
+    link_cache.init_app(app)
+    render_budget.init_app(app)
+    frame_cache.init_app(app)
+    load_shedder.init_app(app)
     
     # Configure CORS with proper settings for credentials
     cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
@@ -84,9 +184,11 @@ def create_app() -> Flask:
     # Import models after db init
     from qrapp.models import User, QRCode
 
+    user_cache.init_app(app, User)
+
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))  # Updated syntax
+        return user_cache.load(user_id)
 
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -127,9 +229,12 @@ def create_app() -> Flask:
     app.register_blueprint(auth_bp, url_prefix='/auth')
 
     # ---- Setup monitoring and health checks ----
-    from qrapp.monitoring import setup_health_check, monitor_requests
+    from qrapp.monitoring import setup_health_check, monitor_requests, metrics
+    metrics.init_app(app)
     setup_health_check(app)
     monitor_requests(app)
+    from qrapp.profiling import setup_profiling
+    setup_profiling(app)
 
     # ---- Error handlers ----
     @app.errorhandler(400)
@@ -144,6 +249,17 @@ def create_app() -> Flask:
     def too_large(e):
         return render_template("400.html", error="Uploaded file is too large."), 413
 
+    @app.errorhandler(503)
+    def unavailable(e):
+        if request.path.startswith("/api/") or request.accept_mimetypes.best == "application/json":
+            resp = jsonify({"error": e.description})
+        else:
+            resp = make_response(render_template("500.html", error=e.description))
+        resp.status_code = 503
+        if getattr(e, "retry_after", None):
+            resp.headers["Retry-After"] = str(e.retry_after)
+        return resp
+
     @app.errorhandler(500)
     def server_error(e):
         app.logger.exception("Unhandled server error: %s", e)
@@ -158,6 +274,10 @@ def create_app() -> Flask:
     def init_db():
         """Initialize the database."""
         db.create_all()
+        # The tables are already at the latest revision; record that so a
+        # later `flask db upgrade` only applies newer migrations
+        from flask_migrate import stamp
+        stamp()
         print("Database initialized.")
 
     @app.cli.command("create-admin")
@@ -171,6 +291,16 @@ def create_app() -> Flask:
         db.session.commit()
         print(f"Admin user {username} created.")
 
+    from qrapp.batch import generate_batch_command
+    app.cli.add_command(generate_batch_command)
+    from qrapp.labels import label_sheet_command
+    app.cli.add_command(label_sheet_command)
+
+    # Without a preloading gunicorn master (see gunicorn.conf.py), warm up here.
+    if app.config["WARMUP_ON_START"]:
+        from qrapp.warmup import warmup
+        warmup(app)
+
     return app
 
 
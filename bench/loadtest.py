@@ -0,0 +1,365 @@
+"""
+loadtest.py — local end-to-end load test for the HTTP API
+
+Boots the app from create_app() against a throwaway instance folder (or
+targets an already running server with --url), registers synthetic users,
+then drives a weighted mix of endpoints and reports throughput, latency
+percentiles and error rates.
+
+    # closed loop: 16 concurrent clients for 30s against an in-process server
+    python bench/loadtest.py --concurrency 16 --duration 30
+
+    # open loop: 200 req/s arrivals against 4 gunicorn workers
+    python bench/loadtest.py --gunicorn 4 --rate 200 --duration 60
+
+    # custom endpoint mix, limiter caps raised instead of disabled
+    python bench/loadtest.py --mix generate=1,download=4,history=4,dashboard=1 --limiter raise
+
+Open-loop latencies are measured from each request's scheduled start, so a
+saturated server shows up as growing latency rather than a lower send rate.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+DEFAULT_MIX = "generate=1,download=4,history=4,dashboard=1"
+RAISED_LIMIT = "1000000 per minute"
+
+
+class Client:
+    """One synthetic user: a keep-alive connection plus its session cookie."""
+
+    def __init__(self, base_url: str, username: str):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.username = username
+        self.cookies = {}
+        self.qr_ids = []
+        self._conn = None
+
+    def request(self, method: str, path: str, body=None):
+        headers = {"Accept": "application/json"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self._conn.request(method, path, body=payload, headers=headers)
+                resp = self._conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+        for header, value in resp.getheaders():
+            if header.lower() == "set-cookie":
+                name, _, rest = value.partition("=")
+                self.cookies[name] = rest.split(";", 1)[0]
+        if resp.getheader("Connection", "").lower() == "close":
+            self._conn.close()
+            self._conn = None
+        return resp.status, data
+
+
+def op_generate(client: Client):
+    status, data = client.request("POST", "/api/generate", {
+        "content": f"https://example.com/{client.username}/{random.randrange(10**9)}",
+        "size_px": 512, "error_correction": "M",
+    })
+    if status == 201:
+        client.qr_ids.append(json.loads(data)["id"])
+        del client.qr_ids[:-50]
+    return status
+
+
+def op_download(client: Client):
+    if not client.qr_ids:
+        return op_generate(client)
+    return client.request("GET", f"/api/qr/{random.choice(client.qr_ids)}/download")[0]
+
+
+def op_history(client: Client):
+    return client.request("GET", "/api/qr/user?page=1&limit=10")[0]
+
+
+def op_dashboard(client: Client):
+    return client.request("GET", "/api/dashboard")[0]
+
+
+OPERATIONS = {
+    "generate": op_generate,
+    "download": op_download,
+    "history": op_history,
+    "dashboard": op_dashboard,
+}
+
+
+def parse_mix(text: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, op: str, latency: float, status):
+        with self._lock:
+            self.samples.setdefault(op, []).append(latency)
+            key = str(status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors += 1
+
+
+def run_op(client: Client, op: str, recorder: Recorder, scheduled: float):
+    try:
+        status = OPERATIONS[op](client)
+    except Exception as e:
+        status = type(e).__name__
+    recorder.record(op, time.perf_counter() - scheduled, status)
+
+
+def closed_loop(clients, mix, duration, recorder):
+    names, weights = zip(*mix)
+    stop = time.perf_counter() + duration
+
+    def worker(client):
+        while time.perf_counter() < stop:
+            op = random.choices(names, weights)[0]
+            run_op(client, op, recorder, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def open_loop(clients, mix, duration, rate, recorder, poisson=True):
+    names, weights = zip(*mix)
+    # one in-flight request per synthetic user keeps cookie jars consistent
+    idle = list(clients)
+    idle_lock = threading.Condition()
+
+    def dispatch(op, scheduled):
+        with idle_lock:
+            while not idle:
+                idle_lock.wait()
+            client = idle.pop()
+        try:
+            run_op(client, op, recorder, scheduled)
+        finally:
+            with idle_lock:
+                idle.append(client)
+                idle_lock.notify()
+
+    start = time.perf_counter()
+    next_at = start
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        while next_at < start + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(dispatch, random.choices(names, weights)[0], next_at)
+            next_at += random.expovariate(rate) if poisson else 1.0 / rate
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def report(recorder: Recorder, elapsed: float) -> dict:
+    summary = {"elapsed_s": elapsed, "operations": {}, "statuses": recorder.statuses}
+    all_samples = []
+    for op, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        all_samples.extend(samples)
+        summary["operations"][op] = {
+            "count": len(samples),
+            "rps": len(samples) / elapsed,
+            "p50_ms": _percentile(samples, 0.50) * 1000,
+            "p99_ms": _percentile(samples, 0.99) * 1000,
+        }
+    all_samples.sort()
+    total = len(all_samples)
+    summary.update({
+        "requests": total,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(all_samples, 0.50) * 1000,
+        "p99_ms": _percentile(all_samples, 0.99) * 1000,
+        "error_rate": recorder.errors / total if total else 0.0,
+    })
+    return summary
+
+
+def print_report(summary: dict):
+    print(f"\n{'operation':<12} {'count':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for op, s in summary["operations"].items():
+        print(f"{op:<12} {s['count']:>8} {s['rps']:>9.1f} {s['p50_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    print(f"{'total':<12} {summary['requests']:>8} {summary['rps']:>9.1f} "
+          f"{summary['p50_ms']:>9.2f} {summary['p99_ms']:>9.2f}")
+    print(f"error rate: {summary['error_rate']:.2%}  statuses: {summary['statuses']}")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 30.0):
+    parts = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server at {url} did not become healthy")
+
+
+def boot_server(args, instance: str):
+    """Prepare a temp instance + DB and start the app; returns (url, stop)."""
+    env = {
+        "QR_INSTANCE_PATH": instance,
+        "DATABASE_URL": f"sqlite:///{os.path.join(instance, 'app.db')}",
+    }
+    if args.limiter == "off":
+        env["RATELIMIT_ENABLED"] = "false"
+    elif args.limiter == "raise":
+        env["RATELIMIT_DEFAULT_LIMIT"] = RAISED_LIMIT
+        env["RATELIMIT_GENERATE_LIMIT"] = RAISED_LIMIT
+        env["RATELIMIT_GENERATE_COST_LIMIT"] = RAISED_LIMIT
+    os.environ.update(env)
+
+    from app import create_app
+    from qrapp.models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    if args.gunicorn:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--workers", str(args.gunicorn),
+             "--threads", str(args.threads), "--bind", f"127.0.0.1:{port}",
+             "--log-level", "warning", "app:create_app()"],
+            cwd=str(ROOT), env=dict(os.environ),
+        )
+        _wait_for(url)
+        return url, proc.terminate
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _wait_for(url)
+    return url, server.shutdown
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target an already running server instead of booting one")
+    parser.add_argument("--gunicorn", type=int, default=0, metavar="WORKERS",
+                        help="boot gunicorn with this many workers (default: in-process server)")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--users", type=int, default=0, help="synthetic users (default: concurrency)")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients / open-loop max in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="open-loop arrivals per second (0 = closed loop)")
+    parser.add_argument("--uniform", action="store_true", help="fixed inter-arrival times instead of Poisson")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted operations (default: {DEFAULT_MIX})")
+    parser.add_argument("--limiter", choices=["raise", "off", "keep"], default="raise",
+                        help="raise the limiter caps (default), disable it, or keep production limits")
+    parser.add_argument("--json", help="also write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    instance = None
+    stop = None
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            instance = tempfile.mkdtemp(prefix="qr-loadtest-")
+            url, stop = boot_server(args, instance)
+
+        n_users = args.users or args.concurrency
+        run_id = random.randrange(16**6)
+        clients = [Client(url, f"load{run_id:06x}u{i}") for i in range(n_users)]
+        for client in clients:
+            status, _ = client.request("POST", "/auth/api/register",
+                                       {"username": client.username, "password": "loadtest-pw"})
+            if status != 200:
+                raise SystemExit(f"Could not register {client.username}: HTTP {status}")
+            op_generate(client)
+
+        mode = f"open loop {args.rate:g} req/s" if args.rate else f"closed loop x{args.concurrency}"
+        print(f"Target {url}: {mode}, {n_users} users, {args.duration:g}s, mix {args.mix}")
+        recorder = Recorder()
+        started = time.perf_counter()
+        if args.rate:
+            open_loop(clients, mix, args.duration, args.rate, recorder, poisson=not args.uniform)
+        else:
+            closed_loop(clients[:args.concurrency], mix, args.duration, recorder)
+        summary = report(recorder, time.perf_counter() - started)
+        print_report(summary)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(summary, f, indent=2)
+    finally:
+        if stop is not None:
+            stop()
+        if instance is not None:
+            shutil.rmtree(instance, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
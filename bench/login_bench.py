@@ -0,0 +1,107 @@
+"""
+login_bench.py — password verification throughput per hash parameter set
+
+For each werkzeug method string, verifies a stored hash in 1..N threads
+(hashlib releases the GIL, so threads use real cores) and reports
+logins/sec overall and per core, plus single-verify latency. Use it to pick
+PASSWORD_HASH_METHOD and PASSWORD_HASH_WORKERS for the login burst you
+expect. Runs offline; no database or server needed.
+
+    python bench/login_bench.py
+    python bench/login_bench.py --methods scrypt:16384:8:1 pbkdf2:sha256:600000 --threads 1 4
+    python bench/login_bench.py --seconds 5 --json bench/login.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+from qrapp.passwords import normalize_method  # noqa: E402
+
+DEFAULT_METHODS = [
+    "scrypt:32768:8:1",   # werkzeug default
+    "scrypt:16384:8:1",
+    "scrypt:8192:8:1",
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:260000",
+]
+
+
+def usable_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run_case(method: str, threads: int, seconds: float) -> dict:
+    pwhash = generate_password_hash("correct horse battery staple", normalize_method(method))
+    check_password_hash(pwhash, "correct horse battery staple")  # warm up
+    counts = [0] * threads
+    latencies = [[] for _ in range(threads)]
+    stop = time.perf_counter() + seconds
+
+    def work(i):
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            check_password_hash(pwhash, "correct horse battery staple")
+            latencies[i].append(time.perf_counter() - t0)
+            counts[i] += 1
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    lat = sorted(x for per in latencies for x in per)
+    rate = sum(counts) / elapsed
+    return {
+        "method": normalize_method(method),
+        "threads": threads,
+        "logins_per_s": round(rate, 1),
+        "logins_per_s_per_core": round(rate / min(threads, usable_cores()), 1),
+        "p50_ms": round(lat[len(lat) // 2] * 1000, 2),
+        "p95_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 2),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS, help="werkzeug hash method strings")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, usable_cores()],
+                        help="concurrent verifiers per case")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of each case")
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'method':<24} {'threads':>7} {'logins/s':>10} {'per core':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for method in args.methods:
+        for threads in sorted(set(args.threads)):
+            r = run_case(method, threads, args.seconds)
+            results.append(r)
+            print(f"{r['method']:<24} {r['threads']:>7} {r['logins_per_s']:>10} "
+                  f"{r['logins_per_s_per_core']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"cores": usable_cores(), "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
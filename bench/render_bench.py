@@ -0,0 +1,276 @@
+"""
+render_bench.py — micro-benchmarks for qrapp.utils.generate_qr_png
+
+Sweeps content length (QR version), error correction, size_px, rounded
+modules, logo size, module/eye styles with gradients, and frames, and
+reports ops/sec, latency percentiles and peak memory per case. Runs
+offline; no database or server needed.
+
+    python bench/render_bench.py                       # one-axis-at-a-time sweep
+    python bench/render_bench.py --grid --quick        # full cartesian grid, short runs
+    python bench/render_bench.py --save bench/baseline.json
+    python bench/render_bench.py --compare bench/baseline.json --threshold 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from flask import Flask  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from qrapp.frames import Frame, apply_frame  # noqa: E402
+from qrapp.utils import generate_qr_png  # noqa: E402
+
+BASE_CASE = dict(content_len=64, ec="M", size_px=512, rounded=0.0, logo=0, style="plain", frame="none")
+AXES = {
+    "content_len": [16, 100, 400, 1000],
+    "ec": ["L", "M", "Q", "H"],
+    "size_px": [128, 512, 1024, 2048, 4096],
+    "rounded": [0.0, 0.3],
+    "logo": [0, 10, 20, 30],
+    "style": ["plain", "circle", "circle+gradient"],
+    "frame": ["none", "simple", "neon"],
+}
+
+STYLES = {
+    "plain": {},
+    "circle": dict(pattern_style="circle", eye_style="circle"),
+    "circle+gradient": dict(pattern_style="circle", eye_style="circle", gradient_enabled=True,
+                            gradient_start="#ff0000", gradient_end="#0000ff"),
+}
+FRAMES = {
+    "none": None,
+    "simple": Frame("simple", 8, "#000000"),
+    "neon": Frame("neon", 8, "#00ff88"),
+}
+
+
+def make_content(length: int) -> str:
+    # URL-ish, deterministic, mixed case so it stays in byte mode
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_"
+    body = "".join(alphabet[(i * 7 + 3) % len(alphabet)] for i in range(max(0, length - 20)))
+    return ("https://example.com/" + body)[:length]
+
+
+def make_logo(folder: str) -> str:
+    path = os.path.join(folder, "bench-logo.png")
+    img = Image.new("RGBA", (512, 512))
+    draw = ImageDraw.Draw(img)
+    for y in range(0, 512, 8):
+        draw.rectangle((0, y, 511, y + 7), fill=(y // 2, 80, 255 - y // 2, 255))
+    draw.ellipse((96, 96, 416, 416), fill=(255, 255, 255, 255))
+    img.save(path)
+    return path
+
+
+def case_id(case: dict) -> str:
+    cid = "len={content_len},ec={ec},size={size_px},rounded={rounded},logo={logo}".format(**case)
+    # Appended only when set, so ids in older saved baselines still match
+    for axis in ("style", "frame"):
+        if case.get(axis, BASE_CASE[axis]) != BASE_CASE[axis]:
+            cid += f",{axis}={case[axis]}"
+    return cid
+
+
+def build_cases(grid: bool) -> list[dict]:
+    if grid:
+        keys = list(AXES)
+        return [dict(zip(keys, values)) for values in itertools.product(*AXES.values())]
+    cases, seen = [], set()
+    for axis, values in AXES.items():
+        for value in values:
+            case = dict(BASE_CASE, **{axis: value})
+            if case_id(case) not in seen:
+                seen.add(case_id(case))
+                cases.append(case)
+    return cases
+
+
+def render_once(case: dict, logo_path: str):
+    img = generate_qr_png(
+        data=make_content(case["content_len"]), size_px=case["size_px"],
+        error_correction=case["ec"], fg="#000000", bg="#FFFFFF", box_size=10,
+        border=4, rounded_ratio=case["rounded"],
+        logo_path=logo_path if case["logo"] else None,
+        logo_size_percent=case["logo"] or 20,
+        **STYLES[case.get("style", "plain")],
+    )
+    frame = FRAMES[case.get("frame", "none")]
+    return apply_frame(img, frame, "#FFFFFF") if frame else img
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = q * (len(sorted_values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _read_status(field: str) -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _memory_child(case, logo_path, conn):
+    app = Flask("render_bench")
+    with app.app_context():
+        # Reset the RSS high-water mark so the peak belongs to this render only.
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+        base = _read_status("VmRSS")
+        maxrss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        tracemalloc.start()
+        render_once(case, logo_path)
+        _, py_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        hwm = _read_status("VmHWM")
+        if base is not None and hwm is not None:
+            rss_peak = max(0, hwm - base)
+        else:
+            rss_peak = max(0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - maxrss_before)
+    conn.send({"peak_rss_bytes": rss_peak, "peak_python_bytes": py_peak})
+    conn.close()
+
+
+def measure_memory(case: dict, logo_path: str) -> dict:
+    """Run one render in a forked child and report its peak memory growth."""
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_memory_child, args=(case, logo_path, child))
+    proc.start()
+    result = parent.recv() if parent.poll(120) else {}
+    proc.join()
+    return result
+
+
+def run_case(case: dict, logo_path: str, min_time: float, min_runs: int, memory: bool = True) -> dict:
+    render_once(case, logo_path)  # warm-up
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        render_once(case, logo_path)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    result = {
+        "case": case,
+        "runs": len(timings),
+        "ops_per_sec": len(timings) / sum(timings),
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": _percentile(timings, 0.50) * 1000,
+        "p95_ms": _percentile(timings, 0.95) * 1000,
+        "p99_ms": _percentile(timings, 0.99) * 1000,
+        "min_ms": timings[0] * 1000,
+        "max_ms": timings[-1] * 1000,
+    }
+    if memory:
+        result.update(measure_memory(case, logo_path))
+    return result
+
+
+def environment() -> dict:
+    import PIL
+    import qrcode
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "qrcode": getattr(qrcode, "__version__", "unknown"),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return one message per case whose p50 regressed beyond `threshold`."""
+    regressions = []
+    for cid, base in baseline.get("cases", {}).items():
+        now = current["cases"].get(cid)
+        if now is None:
+            continue
+        ratio = now["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        if ratio > 1.0 + threshold:
+            regressions.append(f"{cid}: p50 {base['p50_ms']:.2f}ms -> {now['p50_ms']:.2f}ms (+{(ratio - 1) * 100:.0f}%)")
+        base_peak, now_peak = base.get("peak_rss_bytes"), now.get("peak_rss_bytes")
+        if base_peak and now_peak and now_peak > base_peak * (1.0 + threshold) and now_peak - base_peak > 4 * 1024 * 1024:
+            regressions.append(f"{cid}: peak RSS {base_peak / 2**20:.1f}MB -> {now_peak / 2**20:.1f}MB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", action="store_true", help="full cartesian product instead of one-axis sweeps")
+    parser.add_argument("--quick", action="store_true", help="short runs (smoke test / CI)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to sample each case")
+    parser.add_argument("--min-runs", type=int, default=5, help="minimum renders per case")
+    parser.add_argument("--filter", default="", help="only run cases whose id contains this text")
+    parser.add_argument("--no-memory", action="store_true", help="skip the forked peak-memory run")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before failing (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    min_time, min_runs = (0.05, 2) if args.quick else (args.min_time, args.min_runs)
+    cases = [c for c in build_cases(args.grid) if args.filter in case_id(c)]
+
+    app = Flask("render_bench")
+    results = {"environment": environment(), "cases": {}}
+    with tempfile.TemporaryDirectory() as tmp, app.app_context():
+        logo_path = make_logo(tmp)
+        print(f"{'case':<58} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>8}")
+        for case in cases:
+            r = run_case(case, logo_path, min_time, min_runs, memory=not args.no_memory)
+            results["cases"][case_id(case)] = r
+            peak = r.get("peak_rss_bytes")
+            peak_text = f"{peak / 2**20:8.1f}" if peak is not None else f"{'-':>8}"
+            print(f"{case_id(case):<58} {r['ops_per_sec']:9.1f} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {peak_text}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved {len(results['cases'])} cases to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+startup_bench.py — where does worker start-up time go?
+
+Runs a fresh interpreter that imports app, calls create_app() and renders a
+first and second code, and reports each phase plus the slowest imports
+(from `python -X importtime`).
+
+    python bench/startup_bench.py
+    python bench/startup_bench.py --top 30 --warmup
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app()
+t2 = time.perf_counter()
+warm = 0.0
+if {warmup!r}:
+    from qrapp.warmup import warmup
+    warm = warmup(app)
+from qrapp.utils import encode_png, generate_qr_png, png_to_data_uri
+timings = []
+with app.test_request_context("/"):
+    for _ in range(2):
+        s = time.perf_counter()
+        png_to_data_uri(encode_png(generate_qr_png(data="https://example.com/startup", size_px=512,
+                                   error_correction="M", fg="#000000", bg="#FFFFFF", box_size=10,
+                                   border=4, rounded_ratio=0.3)))
+        timings.append(time.perf_counter() - s)
+print("RESULT " + json.dumps({{"import_s": t1 - t0, "create_app_s": t2 - t1, "warmup_s": warm,
+                              "first_render_s": timings[0], "second_render_s": timings[1]}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--warmup", action="store_true", help="run qrapp.warmup before the first render")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as instance:
+        env = dict(os.environ, QR_INSTANCE_PATH=instance,
+                   DATABASE_URL=f"sqlite:///{os.path.join(instance, 'app.db')}")
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD.format(warmup=args.warmup)],
+            cwd=str(ROOT), env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        return proc.returncode
+
+    result = json.loads(next(l for l in proc.stdout.splitlines() if l.startswith("RESULT "))[7:])
+    for key, value in result.items():
+        print(f"{key:<18} {value * 1000:9.1f} ms")
+
+    rows = parse_importtime(proc.stderr)
+    print(f"\nTop {args.top} imports by cumulative time:")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
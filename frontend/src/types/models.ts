@@ -12,6 +12,7 @@ export interface QRCode {
   user_id?: number;
   user?: User;
   download_url?: string; // Optional download URL from API responses
+  thumbnail_url?: string; // Small cached rendition for listings
 }
 
 // Enhanced QR Form Data with advanced customization
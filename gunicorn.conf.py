@@ -0,0 +1,53 @@
+"""
+gunicorn.conf.py — picked up automatically by `gunicorn app:create_app()`.
+
+The app is loaded once in the master (preload) and warmed up there, so
+freshly forked workers start with imports, Pillow/qrcode tables and the
+warm-up renders already in memory, shared copy-on-write.
+Set GUNICORN_PRELOAD=false to load the app per worker instead.
+"""
+
+import os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def _metrics_folder(server):
+    if preload_app:
+        return server.app.wsgi().config["METRICS_FOLDER"]
+    # create_app's default, without loading the app in the master
+    instance = os.getenv("QR_INSTANCE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+    return os.getenv("METRICS_DIR") or os.path.join(instance, "metrics")
+
+
+def on_starting(server):
+    # Per-process metric files of a previous run would be summed forever
+    from qrapp.monitoring import clear_metric_files
+    clear_metric_files(_metrics_folder(server))
+
+
+def when_ready(server):
+    # Runs in the master after the (preloaded) app is imported, before fork.
+    if not preload_app or os.getenv("GUNICORN_WARMUP", "true").lower() != "true":
+        return
+    from qrapp.warmup import warmup
+    from qrapp.monitoring import metrics, mark_process_dead
+    warmup(server.app.wsgi())
+    # The master serves no requests; archive what warm-up recorded and drop its file
+    metrics.close()
+    mark_process_dead(_metrics_folder(server), os.getpid())
+
+
+def child_exit(server, worker):
+    from qrapp.monitoring import mark_process_dead
+    mark_process_dead(_metrics_folder(server), worker.pid)
+
+
+def post_fork(server, worker):
+    # Never share DB connections opened in the master with a worker.
+    if not preload_app:
+        return
+    from qrapp.models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,29 @@
+"""qr_code downloads counter
+
+Revision ID: 2db05117c235
+Revises: ed28ac4c85c9
+Create Date: 2026-10-19 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2db05117c235'
+down_revision = 'ed28ac4c85c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # server_default fills existing rows, so the column can be NOT NULL on SQLite too
+    with op.batch_alter_table('qr_code', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('downloads', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_qr_code_user_downloads', ['user_id', 'downloads'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('qr_code', schema=None) as batch_op:
+        batch_op.drop_index('ix_qr_code_user_downloads')
+        batch_op.drop_column('downloads')
@@ -0,0 +1,32 @@
+"""dynamic codes: slug, target and clicks
+
+Revision ID: ff83de00234f
+Revises: 2db05117c235
+Create Date: 2026-10-19 10:42:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ff83de00234f'
+down_revision = '2db05117c235'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('qr_code', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slug', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('target', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('clicks', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_qr_code_slug', ['slug'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('qr_code', schema=None) as batch_op:
+        batch_op.drop_index('ix_qr_code_slug')
+        batch_op.drop_column('clicks')
+        batch_op.drop_column('target')
+        batch_op.drop_column('slug')
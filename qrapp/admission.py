@@ -0,0 +1,138 @@
+import collections
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import request
+from werkzeug.exceptions import ServiceUnavailable
+
+from .budget import render_budget
+from .monitoring import metrics
+from .validators import clamp_int
+
+MIN_LATENCY_SAMPLES = 5
+
+
+class Overloaded(ServiceUnavailable):
+    """The worker is saturated; the request was shed before doing any work."""
+
+
+def render_cost(size_px: int, copies: int = 1, logo: bool = False) -> int:
+    """
+    Cost units of a generate request: 1 unit is one 512px plain render,
+    scaling with output pixels, copies and logo compositing. Smaller
+    renders still cost 1, the minimum.
+    """
+    per_copy = (size_px / 512) ** 2
+    if logo:
+        per_copy *= 1.5
+    return max(1, math.ceil(per_copy * copies))
+
+
+def request_cost() -> int:
+    """render_cost() of the current /generate or /api/generate request."""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.form
+    size_px = clamp_int(data.get("size_px", 512), 128, 4096, 512)
+    copies = clamp_int(data.get("duplicate_count", 1), 1, 10, 1)
+    if copies == 1 and str(data.get("auto_duplicate", "false")).lower() == "true":
+        copies = 2
+    upload = request.files.get("logo")
+    return render_cost(size_px, copies, logo=bool(upload and upload.filename))
+
+
+def label_sheet_cost(count: int, size_px: int) -> int:
+    """Cost units of a label sheet: each label is one render_cost() code."""
+    return count * render_cost(size_px)
+
+
+def labels_request_cost() -> int:
+    """label_sheet_cost() of the current /api/labels request; 1 if the view will reject it."""
+    from .labels import sheet_from_options  # labels imports the render stack
+
+    data = request.get_json(silent=True) or {}
+    entries = data.get("contents") or data.get("ids")
+    if not isinstance(entries, list) or not entries:
+        return 1
+    try:
+        sheet = sheet_from_options(data)
+    except ValueError:
+        return 1
+    return label_sheet_cost(len(entries), sheet.code_pixels())
+
+
+class LoadShedder:
+    """
+    Fails expensive requests fast with 503 + Retry-After while this worker
+    is saturated: too many guarded requests in flight or queued on the
+    render memory budget, or a recent latency quantile above threshold.
+    Latency samples age out of the window, so shedding stops by itself.
+    """
+
+    def __init__(self):
+        self.max_in_flight = 0
+        self.max_latency = 0.0
+        self.window = 10.0
+        self.quantile = 0.95
+        self.retry_after = 2
+        self._in_flight = 0
+        self._samples = collections.deque()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_in_flight = int(app.config.get("SHED_MAX_IN_FLIGHT", 32))
+        self.max_latency = float(app.config.get("SHED_MAX_LATENCY_MS", 5000)) / 1000
+        self.window = float(app.config.get("SHED_LATENCY_WINDOW_SECONDS", 10))
+        self.quantile = float(app.config.get("SHED_LATENCY_QUANTILE", 0.95))
+        self.retry_after = int(app.config.get("SHED_RETRY_AFTER_SECONDS", 2))
+        with self._lock:
+            self._in_flight = 0
+            self._samples.clear()
+
+    def _recent_latency(self, now: float):
+        cutoff = now - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        if len(self._samples) < MIN_LATENCY_SAMPLES:
+            return None
+        durations = sorted(d for _, d in self._samples)
+        return durations[min(len(durations) - 1, int(self.quantile * len(durations)))]
+
+    def overload_reason(self):
+        """'queue', 'latency' or None."""
+        with self._lock:
+            if self.max_in_flight and self._in_flight + render_budget.waiting >= self.max_in_flight:
+                return "queue"
+            if self.max_latency:
+                latency = self._recent_latency(time.monotonic())
+                if latency is not None and latency > self.max_latency:
+                    return "latency"
+        return None
+
+    def guard(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            reason = self.overload_reason()
+            if reason:
+                metrics.inc("requests_shed_total", {"reason": reason})
+                raise Overloaded("The server is overloaded, please retry shortly.",
+                                 retry_after=self.retry_after)
+            with self._lock:
+                self._in_flight += 1
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+            # Only completed requests are sampled; rejected ones would skew low.
+            with self._lock:
+                self._samples.append((time.monotonic(), time.monotonic() - start))
+            return result
+        return wrapper
+
+
+load_shedder = LoadShedder()
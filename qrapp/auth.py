@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from .models import db, User
 from .forms import LoginForm, RegisterForm
 from .csrf import csrf
+from .passwords import HashingBusy
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -14,6 +15,7 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
+            _commit_rehash(user)
             login_user(user)
             next_page = request.args.get('next')
             # Ensure we don't redirect to auth pages
@@ -43,6 +45,11 @@ def logout():
     logout_user()
     return redirect(url_for('home'))
 
+def _commit_rehash(user):
+    """Persist a password hash check_password upgraded to the current parameters."""
+    if db.session.is_modified(user):
+        db.session.commit()
+
 # JSON API endpoints for frontend
 @auth_bp.route('/api/login', methods=['POST'])
 @csrf.exempt
@@ -60,6 +67,7 @@ def api_login():
         
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            _commit_rehash(user)
             login_user(user)
             return jsonify({
                 'success': True,
@@ -72,6 +80,8 @@ def api_login():
             })
         else:
             return jsonify({'success': False, 'message': 'Invalid username or password'}), 401
+    except HashingBusy:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'message': 'Login failed'}), 500
 
@@ -111,6 +121,8 @@ def api_register():
             },
             'redirectTo': '/dashboard'  # Provide default redirect
         })
+    except HashingBusy:
+        raise
     except Exception as e:
         print(f"Registration error: {str(e)}")  # Debug print
         import traceback
@@ -0,0 +1,287 @@
+"""
+`flask generate-batch`: offline bulk rendering for print runs.
+
+Records come from CSV (header row) or NDJSON, one code per record, with the
+same fields /api/generate accepts (content, size_px, error_correction,
+fg_color, pattern_style, frame_style, ...). Command-line defaults fill in
+fields a record leaves out. Records are validated in the parent process and
+rendered by a multiprocessing pool through the same generate_qr_png/frame
+pipeline as the API; the parent writes PNGs into a sharded directory tree
+or a streamed ZIP.
+
+Results are consumed in input order, so progress is a single "records
+done" count. It is checkpointed to a JSON file next to the output, and a
+rerun with the same input resumes after the last checkpoint. Records whose
+name is already used in their shard get "-<record index>" appended, so
+nothing is overwritten and ZIP entries stay unique.
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zipfile
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from werkzeug.exceptions import BadRequest
+from werkzeug.utils import secure_filename
+
+from .routes import parse_render_options
+from .frames import apply_frame
+from .monitoring import metrics, retire_process_metrics
+from .utils import encode_png, generate_qr_png
+
+SHARD_SIZE = 1000           # files per directory in --out trees
+WINDOW_PER_WORKER = 64      # records in flight per worker process
+CHECKPOINT_EVERY_SECONDS = 2.0
+
+
+def read_records(path: str, fmt: str):
+    """Yield record dicts lazily from a CSV or NDJSON file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def output_name(index: int, record: dict) -> str:
+    name = secure_filename(str(record.get("name") or record.get("id") or ""))
+    return f"{name or f'{index:07d}'}.png"
+
+
+# ---- worker side ----
+
+_worker_app = None
+
+
+def _init_worker(config: dict):
+    global _worker_app
+    # Forked from a process with metrics configured; the worker's file would
+    # outlive it in the server's METRICS_FOLDER with nothing to archive it
+    metrics.folder = None
+    _worker_app = Flask("qrapp.batch")
+    _worker_app.config.update(config)
+    _worker_app.app_context().push()
+
+
+def _render(job):
+    index, name, params = job
+    if "error" in params:
+        return index, name, None, params["error"]
+    params = dict(params)
+    frame = params.pop("frame", None)
+    try:
+        img = generate_qr_png(**params)
+        if frame is not None:
+            img = apply_frame(img, frame, params["bg"])
+        return index, name, encode_png(img), None
+    except ValueError as e:
+        return index, name, None, str(e)
+
+
+# ---- parent side ----
+
+class DirectoryWriter:
+    def __init__(self, root: str):
+        self.root = root
+
+    def write(self, index: int, name: str, png: bytes):
+        folder = os.path.join(self.root, f"{index // SHARD_SIZE:04d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(png)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ZipWriter:
+    """PNGs are already deflated, so entries are stored, not recompressed."""
+
+    def __init__(self, path: str, resume: bool):
+        mode = "a" if resume and os.path.exists(path) else "w"
+        try:
+            self.zip = zipfile.ZipFile(path, mode, compression=zipfile.ZIP_STORED)
+        except zipfile.BadZipFile:
+            raise click.ClickException(
+                f"{path} was not closed cleanly and cannot be resumed; use --restart or --out DIR."
+            )
+
+    def write(self, index: int, name: str, png: bytes):
+        info = zipfile.ZipInfo(f"{index // SHARD_SIZE:04d}/{name}", date_time=time.localtime()[:6])
+        self.zip.writestr(info, png)
+
+    def flush(self):
+        self.zip.fp.flush()
+
+    def close(self):
+        self.zip.close()
+
+
+def load_checkpoint(path: str, input_path: str):
+    """(records done, records failed) of an earlier run over the same input."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0, 0
+    if state.get("input") != os.path.abspath(input_path):
+        return 0, 0
+    return int(state.get("done", 0)), int(state.get("failed", 0))
+
+
+def save_checkpoint(path: str, input_path: str, done: int, failed: int):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"input": os.path.abspath(input_path), "done": done, "failed": failed}, f)
+    os.replace(tmp, path)
+
+
+def unique_name(name: str, index: int, taken: set) -> str:
+    if name in taken:
+        renamed = f"{name[:-len('.png')]}-{index:07d}.png"
+        click.echo(f"record {index + 1}: {name} is already used in its shard; writing {renamed}", err=True)
+        name = renamed
+    taken.add(name)
+    return name
+
+
+def _jobs(records, first: int, start: int, defaults: dict, logo_path):
+    """
+    Render jobs for records from `start` on. `records` begin at `first`,
+    the start of `start`'s shard, so names used earlier in that shard are
+    known when resuming.
+    """
+    taken = set()
+    for index, record in enumerate(records, start=first):
+        if index % SHARD_SIZE == 0:
+            taken.clear()  # names only need to be unique per shard directory
+        name = unique_name(output_name(index, record), index, taken)
+        if index < start:
+            continue
+        fields = dict(defaults, **{k: v for k, v in record.items() if v not in (None, "")})
+        try:
+            params = parse_render_options(fields)
+            params["logo_path"] = logo_path
+        except (BadRequest, ValueError) as e:
+            params = {"error": getattr(e, "description", None) or str(e)}
+        yield index, name, params
+
+
+def _bounded(jobs, slots: threading.Semaphore, stop: threading.Event):
+    # Pool.imap drains its input eagerly; this holds it to the window
+    for job in jobs:
+        slots.acquire()
+        if stop.is_set():
+            return
+        yield job
+
+
+def _worker_config(config) -> dict:
+    # Only plain values; the workers only need render settings
+    return {k: v for k, v in config.items() if isinstance(v, (str, int, float, bool, type(None)))}
+
+
+@click.command("generate-batch")
+@click.argument("input_path", metavar="INPUT", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]),
+              help="Input format (default: from the file extension).")
+@click.option("--out", "out_dir", type=click.Path(file_okay=False), help="Write PNGs into this directory tree.")
+@click.option("--zip", "zip_path", type=click.Path(dir_okay=False), help="Write PNGs into this ZIP file.")
+@click.option("--workers", type=int, default=0, help="Render processes (default: all cores).")
+@click.option("--size", "size_px", type=int, help="Default size_px.")
+@click.option("--ec", "error_correction", help="Default error correction (L/M/Q/H).")
+@click.option("--set", "extra", multiple=True, metavar="FIELD=VALUE",
+              help="Default for any other generate field, e.g. --set pattern_style=circle.")
+@click.option("--logo", "logo_path", type=click.Path(exists=True, dir_okay=False), help="Logo for every code.")
+@click.option("--checkpoint", "checkpoint_path", help="Checkpoint file (default: <output>.checkpoint.json).")
+@click.option("--resume/--restart", default=True, help="Continue after the last checkpoint (default) or start over.")
+@with_appcontext
+def generate_batch_command(input_path, fmt, out_dir, zip_path, workers, size_px, error_correction,
+                           extra, logo_path, checkpoint_path, resume):
+    """Render every record of a CSV/NDJSON file to PNG, in parallel."""
+    if bool(out_dir) == bool(zip_path):
+        raise click.UsageError("Give exactly one of --out DIR or --zip FILE.")
+    fmt = fmt or ("csv" if input_path.lower().endswith(".csv") else "ndjson")
+    defaults = {}
+    if size_px:
+        defaults["size_px"] = size_px
+    if error_correction:
+        defaults["error_correction"] = error_correction
+    for item in extra:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise click.BadParameter(f"expected FIELD=VALUE, got {item!r}", param_hint="--set")
+        defaults[key] = value
+
+    output = out_dir or zip_path
+    checkpoint_path = checkpoint_path or f"{output.rstrip(os.sep)}.checkpoint.json"
+    start, failed = load_checkpoint(checkpoint_path, input_path) if resume else (0, 0)
+    if start:
+        click.echo(f"Resuming after {start} records ({checkpoint_path})", err=True)
+
+    writer = ZipWriter(zip_path, resume and start > 0) if zip_path else DirectoryWriter(out_dir)
+    workers = workers or os.cpu_count() or 1
+    first = start - start % SHARD_SIZE
+    records = itertools.islice(read_records(input_path, fmt), first, None)
+    jobs = _jobs(records, first, start, defaults, logo_path)
+
+    done = start
+    began = last_report = time.monotonic()
+    rendered = 0
+    window = workers * WINDOW_PER_WORKER
+    slots, stop = threading.Semaphore(window), threading.Event()
+    pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(_worker_config(current_app.config),))
+    try:
+        # One lazy imap keeps every worker busy; the semaphore bounds records in flight
+        for index, name, png, error in pool.imap(_render, _bounded(jobs, slots, stop), chunksize=4):
+            slots.release()
+            if error is None:
+                writer.write(index, name, png)
+                rendered += 1
+            else:
+                failed += 1
+                click.echo(f"record {index + 1}: {error}", err=True)
+            done = index + 1
+            now = time.monotonic()
+            if now - last_report >= CHECKPOINT_EVERY_SECONDS:
+                writer.flush()
+                save_checkpoint(checkpoint_path, input_path, done, failed)
+                rate = rendered / (now - began)
+                click.echo(f"{done} records, {rate:.0f} codes/s, {failed} failed", err=True)
+                last_report = now
+        pool.close()
+    except BaseException as e:
+        # Unblock the feeder thread so terminate() can join it
+        stop.set()
+        slots.release(window)
+        pool.terminate()
+        if isinstance(e, KeyboardInterrupt):
+            click.echo(f"Interrupted after {done} records; rerun to resume.", err=True)
+        raise
+    finally:
+        pool.join()
+        writer.close()
+        save_checkpoint(checkpoint_path, input_path, done, failed)
+        retire_process_metrics()
+
+    elapsed = time.monotonic() - began
+    click.echo(f"Rendered {rendered} codes in {elapsed:.1f}s "
+               f"({rendered / elapsed if elapsed else 0:.0f} codes/s, {workers} workers); "
+               f"{done} records done, {failed} failed.")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,75 @@
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from .monitoring import stage
+
+
+class RenderBusy(ServiceUnavailable):
+    """No render memory budget became available within the wait timeout."""
+
+
+class MemoryBudget:
+    """
+    Per-worker byte budget for in-flight renders.
+    Jobs reserve their estimated peak bytes and are admitted in arrival
+    order once they fit, so a burst of large renders queues instead of
+    exhausting the worker's memory. A job larger than the whole budget
+    is admitted once nothing else is running.
+    """
+
+    def __init__(self):
+        self.limit = 0
+        self.timeout = 30.0
+        self._used = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+
+    def init_app(self, app):
+        self.limit = int(app.config.get("RENDER_MEMORY_BUDGET_MB", 512) * 1024 * 1024)
+        self.timeout = float(app.config.get("RENDER_MEMORY_WAIT_SECONDS", 30))
+        with self._cond:
+            self._used = 0
+            self._queue.clear()
+
+    @property
+    def in_use(self) -> int:
+        return self._used
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        if self.limit <= 0:
+            yield
+            return
+        nbytes = min(int(nbytes), self.limit)
+        ticket = object()
+        with stage("memory_wait"), self._cond:
+            self._queue.append(ticket)
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self._queue[0] is not ticket or self._used + nbytes > self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RenderBusy("The server is busy rendering, please retry shortly.",
+                                         retry_after=max(1, round(self.timeout / 10)))
+                    self._cond.wait(remaining)
+                self._used += nbytes
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._used -= nbytes
+                self._cond.notify_all()
+
+
+render_budget = MemoryBudget()
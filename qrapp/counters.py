@@ -0,0 +1,149 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import bindparam, select, update
+
+from .history_cache import history_cache
+from .models import db, QRCode
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedCounter:
+    """
+    Per-worker accumulator for hot integer counters (downloads, redirects).
+
+    `add()` only bumps an in-memory Counter under a lock. A daemon thread
+    flushes the aggregated deltas every `interval` seconds, or as soon as
+    `max_pending` distinct rows are waiting, as one executemany
+    UPDATE ... SET col = col + :n in primary-key order, so concurrent
+    workers never wait on each other's row locks per hit. When the count is
+    shown in history listings, pass `owner_column` so owners of the updated
+    rows get their history cache bumped; counters nobody lists pass None.
+
+    Counts still pending when a worker is killed are lost; they are
+    statistics, not ledger entries. A clean exit flushes them.
+    """
+
+    def __init__(self, name: str, model, column: str, owner_column: Optional[str] = "user_id"):
+        self.name = name
+        self.model = model
+        self.column = column
+        self.owner_column = owner_column
+        self.enabled = True
+        self.interval = 5.0
+        self.max_pending = 1000
+        self.app = None
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("COUNTER_BATCHING", True)
+        self.interval = app.config.get("COUNTER_FLUSH_SECONDS", self.interval)
+        self.max_pending = app.config.get("COUNTER_MAX_PENDING", self.max_pending)
+        with self._lock:
+            self._pending.clear()
+        app.extensions[f"{self.name}_counter"] = self
+
+    def _ensure_thread(self):
+        # Started lazily (and restarted after fork) so every worker flushes its own counts
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._pending.clear()  # counts inherited from the master were never ours
+                self._pid = os.getpid()
+                self._wake = threading.Event()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-counter", daemon=True)
+                self._thread.start()
+
+    def add(self, key, amount: int = 1):
+        if not self.enabled:
+            self._write({key: amount})
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._pending[key] += amount
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self, key) -> int:
+        """Increments for `key` not yet written by this worker."""
+        with self._lock:
+            return self._pending.get(key, 0)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Flushing %s counters failed: %s", self.name, e)
+
+    def flush(self) -> int:
+        """Write all pending increments now. Returns the number of rows updated."""
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+        if not batch:
+            return 0
+        try:
+            self._write(batch)
+        except Exception:
+            # Put them back for the next flush rather than dropping them
+            with self._lock:
+                self._pending.update(batch)
+            raise
+        return len(batch)
+
+    def _write(self, batch):
+        pk = self.model.__table__.primary_key.columns.values()[0]
+        col = getattr(self.model, self.column)
+        stmt = (
+            update(self.model.__table__)
+            .where(pk == bindparam("_key"))
+            .values({self.column: col + bindparam("_n")})
+        )
+        params = [{"_key": key, "_n": n} for key, n in sorted(batch.items())]
+        owners = []
+        with self.app.app_context():
+            try:
+                db.session.connection().execute(stmt, params)
+                if self.owner_column is not None:
+                    owner = getattr(self.model, self.owner_column)
+                    owners = db.session.execute(
+                        select(owner).where(pk.in_(list(batch)), owner.isnot(None)).distinct()
+                    ).scalars().all()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+        for user_id in owners:
+            history_cache.bump(user_id)
+
+
+def _flush_all():
+    for counter in (download_counter, click_counter):
+        if counter.app is not None and counter._pid == os.getpid():
+            try:
+                counter.flush()
+            except Exception as e:
+                logger.warning("Final %s counter flush failed: %s", counter.name, e)
+
+
+download_counter = BatchedCounter("downloads", QRCode, "downloads")
+# Clicks aren't part of any listing, so their flushes leave history caches alone
+click_counter = BatchedCounter("clicks", QRCode, "clicks", owner_column=None)
+atexit.register(_flush_all)
@@ -0,0 +1,212 @@
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.engine import make_url
+
+from .models import db, QRCode
+
+
+def engine_options(config) -> dict:
+    """
+    SQLAlchemy engine options for the configured backend.
+    SQLite gets a busy timeout so concurrent workers wait for the write lock
+    instead of failing; server databases (PostgreSQL) get an explicitly
+    sized, pre-pinged pool.
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        return {"connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000.0}}
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": True,
+    }
+
+
+SQLITE_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def install_sqlite_pragmas(app):
+    """Switch file-backed SQLite to WAL with the configured sync level."""
+    synchronous = str(app.config["SQLITE_SYNCHRONOUS"]).upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_LEVELS:
+        # Interpolated into a PRAGMA below, so only the known levels get through
+        raise ValueError(
+            f"SQLITE_SYNCHRONOUS must be one of {', '.join(SQLITE_SYNCHRONOUS_LEVELS)}, got {synchronous!r}"
+        )
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return
+
+    busy_ms = app.config["SQLITE_BUSY_TIMEOUT_MS"]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_conn, conn_record):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute(f"PRAGMA synchronous={synchronous}")
+            cur.execute(f"PRAGMA busy_timeout={int(busy_ms)}")
+        finally:
+            cur.close()
+
+
+class _Submission:
+    __slots__ = ("rows", "done", "error")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupCommitWriter:
+    """
+    Coalesces QRCode inserts from concurrent request threads into a single
+    transaction. The first submission opens a short window (window_ms);
+    everything submitted before it closes, up to max_batch rows, is written
+    with one INSERT and one COMMIT. Callers block until their rows are
+    durable, so request semantics are unchanged.
+
+    Coalescing happens between threads of one worker process, so it pays
+    off with threaded workers (gunicorn --threads / gthread).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.window_ms = 5.0
+        self.max_batch = 256
+        self.app = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("DB_GROUP_COMMIT", False)
+        self.window_ms = app.config.get("DB_GROUP_COMMIT_WINDOW_MS", self.window_ms)
+        self.max_batch = app.config.get("DB_GROUP_COMMIT_MAX_BATCH", self.max_batch)
+        app.extensions["group_commit"] = self
+
+    def _ensure_thread(self):
+        # Started lazily (and restarted after fork) so preloaded masters
+        # hand every worker its own writer thread.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def submit(self, rows):
+        """Insert `rows` (QRCode column dicts) and wait for the commit."""
+        self._ensure_thread()
+        sub = _Submission(list(rows))
+        self._queue.put(sub)
+        sub.done.wait()
+        if sub.error is not None:
+            raise sub.error
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            count = len(first.rows)
+            deadline = time.monotonic() + self.window_ms / 1000.0
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    sub = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(sub)
+                count += len(sub.rows)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with self.app.app_context():
+                try:
+                    db.session.execute(insert(QRCode), [r for sub in batch for r in sub.rows])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    # Isolate the failing submission; the rest still commit.
+                    for sub in batch:
+                        try:
+                            db.session.execute(insert(QRCode), sub.rows)
+                            db.session.commit()
+                        except Exception as e:
+                            db.session.rollback()
+                            sub.error = e
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            for sub in batch:
+                sub.error = sub.error or e
+        finally:
+            for sub in batch:
+                sub.done.set()
+
+
+group_writer = GroupCommitWriter()
+
+
+ROW_DEFAULTS = {"slug": None, "target": None}
+
+
+def save_qrcodes(rows):
+    """
+    Persist new QRCode rows, through the group-commit writer when enabled,
+    otherwise in the request's own session.
+    """
+    # Batched executemany inserts need the same keys in every row
+    rows = [dict(ROW_DEFAULTS, **r) for r in rows]
+    if group_writer.enabled:
+        group_writer.submit(rows)
+        return
+    db.session.add_all(QRCode(**r) for r in rows)
+    db.session.commit()
+
+
+def delete_qrcodes(user_id, ids=None, query=None, chunk_size=500):
+    """
+    Set-based delete of a user's QRCode rows, by id list or content search.
+    Returns (id, slug) of the rows actually deleted so callers can clean up
+    files and invalidate dynamic codes.
+    """
+    conditions = [QRCode.user_id == user_id]
+    if query:
+        conditions.append(QRCode.content.contains(query))
+
+    if ids is None:
+        chunks = [None]
+    else:
+        ids = list(dict.fromkeys(ids))
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    returning = db.engine.dialect.delete_returning
+    deleted = []
+    for chunk in chunks:
+        where = list(conditions)
+        if chunk is not None:
+            where.append(QRCode.id.in_(chunk))
+        stmt = delete(QRCode).where(*where)
+        if returning:
+            deleted.extend(db.session.execute(stmt.returning(QRCode.id, QRCode.slug)).all())
+        else:
+            deleted.extend(db.session.execute(select(QRCode.id, QRCode.slug).where(*where)).all())
+            db.session.execute(stmt)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,99 @@
+import os
+import secrets
+import threading
+import zlib
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from .models import db, QRCode
+from .monitoring import metrics
+from .versions import bump_versions, read_version
+
+# Uppercase letters and digits only, so a short URL with an uppercased
+# scheme and host (QR_UPPERCASE_URL_HOST) encodes entirely in alphanumeric mode
+SLUG_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SLUG_LENGTH = 8
+
+
+def new_slug() -> str:
+    return "".join(secrets.choice(SLUG_ALPHABET) for _ in range(SLUG_LENGTH))
+
+
+def is_slug(value: str) -> bool:
+    return len(value) == SLUG_LENGTH and all(ch in SLUG_ALPHABET for ch in value)
+
+
+class LinkCache:
+    """
+    In-process LRU of dynamic-code slug -> (QRCode id, target URL) for the
+    redirect route.
+
+    Entries are tagged with a version from instance/cache/links/links.ver,
+    an array of VERSION_SLOTS counters (see versions.py) indexed by a hash
+    of the slug. Editing or deleting a dynamic code bumps its slug's slot,
+    which invalidates that slug (and the few sharing its slot) in every
+    worker; other cached redirects are untouched. Unknown slugs are not
+    cached, so a slug is resolvable as soon as its row is committed.
+    """
+
+    VERSION_SLOTS = 4096
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.path = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("LINK_CACHE_SIZE", self.max_entries)
+        folder = app.config["LINK_VERSION_FOLDER"]
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, "links.ver")
+        self.clear()
+        app.extensions["link_cache"] = self
+
+    def _slot(self, slug: str) -> int:
+        return zlib.crc32(slug.encode()) % self.VERSION_SLOTS
+
+    def version(self, slug: str) -> int:
+        return read_version(self.path, self._slot(slug))
+
+    def bump(self, *slugs: str):
+        """Invalidate the given slugs in all workers. Call after the commit."""
+        if slugs:
+            bump_versions(self.path, (self._slot(slug) for slug in slugs))
+
+    def resolve(self, slug: str):
+        """(id, target) for `slug`, or None if there is no such dynamic code."""
+        version = self.version(slug)
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(slug)
+            else:
+                entry = None
+        if entry is not None:
+            metrics.inc("cache_hits_total", {"cache": "links"})
+            return entry[1]
+
+        metrics.inc("cache_misses_total", {"cache": "links"})
+        row = db.session.execute(
+            select(QRCode.id, QRCode.target).where(QRCode.slug == slug)
+        ).first()
+        if row is None or not row.target:
+            return None
+        value = (row.id, row.target)
+        with self._lock:
+            self._entries[slug] = (version, value)
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+link_cache = LinkCache()
@@ -0,0 +1,190 @@
+"""
+Decorative frames around a rendered code.
+
+A frame is an RGBA layer the size of the framed output: the ring itself
+plus any shadow or glow, transparent over the symbol. Building a layer
+involves Gaussian blurs over the whole canvas, so layers are cached per
+(style, size, thickness, colours) under a byte budget and a framed render
+costs one alpha-composite on top of the plain one.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageOps
+
+from .monitoring import metrics, stage
+from .singleflight import SingleFlight
+from .styles import gradient_fill
+
+FRAME_STYLES = ("simple", "rounded", "shadow", "gradient", "neon", "vintage", "modern")
+FRAME_GRADIENT_DIRECTIONS = ("horizontal", "vertical", "diagonal", "radial")
+MIN_THICKNESS, MAX_THICKNESS = 1, 20
+
+
+class Frame(NamedTuple):
+    style: str
+    thickness: int = 4
+    color: str = "#000000"
+    gradient_start: Optional[str] = None
+    gradient_end: Optional[str] = None
+    gradient_direction: str = "horizontal"
+
+    @property
+    def gradient(self) -> bool:
+        return self.gradient_start is not None
+
+    def blur(self) -> int:
+        return 2 * self.thickness if self.style in ("shadow", "neon") else 0
+
+    def padding(self) -> int:
+        """Canvas margin on each side of the symbol."""
+        pad = self.thickness
+        if self.style == "vintage":
+            pad += 2 * self.thickness
+        return pad + 3 * self.blur()
+
+
+def _ring(size, box, thickness: int, radius: float = 0) -> Image.Image:
+    """"L" mask of a `thickness` wide band around `box` (outer edge rounded by `radius`)."""
+    x0, y0, x1, y1 = box
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    outer = (x0 - thickness, y0 - thickness, x1 + thickness - 1, y1 + thickness - 1)
+    if radius:
+        draw.rounded_rectangle(outer, radius=radius, fill=255)
+    else:
+        draw.rectangle(outer, fill=255)
+    draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=0)
+    return mask
+
+
+def _corners(size, box, thickness: int) -> Image.Image:
+    """Four L-shaped brackets at the corners of `box`."""
+    x0, y0, x1, y1 = box
+    arm = max(3 * thickness, (x1 - x0) // 6)
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    left, top = x0 - thickness, y0 - thickness
+    right, bottom = x1 + thickness, y1 + thickness
+    for cx, dx in ((left, 1), (right, -1)):
+        for cy, dy in ((top, 1), (bottom, -1)):
+            for w, h in ((arm, thickness), (thickness, arm)):
+                xs, ys = sorted((cx, cx + dx * w)), sorted((cy, cy + dy * h))
+                draw.rectangle((xs[0], ys[0], xs[1] - 1, ys[1] - 1), fill=255)
+    return mask
+
+
+def _paint(size, frame: Frame) -> Image.Image:
+    if frame.gradient:
+        if frame.gradient_direction == "radial":
+            ramp = Image.radial_gradient("L").resize(size, Image.BILINEAR)
+            return ImageOps.colorize(ramp, frame.gradient_start, frame.gradient_end)
+        return gradient_fill(size, frame.gradient_start, frame.gradient_end, frame.gradient_direction)
+    return Image.new("RGB", size, frame.color)
+
+
+def build_frame_layer(frame: Frame, symbol_size) -> Image.Image:
+    """RGBA layer for `frame` around a symbol of `symbol_size`, transparent over the symbol."""
+    pad = frame.padding()
+    w, h = symbol_size
+    size = (w + 2 * pad, h + 2 * pad)
+    box = (pad, pad, pad + w, pad + h)
+    t = frame.thickness
+
+    if frame.style == "rounded":
+        ink = _ring(size, box, t, radius=4 * t)
+    elif frame.style == "vintage":
+        # thick outer rule, thin inner rule with a gap between them
+        ink = ImageChops.lighter(
+            _ring(size, (box[0] - 2 * t, box[1] - 2 * t, box[2] + 2 * t, box[3] + 2 * t), t),
+            _ring(size, box, max(1, t // 2)))
+    elif frame.style == "modern":
+        ink = _corners(size, box, t)
+    else:
+        ink = _ring(size, box, t)
+
+    layer = Image.new("RGBA", size, (0, 0, 0, 0))
+    if frame.style == "shadow":
+        # the framed card's outline, dropped down-right by the frame thickness
+        card = Image.new("L", size, 0)
+        ImageDraw.Draw(card).rectangle((box[0], box[1], box[2] + 2 * t - 1, box[3] + 2 * t - 1), fill=110)
+        shadow = Image.new("RGBA", size, (0, 0, 0, 0))
+        shadow.putalpha(card.filter(ImageFilter.GaussianBlur(frame.blur())))
+        layer = shadow
+    elif frame.style == "neon":
+        glow = _paint(size, frame).convert("RGBA")
+        glow.putalpha(ink.filter(ImageFilter.GaussianBlur(frame.blur())).point(lambda v: min(255, v * 2)))
+        layer = glow
+
+    ring = _paint(size, frame).convert("RGBA")
+    ring.putalpha(ink)
+    layer.alpha_composite(ring)
+    layer.paste((0, 0, 0, 0), box)
+    return layer
+
+
+class FrameCache:
+    """
+    Bounded LRU of frame layers, sized in bytes (FRAME_CACHE_MB) since a
+    single 4096px layer is ~70 MB. Concurrent misses for the same layer
+    share one build.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def init_app(self, app):
+        self.max_bytes = int(app.config.get("FRAME_CACHE_MB", 256)) * 1024 * 1024
+        self.clear()
+        app.extensions["frame_cache"] = self
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, frame: Frame, symbol_size) -> Image.Image:
+        key = (frame, tuple(symbol_size))
+        with self._lock:
+            layer = self._entries.get(key)
+            if layer is not None:
+                self._entries.move_to_end(key)
+        if layer is not None:
+            metrics.inc("cache_hits_total", {"cache": "frame"})
+            return layer
+
+        metrics.inc("cache_misses_total", {"cache": "frame"})
+        layer, _ = self._flight.do(key, lambda: build_frame_layer(frame, symbol_size))
+        nbytes = layer.width * layer.height * 4
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = layer
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, old = self._entries.popitem(last=False)
+                    self._bytes -= old.width * old.height * 4
+        return layer
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def apply_frame(img: Image.Image, frame: Frame, bg: str) -> Image.Image:
+    """Place `img` on a `bg` canvas and composite the cached frame layer over it."""
+    layer = frame_cache.get(frame, img.size)
+    pad = frame.padding()
+    with stage("frame"):
+        canvas = Image.new("RGBA", layer.size, bg)
+        canvas.paste(img, (pad, pad))
+        canvas.alpha_composite(layer)
+        return canvas.convert("RGB")
+
+
+frame_cache = FrameCache()
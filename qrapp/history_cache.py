@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .monitoring import metrics
+from .versions import bump_version, read_version
+
+
+class HistoryCache:
+    """
+    Per-user cache of serialized history responses (dashboard, listings).
+
+    Every user has a monotonically increasing history version. Writers bump it
+    after committing; cached bodies are only served while their version is
+    current, so a bump invalidates everything cached for that user at once.
+
+    The version is kept in a tiny per-user counter file under
+    instance/cache/history (see versions.py), which makes it consistent
+    across gunicorn workers for the cost of one small read.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.folder = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("HISTORY_CACHE_SIZE", self.max_entries)
+        self.folder = app.config["HISTORY_VERSION_FOLDER"]
+        os.makedirs(self.folder, exist_ok=True)
+        self.clear()
+        app.extensions["history_cache"] = self
+
+    def _version_path(self, user_id) -> str:
+        return os.path.join(self.folder, f"{int(user_id)}.ver")
+
+    def version(self, user_id) -> int:
+        return read_version(self._version_path(user_id))
+
+    def bump(self, user_id) -> int:
+        """Invalidate all cached history for a user. Call after the commit."""
+        return bump_version(self._version_path(user_id))
+
+    @staticmethod
+    def etag(user_id, version: int) -> str:
+        return f"h{int(user_id)}-{version}"
+
+    def get(self, user_id, key, version: int):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[0] != version:
+                del self._entries[(user_id, key)]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end((user_id, key))
+        if entry is None:
+            metrics.inc("cache_misses_total", {"cache": "history"})
+            return None
+        metrics.inc("cache_hits_total", {"cache": "history"})
+        return entry[1]
+
+    def set(self, user_id, key, version: int, body: bytes):
+        with self._lock:
+            self._entries[(user_id, key)] = (version, body)
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+history_cache = HistoryCache()
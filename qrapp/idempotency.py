@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+from flask import current_app, jsonify
+
+from .monitoring import metrics
+from .singleflight import SingleFlight, shared_across_workers
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+_flight = SingleFlight()
+
+
+def request_fingerprint(data: dict, files) -> str:
+    """Hash of the request fields (and uploaded file names/sizes)."""
+    parts = {k: str(v) for k, v in data.items()}
+    for name, storage in (files or {}).items():
+        if storage and storage.filename:
+            storage.stream.seek(0, 2)
+            parts[f"file:{name}"] = f"{storage.filename}:{storage.stream.tell()}"
+            storage.stream.seek(0)
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def idempotent_response(user_id, key: str, fingerprint: str, build):
+    """
+    Run `build() -> (payload, status)` at most once per (user, key) within
+    IDEMPOTENCY_TTL. Replays get the stored response without rendering,
+    writing or inserting anything; concurrent duplicates wait for the
+    original, in this worker or (via file lock) in another. 5xx responses
+    are not stored, so a retry after a server error runs again.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return jsonify({"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+    config = current_app.config
+    name = hashlib.sha256(f"{user_id}:{key}".encode("utf-8")).hexdigest()
+
+    def compute() -> bytes:
+        payload, status = build()
+        record = {"fingerprint": fingerprint, "status": status, "body": payload}
+        return json.dumps(record).encode("utf-8")
+
+    def run():
+        return shared_across_workers(
+            config["IDEMPOTENCY_FOLDER"], name, config["IDEMPOTENCY_TTL"], compute,
+            should_publish=lambda data: json.loads(data)["status"] < 500,
+        )
+
+    (data, shared_on_disk), shared_in_flight = _flight.do(name, run)
+    record = json.loads(data)
+    replayed = shared_on_disk or shared_in_flight
+
+    if replayed and record["fingerprint"] != fingerprint:
+        return jsonify({"error": f"{IDEMPOTENCY_HEADER} was already used with a different request"}), 422
+
+    if replayed:
+        metrics.inc("cache_hits_total", {"cache": "idempotency"})
+    response = jsonify(record["body"])
+    response.status_code = record["status"]
+    response.headers["Idempotent-Replayed"] = "true" if replayed else "false"
+    return response
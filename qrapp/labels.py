@@ -0,0 +1,349 @@
+"""
+N-up label sheets as a streamed PDF.
+
+Codes are laid out on a rows x columns grid per page with optional
+captions. The PDF is produced as a generator of byte chunks: each page's
+codes are rendered under the worker's render memory budget, kept as
+Flate-compressed image objects until the page is done, and written with the
+page and its content stream before the next page starts. The page
+tree, whose Kids are only known at the end, is written last; PDF's xref
+table allows objects in any order. Memory stays at one page's images
+regardless of the label count.
+
+Only the standard Helvetica font is used for captions, so nothing is
+embedded and captions are limited to Latin-1.
+"""
+
+import os
+import zlib
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from PIL import Image
+from werkzeug.exceptions import BadRequest
+
+from .frames import apply_frame
+from .models import QRCode
+from .budget import render_budget
+from .monitoring import retire_process_metrics, stage
+from .utils import estimate_render_bytes, generate_qr_png
+
+MM = 72 / 25.4  # PDF points per millimetre
+PAGE_SIZES = {"A4": (210.0, 297.0), "Letter": (215.9, 279.4), "A5": (148.0, 210.0)}
+CAPTION_GAP = 1.2  # caption line height as a multiple of the font size
+ID_CHUNK = 500     # stored codes loaded per query
+
+
+class Sheet(NamedTuple):
+    page: str = "A4"
+    columns: int = 3
+    rows: int = 8
+    margin_mm: float = 10.0
+    gap_mm: float = 3.0
+    caption: bool = True
+    font_size: float = 7.0
+    dpi: int = 300
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    def page_points(self):
+        w, h = PAGE_SIZES[self.page]
+        return w * MM, h * MM
+
+    def cell_points(self):
+        pw, ph = self.page_points()
+        margin, gap = self.margin_mm * MM, self.gap_mm * MM
+        return ((pw - 2 * margin - (self.columns - 1) * gap) / self.columns,
+                (ph - 2 * margin - (self.rows - 1) * gap) / self.rows)
+
+    def code_points(self) -> float:
+        """Side of the square code inside a cell, leaving room for the caption."""
+        cw, ch = self.cell_points()
+        caption = self.font_size * CAPTION_GAP if self.caption else 0
+        return min(cw, ch - caption)
+
+    def code_pixels(self) -> int:
+        return max(64, round(self.code_points() / 72 * self.dpi))
+
+    def validate(self):
+        if self.page not in PAGE_SIZES:
+            raise ValueError(f"Unknown page size; use one of {', '.join(PAGE_SIZES)}.")
+        if not (1 <= self.columns <= 20 and 1 <= self.rows <= 40):
+            raise ValueError("Grid must be 1-20 columns by 1-40 rows.")
+        if self.code_points() < 10 * MM:
+            raise ValueError("Labels are too small; use fewer rows/columns or smaller margins.")
+
+
+def sheet_from_options(data) -> Sheet:
+    """Sheet from request/CLI fields (page, columns, rows, margin_mm, gap_mm, caption, font_size, dpi)."""
+    d = Sheet()
+    try:
+        sheet = Sheet(
+            page=str(data.get("page") or d.page),
+            columns=int(data.get("columns") or d.columns),
+            rows=int(data.get("rows") or d.rows),
+            margin_mm=float(data.get("margin_mm", d.margin_mm)),
+            gap_mm=float(data.get("gap_mm", d.gap_mm)),
+            caption=str(data.get("caption", d.caption)).lower() == "true",
+            font_size=min(max(float(data.get("font_size") or d.font_size), 4.0), 24.0),
+            dpi=min(max(int(data.get("dpi") or d.dpi), 72), 600),
+        )
+    except (TypeError, ValueError):
+        raise ValueError("Sheet options must be numbers.")
+    if sheet.margin_mm < 0 or sheet.gap_mm < 0:
+        raise ValueError("Margins and gaps cannot be negative.")
+    sheet.validate()
+    return sheet
+
+
+class Label(NamedTuple):
+    params: dict                  # render_qr_png_bytes kwargs
+    caption: str = ""
+    png_path: Optional[str] = None  # use an already rendered code instead
+
+
+def content_labels(items: Iterable, options: dict) -> Iterator[Label]:
+    """Labels for (content, caption) pairs, rendered with the generate fields in `options`."""
+    from .routes import parse_render_options  # routes imports this module
+
+    for content, caption in items:
+        yield Label(parse_render_options(dict(options, content=content)), caption)
+
+
+def stored_labels(ids: list, options: dict, user_id=None, captions: Optional[list] = None) -> Iterator[Label]:
+    """Labels for existing QRCode ids, in order, loading ID_CHUNK rows at a time.
+
+    The stored PNG is used as is; codes whose file was cleaned up are
+    rendered again from their content with `options`. Ids that are missing
+    (or, with `user_id`, not owned by that user) are skipped. `captions`
+    runs parallel to `ids`; an empty one falls back to the target or content.
+    """
+    from .routes import parse_render_options
+
+    folder = current_app.config["GENERATED_FOLDER"]
+    for start in range(0, len(ids), ID_CHUNK):
+        chunk = ids[start:start + ID_CHUNK]
+        query = QRCode.query.filter(QRCode.id.in_(chunk))
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        rows = {qr.id: (qr.content, qr.target) for qr in query}
+        for i, qid in enumerate(chunk, start=start):
+            if qid not in rows:
+                continue
+            content, target = rows[qid]
+            caption = (captions[i] if captions else "") or target or content
+            yield Label(parse_render_options(dict(options, content=content)), caption,
+                        png_path=os.path.join(folder, f"{qid}.png"))
+
+
+def render_label(label: Label, size_px: int) -> Image.Image:
+    if label.png_path:
+        try:
+            with Image.open(label.png_path) as img:
+                img.load()
+                return img.resize((size_px, size_px), Image.LANCZOS) if img.width > size_px else img.copy()
+        except OSError:
+            pass  # cleaned up or unreadable: render from the content instead
+    params = dict(label.params, size_px=size_px)
+    frame = params.pop("frame", None)
+    img = generate_qr_png(**params)
+    if frame is not None:
+        img = apply_frame(img, frame, params["bg"])
+    return img
+
+
+def _pdf_text(text: str) -> bytes:
+    raw = text.encode("latin-1", "replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _fit_caption(text: str, width: float, font_size: float) -> str:
+    # Helvetica averages about half an em per character
+    max_chars = max(4, int(width / (font_size * 0.5)))
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+
+def _image_object(img: Image.Image) -> bytes:
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    if img.mode == "RGB":
+        # Grey codes (the default black on white) take a third of the space as DeviceGray
+        r, g, b = (band.tobytes() for band in img.split())
+        if r == g == b:
+            img = img.getchannel(0)
+    colorspace = b"/DeviceGray" if img.mode == "L" else b"/DeviceRGB"
+    data = zlib.compress(img.tobytes(), 6)
+    header = (b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+              b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n"
+              % (img.width, img.height, colorspace, len(data)))
+    return header + data + b"\nendstream"
+
+
+class _PdfWriter:
+    """Numbers objects and tracks their byte offsets for the xref table."""
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_num = 1
+
+    def reserve(self) -> int:
+        num = self.next_num
+        self.next_num += 1
+        return num
+
+    def chunk(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def obj(self, num: int, body: bytes) -> bytes:
+        self.offsets[num] = self.offset
+        return self.chunk(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def trailer(self, root: int) -> bytes:
+        xref_at = self.offset
+        count = self.next_num
+        lines = [b"xref\n0 %d\n" % count, b"0000000000 65535 f \n"]
+        lines += [b"%010d 00000 n \n" % self.offsets[n] for n in range(1, count)]
+        lines.append(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, root, xref_at))
+        return self.chunk(b"".join(lines))
+
+
+def _pages(labels: Iterable[Label], per_page: int) -> Iterator[list]:
+    page = []
+    for label in labels:
+        page.append(label)
+        if len(page) == per_page:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def label_sheet_pdf(labels: Iterable[Label], sheet: Sheet) -> Iterator[bytes]:
+    """Yield the PDF for `labels` (any iterable, consumed lazily) in chunks."""
+    sheet.validate()
+    pdf = _PdfWriter()
+    catalog, pages, font = pdf.reserve(), pdf.reserve(), pdf.reserve()
+    page_w, page_h = sheet.page_points()
+    cell_w, cell_h = sheet.cell_points()
+    side = sheet.code_points()
+    size_px = sheet.code_pixels()
+    margin, gap = sheet.margin_mm * MM, sheet.gap_mm * MM
+    kids = []
+
+    yield pdf.chunk(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield pdf.obj(font, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    for page_labels in _pages(labels, sheet.per_page):
+        xobjects, ops, images = [], [], []
+        # Codes render one at a time, so a page needs its largest render's peak;
+        # the budget is released before the page is written to the client
+        peak = max(estimate_render_bytes(**dict(label.params, size_px=size_px)) for label in page_labels)
+        with render_budget.reserve(peak):
+            for i, label in enumerate(page_labels):
+                with stage("label_render"):
+                    img = render_label(label, size_px)
+                num = pdf.reserve()
+                images.append(pdf.obj(num, _image_object(img)))
+                del img
+                xobjects.append(b"/Im%d %d 0 R" % (i, num))
+        yield from images
+        del images
+
+        for i, label in enumerate(page_labels):
+            col, row = i % sheet.columns, i // sheet.columns
+            x = margin + col * (cell_w + gap)
+            top = page_h - margin - row * (cell_h + gap)
+            cx = x + (cell_w - side) / 2
+            ops.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q" % (side, side, cx, top - side, i))
+            if sheet.caption and label.caption:
+                text = _pdf_text(_fit_caption(label.caption, cell_w, sheet.font_size))
+                tx = x + max(0.0, (cell_w - len(text) * sheet.font_size * 0.5) / 2)
+                ty = top - side - sheet.font_size
+                ops.append(b"BT /F1 %.1f Tf %.2f %.2f Td (%s) Tj ET" % (sheet.font_size, tx, ty, text))
+
+        content = zlib.compress(b"\n".join(ops))
+        content_num, page_num = pdf.reserve(), pdf.reserve()
+        yield pdf.obj(content_num, b"<< /Filter /FlateDecode /Length %d >>\nstream\n" % len(content)
+                      + content + b"\nendstream")
+        yield pdf.obj(page_num, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+                                b"/Resources << /Font << /F1 %d 0 R >> /XObject << %s >> >> "
+                                b"/Contents %d 0 R >>"
+                      % (pages, page_w, page_h, font, b" ".join(xobjects), content_num))
+        kids.append(page_num)
+
+    yield pdf.obj(pages, b"<< /Type /Pages /Count %d /Kids [%s] >>"
+                  % (len(kids), b" ".join(b"%d 0 R" % k for k in kids)))
+    yield pdf.obj(catalog, b"<< /Type /Catalog /Pages %d 0 R >>" % pages)
+    yield pdf.trailer(catalog)
+
+
+@click.command("label-sheet")
+@click.argument("input_path", metavar="INPUT", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_path", metavar="OUTPUT", type=click.Path(dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["text", "csv", "ndjson"]),
+              help="Input format (default: from the file extension; text is one entry per line).")
+@click.option("--ids", "by_id", is_flag=True, help="Entries are ids of stored codes rather than contents.")
+@click.option("--page", type=click.Choice(list(PAGE_SIZES)), default=Sheet().page, show_default=True)
+@click.option("--grid", default=f"{Sheet().columns}x{Sheet().rows}", show_default=True, metavar="COLSxROWS")
+@click.option("--margin", "margin_mm", type=float, default=Sheet().margin_mm, show_default=True, help="Page margin in mm.")
+@click.option("--gap", "gap_mm", type=float, default=Sheet().gap_mm, show_default=True, help="Space between labels in mm.")
+@click.option("--caption/--no-caption", default=True, help="Print the content (or a CSV/NDJSON caption field) under each code.")
+@click.option("--font-size", type=float, default=Sheet().font_size, show_default=True)
+@click.option("--dpi", type=int, default=Sheet().dpi, show_default=True, help="Resolution codes are rendered at.")
+@click.option("--set", "extra", multiple=True, metavar="FIELD=VALUE",
+              help="Generate field for every code, e.g. --set fg_color=#003366.")
+@with_appcontext
+def label_sheet_command(input_path, output_path, fmt, by_id, page, grid, margin_mm, gap_mm, caption,
+                        font_size, dpi, extra):
+    """Lay codes out on printable N-up label sheets (PDF)."""
+    from .batch import read_records
+
+    columns, sep, rows = grid.lower().partition("x")
+    if not (sep and columns.isdigit() and rows.isdigit()):
+        raise click.BadParameter("expected COLSxROWS, e.g. 3x8", param_hint="--grid")
+    options = {}
+    for item in extra:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise click.BadParameter(f"expected FIELD=VALUE, got {item!r}", param_hint="--set")
+        options[key] = value
+    try:
+        sheet = sheet_from_options(dict(page=page, columns=columns, rows=rows, margin_mm=margin_mm,
+                                        gap_mm=gap_mm, caption=caption, font_size=font_size, dpi=dpi))
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    lower = input_path.lower()
+    fmt = fmt or ("csv" if lower.endswith(".csv") else "ndjson" if lower.endswith((".ndjson", ".jsonl")) else "text")
+    if fmt == "text":
+        with open(input_path, encoding="utf-8") as f:
+            entries = [(line.strip(), "") for line in f if line.strip()]
+    else:
+        field = "id" if by_id else "content"
+        entries = [(str(r.get(field) or ""), str(r.get("caption") or "")) for r in read_records(input_path, fmt)]
+
+    if by_id:
+        # Without a caption field, stored codes are captioned with their target or content
+        labels = stored_labels([qid for qid, _ in entries], options, captions=[c for _, c in entries])
+    else:
+        labels = content_labels([(content, caption or content) for content, caption in entries], options)
+    pages = 0
+    try:
+        with open(f"{output_path}.tmp", "wb") as out:
+            for chunk in label_sheet_pdf(labels, sheet):
+                out.write(chunk)
+                pages += b"/Type /Page /Parent" in chunk
+    except (BadRequest, ValueError) as e:
+        os.remove(f"{output_path}.tmp")
+        raise click.ClickException(getattr(e, "description", None) or str(e))
+    finally:
+        retire_process_metrics()
+    os.replace(f"{output_path}.tmp", output_path)
+    click.echo(f"Wrote {pages} page(s) to {output_path}.")
@@ -1,3 +1,6 @@
+from flask import current_app
+from flask_login import current_user
+from limits import parse
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
@@ -8,7 +11,38 @@ def get_rate_limit():
         return "100 per minute"  # Much more generous for development
     return "10 per minute"  # Production rate limit
 
+# Limits are resolved per request so RATELIMIT_*_LIMIT can raise the caps
+# (e.g. for load tests) without touching the decorators.
+def default_rate_limit():
+    return current_app.config.get("RATELIMIT_DEFAULT_LIMIT") or get_rate_limit()
+
+def generate_rate_limit():
+    return current_app.config.get("RATELIMIT_GENERATE_LIMIT") or get_rate_limit()
+
+# Previews only encode, so they get their own, much larger bucket
+def preview_rate_limit():
+    return current_app.config.get("RATELIMIT_PREVIEW_LIMIT") or "600 per minute"
+
+# Per-user budget of render cost units (see admission.render_cost), so a
+# 4096px code with a logo and duplicates counts for more than a 128px one.
+def generate_cost_limit():
+    return current_app.config.get("RATELIMIT_GENERATE_COST_LIMIT") or "300 per minute"
+
+def user_key():
+    if current_user.is_authenticated:
+        return f"user:{current_user.get_id()}"
+    return get_remote_address()
+
+def generate_cost():
+    from .admission import request_cost
+    # Never exceed the whole budget, or the request could never be admitted
+    return min(request_cost(), parse(generate_cost_limit()).amount)
+
+def labels_cost():
+    from .admission import labels_request_cost
+    return min(labels_request_cost(), parse(generate_cost_limit()).amount)
+
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=[get_rate_limit()]
+    default_limits=[default_rate_limit]
 )
\ No newline at end of file
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+
+from .passwords import HashingBusy, password_hasher
 
 db = SQLAlchemy()
 
@@ -11,14 +12,40 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """
+        Verify `password`; on success a hash made with outdated parameters is
+        replaced in place, so the caller's commit persists the upgrade. The
+        upgrade is skipped while hashing is saturated; a later login does it.
+        """
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            try:
+                self.password_hash = password_hasher.hash(password)
+            except HashingBusy:
+                pass
+        return True
 
 class QRCode(db.Model):
     id = db.Column(db.String(32), primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    user = db.relationship('User', backref=db.backref('qrcodes', lazy=True))
\ No newline at end of file
+    # Incremented in batches by qrapp.counters.download_counter
+    downloads = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Dynamic codes encode /r/<slug>, which redirects to the editable target
+    slug = db.Column(db.String(16), nullable=True)
+    target = db.Column(db.Text, nullable=True)
+    # Incremented in batches by qrapp.counters.click_counter
+    clicks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    user = db.relationship('User', backref=db.backref('qrcodes', lazy=True))
+
+    __table_args__ = (
+        # Per-user "most downloaded" listings walk this index instead of sorting
+        db.Index('ix_qr_code_user_downloads', 'user_id', 'downloads'),
+        # Unique index rather than a constraint so the migration can add it on SQLite
+        db.Index('ix_qr_code_slug', 'slug', unique=True),
+    )
\ No newline at end of file
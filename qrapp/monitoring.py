@@ -1,36 +1,413 @@
-import time
+import bisect
+import json
 import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import nullcontext
 from functools import wraps
-from flask import request, g, jsonify
+from flask import request, g, jsonify, has_app_context, abort
+from flask_login import login_required, current_user
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: archive writes are not serialized
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory metrics storage
-metrics = {
-    'request_count': 0,
-    'request_times': [],
-    'qr_generation_count': 0,
-    'qr_generation_times': []
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, math.inf)
+
+# name -> (type, help); histogram families are listed by their base name
+METRIC_FAMILIES = {
+    "http_requests_total": ("counter", "HTTP requests by method, endpoint and status."),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by endpoint."),
+    "http_response_bytes_total": ("counter", "Response body bytes served by endpoint."),
+    "qr_codes_generated_total": ("counter", "QR code renders."),
+    "qr_generation_duration_seconds": ("histogram", "QR code render latency."),
+    "cache_hits_total": ("counter", "Cache hits by cache name."),
+    "cache_misses_total": ("counter", "Cache misses by cache name."),
+    "qr_render_stage_seconds": ("histogram", "Time spent per render pipeline stage."),
+    "qr_segment_versions_saved_total": ("counter", "QR versions saved by optimal segmentation."),
+    "qr_segment_modules_saved_total": ("counter", "QR modules saved by optimal segmentation."),
+    "requests_shed_total": ("counter", "Requests rejected by load shedding, by reason."),
 }
 
+# histogram family -> bucket upper bounds (DURATION_BUCKETS otherwise)
+HISTOGRAM_BUCKETS = {
+    "qr_render_stage_seconds": STAGE_BUCKETS,
+}
+
+
+def _format_le(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+class _MmapValues:
+    """
+    Per-process file of (key, float64) slots, mapped into memory.
+
+    Layout: 8-byte header holding the used byte count, then entries of
+    [int32 key length][utf-8 key, padded to 8-byte alignment][float64 value].
+    Only the owning process writes; any process may read the file.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self.INITIAL_SIZE:
+            self._file.truncate(self.INITIAL_SIZE)
+            size = self.INITIAL_SIZE
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from("<i", self._map, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            struct.pack_into("<i", self._map, 0, self._used)
+        self._positions = {key: pos for key, _, pos in iter_entries(self._map, self._used)}
+
+    def _add_key(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        padding = (8 - (4 + len(encoded)) % 8) % 8
+        entry = struct.pack("<i", len(encoded)) + encoded + b" " * padding + struct.pack("<d", 0.0)
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._map.close()
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._map[self._used:self._used + len(entry)] = entry
+        self._used += len(entry)
+        struct.pack_into("<i", self._map, 0, self._used)
+        pos = self._used - 8
+        self._positions[key] = pos
+        return pos
+
+    def inc(self, key: str, amount: float):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._add_key(key)
+        value = struct.unpack_from("<d", self._map, pos)[0]
+        struct.pack_into("<d", self._map, pos, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def read_values(path: str):
+    """(key, value) pairs of one process file; empty if it is gone or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    if len(data) < 8:
+        return []
+    used = min(struct.unpack_from("<i", data, 0)[0], len(data))
+    return [(key, value) for key, value, _ in iter_entries(data, used)]
+
+
+def iter_entries(data, used: int):
+    pos = 8
+    while pos < used:
+        key_len = struct.unpack_from("<i", data, pos)[0]
+        pos += 4
+        key = bytes(data[pos:pos + key_len]).decode("utf-8")
+        pos += key_len + (8 - (4 + key_len) % 8) % 8
+        value = struct.unpack_from("<d", data, pos)[0]
+        yield key, value, pos
+        pos += 8
+
+
+class Metrics:
+    """
+    Counters and fixed-bucket histograms shared by all worker processes.
+
+    Each process writes its own mmap'd file in METRICS_FOLDER; a scrape sums
+    every file in the folder, so /metrics reflects the whole pod rather than
+    whichever worker answered. When a process exits, its file is folded into
+    metrics_archive.db (see mark_process_dead), so counters stay monotonic
+    while the folder holds one file per live process. Calls are no-ops
+    until init_app() has run.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.stage_timing = True
+        self._values = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.folder = app.config["METRICS_FOLDER"]
+        os.makedirs(self.folder, exist_ok=True)
+        self.stage_timing = app.config.get("STAGE_TIMING_ENABLED", True)
+        self._values = None
+        app.extensions["metrics"] = self
+
+    def _file(self):
+        # Re-opened after fork so every worker writes its own file.
+        if self._values is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = _MmapValues(os.path.join(self.folder, f"metrics_{self._pid}.db"))
+        return self._values
+
+    def close(self):
+        """Unmap this process's file; the next call opens it again."""
+        with self._lock:
+            if self._values is not None:
+                self._values.close()
+            self._values = None
+
+    @staticmethod
+    def _key(name: str, labels) -> str:
+        return json.dumps([name, sorted((labels or {}).items())], separators=(",", ":"))
+
+    def inc(self, name: str, labels=None, amount: float = 1.0):
+        if self.folder is None:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._file().inc(key, amount)
+
+    def observe(self, name: str, value: float, labels=None, buckets=None):
+        if self.folder is None:
+            return
+        labels = labels or {}
+        buckets = buckets or HISTOGRAM_BUCKETS.get(name, DURATION_BUCKETS)
+        bound = buckets[min(bisect.bisect_left(buckets, value), len(buckets) - 1)]
+        bucket_key = self._key(f"{name}_bucket", dict(labels, le=_format_le(bound)))
+        sum_key = self._key(f"{name}_sum", labels)
+        count_key = self._key(f"{name}_count", labels)
+        with self._lock:
+            values = self._file()
+            values.inc(bucket_key, 1.0)
+            values.inc(sum_key, value)
+            values.inc(count_key, 1.0)
+
+    def collect(self) -> dict:
+        """Sum every process file into {(name, labels tuple): value}."""
+        totals = {}
+        if self.folder is None:
+            return totals
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(".db"):
+                continue
+            for key, value in read_values(entry.path):
+                name, labels = json.loads(key)
+                series = (name, tuple(tuple(kv) for kv in labels))
+                totals[series] = totals.get(series, 0.0) + value
+        return totals
+
+    def histograms(self, totals=None) -> dict:
+        """{(family, labels without le): [(upper bound, cumulative count), ...]}"""
+        totals = self.collect() if totals is None else totals
+        raw = {}
+        for (name, labels), value in totals.items():
+            if not name.endswith("_bucket"):
+                continue
+            rest = tuple(kv for kv in labels if kv[0] != "le")
+            le = dict(labels)["le"]
+            raw.setdefault((name[:-len("_bucket")], rest), {})[float(le)] = value
+        result = {}
+        for series, counts in raw.items():
+            for bound in HISTOGRAM_BUCKETS.get(series[0], DURATION_BUCKETS):
+                counts.setdefault(bound, 0.0)
+            cumulative, running = [], 0.0
+            for bound in sorted(counts):
+                running += counts[bound]
+                cumulative.append((bound, running))
+            result[series] = cumulative
+        return result
+
+    def render_prometheus(self) -> str:
+        totals = self.collect()
+        lines = []
+        for family, (kind, help_text) in METRIC_FAMILIES.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            if kind == "histogram":
+                for (name, labels), buckets in sorted(self.histograms(totals).items()):
+                    if name != family:
+                        continue
+                    for bound, count in buckets:
+                        lines.append(_sample(f"{family}_bucket", labels + (("le", _format_le(bound)),), count))
+                    lines.append(_sample(f"{family}_sum", labels, totals.get((f"{family}_sum", labels), 0.0)))
+                    lines.append(_sample(f"{family}_count", labels, totals.get((f"{family}_count", labels), 0.0)))
+            else:
+                for (name, labels), value in sorted(totals.items()):
+                    if name == family:
+                        lines.append(_sample(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """Per-series count and p50/p95/p99 estimated from the buckets."""
+        out = {}
+        for (family, labels), buckets in sorted(self.histograms().items()):
+            label_text = ",".join(f"{k}={v}" for k, v in labels) or "all"
+            out.setdefault(family, {})[label_text] = {
+                "count": int(buckets[-1][1]) if buckets else 0,
+                "p50": quantile(0.50, buckets),
+                "p95": quantile(0.95, buckets),
+                "p99": quantile(0.99, buckets),
+            }
+        return out
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels, value: float) -> str:
+    label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    value_text = repr(float(value)) if value != int(value) else str(int(value))
+    return f"{name}{{{label_text}}} {value_text}" if label_text else f"{name} {value_text}"
+
+
+def quantile(q: float, buckets):
+    """Linear interpolation inside the bucket holding the q-th rank."""
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower, prev_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == math.inf:
+                return lower
+            if count == prev_count:
+                return bound
+            return lower + (bound - lower) * (rank - prev_count) / (count - prev_count)
+        lower, prev_count = bound, count
+    return lower
+
+
+ARCHIVE_FILE = "metrics_archive.db"
+
+
+def mark_process_dead(folder: str, pid: int):
+    """
+    Add an exited process's totals to the archive file and remove its file.
+
+    Called from the gunicorn master (child_exit) and by CLI commands on exit
+    (retire_process_metrics); an flock on the archive serializes them.
+    """
+    path = os.path.join(folder, f"metrics_{pid}.db")
+    values = read_values(path)
+    if values:
+        archive_path = os.path.join(folder, ARCHIVE_FILE)
+        lock = os.open(archive_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released by close()
+            # Mapped under the lock, so keys another writer added are seen
+            archive = _MmapValues(archive_path)
+            try:
+                for key, value in values:
+                    archive.inc(key, value)
+            finally:
+                archive.close()
+        finally:
+            os.close(lock)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def retire_process_metrics():
+    """
+    Archive this process's metrics file and remove it, for CLI commands that
+    share a server's METRICS_FOLDER; no gunicorn child_exit covers them.
+    """
+    if metrics.folder is None:
+        return
+    metrics.close()
+    mark_process_dead(metrics.folder, os.getpid())
+
+
+def clear_metric_files(folder: str):
+    """Start a server's counters from zero; Prometheus treats it as a counter reset."""
+    if not os.path.isdir(folder):
+        return
+    for entry in os.scandir(folder):
+        if entry.name.startswith("metrics_") and entry.name.endswith(".db"):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+metrics = Metrics()
+
+_NO_STAGE = nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        metrics.observe("qr_render_stage_seconds", duration, {"stage": self.name})
+        if has_app_context():
+            timings = g.get("stage_timings")
+            if timings is None:
+                timings = g.stage_timings = {}
+            timings[self.name] = timings.get(self.name, 0.0) + duration
+        return False
+
+
+def stage(name: str):
+    """
+    Time one render pipeline stage: `with stage("encode"): ...`.
+    Durations feed qr_render_stage_seconds and the request's Server-Timing
+    header; with STAGE_TIMING_ENABLED off this is a shared no-op context.
+    """
+    if not metrics.stage_timing:
+        return _NO_STAGE
+    return _StageTimer(name)
+
+
+def server_timing_header(timings) -> str:
+    return ", ".join(f"{name};dur={duration * 1000:.2f}" for name, duration in timings.items())
+
+
 def monitor_requests(app):
     """Add request monitoring to Flask app"""
-    
+
     @app.before_request
     def before_request():
-        g.start_time = time.time()
-    
+        g.start_time = time.perf_counter()
+
     @app.after_request
     def after_request(response):
         if hasattr(g, 'start_time'):
-            duration = time.time() - g.start_time
-            metrics['request_times'].append(duration)
-            metrics['request_count'] += 1
-            
-            # Keep only last 100 request times to prevent memory growth
-            if len(metrics['request_times']) > 100:
-                metrics['request_times'] = metrics['request_times'][-100:]
-                
+            duration = time.perf_counter() - g.start_time
+            endpoint = request.endpoint or "unmatched"
+            metrics.inc("http_requests_total", {
+                "method": request.method, "endpoint": endpoint, "status": str(response.status_code)
+            })
+            metrics.observe("http_request_duration_seconds", duration, {"endpoint": endpoint})
+            if response.content_length:
+                metrics.inc("http_response_bytes_total", {"endpoint": endpoint}, response.content_length)
+            timings = g.get("stage_timings")
+            if timings:
+                response.headers["Server-Timing"] = server_timing_header(
+                    dict(timings, total=duration)
+                )
         return response
 
 def track_qr_generation():
@@ -38,27 +415,21 @@ def track_qr_generation():
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
                 result = func(*args, **kwargs)
-                duration = time.time() - start_time
-                metrics['qr_generation_times'].append(duration)
-                metrics['qr_generation_count'] += 1
-                
-                # Keep only last 100 generation times
-                if len(metrics['qr_generation_times']) > 100:
-                    metrics['qr_generation_times'] = metrics['qr_generation_times'][-100:]
-                    
-                return result
             except Exception as e:
                 logger.error(f"QR generation failed: {e}")
                 raise
+            metrics.observe("qr_generation_duration_seconds", time.perf_counter() - start_time)
+            metrics.inc("qr_codes_generated_total")
+            return result
         return wrapper
     return decorator
 
 def setup_health_check(app):
     """Add health check endpoint"""
-    
+
     @app.route('/health')
     def health_check():
         return jsonify({
@@ -66,16 +437,18 @@ def setup_health_check(app):
             'timestamp': time.time(),
             'version': app.config.get('VERSION', '1.0.0')
         })
-    
+
     @app.route('/metrics')
     def metrics_endpoint():
-        avg_request_time = sum(metrics['request_times']) / len(metrics['request_times']) if metrics['request_times'] else 0
-        avg_qr_time = sum(metrics['qr_generation_times']) / len(metrics['qr_generation_times']) if metrics['qr_generation_times'] else 0
-        
+        return app.response_class(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    # Human-readable percentiles for admins; Prometheus scrapes /metrics instead
+    @app.route('/metrics/summary')
+    @login_required
+    def metrics_summary():
+        if not current_user.is_admin:
+            abort(403)
         return jsonify({
-            'request_count': metrics['request_count'],
-            'average_request_time': avg_request_time,
-            'qr_generation_count': metrics['qr_generation_count'],
-            'average_qr_generation_time': avg_qr_time,
+            'latency': metrics.summary(),
             'timestamp': time.time()
-        })
\ No newline at end of file
+        })
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from .monitoring import metrics, stage
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: slots only limit this process
+    fcntl = None
+
+# Methods that already hashed once in this process
+_checked_methods = set()
+
+
+class HashingBusy(ServiceUnavailable):
+    description = "Too many logins in progress. Please retry shortly."
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__()
+        self.retry_after = retry_after
+
+
+def normalize_method(method: str) -> str:
+    """Werkzeug hash method with its defaults spelled out, as stored in hashes."""
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        return "scrypt:32768:8:1"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    return method
+
+
+def check_method(method: str) -> str:
+    """Normalized `method`, or ValueError if werkzeug can't hash with it."""
+    method = normalize_method(method)
+    if method not in _checked_methods:
+        try:
+            generate_password_hash("startup check", method)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid PASSWORD_HASH_METHOD {method!r}: {e}") from None
+        _checked_methods.add(method)
+    return method
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification under a host-wide concurrency cap.
+
+    PASSWORD_HASH_WORKERS slots are flock'd files in PASSWORD_HASH_SLOT_FOLDER
+    shared by every gunicorn worker, so at most that many hashes run at once
+    however many workers there are; scrypt and pbkdf2 release the GIL, so
+    that bounds the cores a burst of logins can take from rendering. A
+    request waits up to PASSWORD_HASH_WAIT_SECONDS for a slot, and at most
+    PASSWORD_HASH_QUEUE requests per worker wait at all; beyond either, login
+    answers 503 with Retry-After instead of piling up.
+    PASSWORD_HASH_METHOD is any werkzeug method string ("scrypt:16384:8:1",
+    "pbkdf2:sha256:600000") and is checked at startup; hashes made with other
+    parameters are upgraded on the next good login.
+    """
+
+    def __init__(self):
+        self.method = normalize_method("scrypt")
+        self.workers = 2
+        self.max_waiting = 32
+        self.wait = 5.0
+        self.folder = None
+        self._files = None
+        self._held = set()
+        self._semaphore = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def init_app(self, app):
+        self.method = check_method(app.config.get("PASSWORD_HASH_METHOD", "scrypt"))
+        self.workers = max(1, int(app.config.get("PASSWORD_HASH_WORKERS") or self.workers))
+        self.max_waiting = int(app.config.get("PASSWORD_HASH_QUEUE", self.max_waiting))
+        self.wait = float(app.config.get("PASSWORD_HASH_WAIT_SECONDS", self.wait))
+        self.folder = app.config["PASSWORD_HASH_SLOT_FOLDER"]
+        os.makedirs(self.folder, exist_ok=True)
+        with self._lock:
+            self._files, self._pid = None, None
+        app.extensions["password_hasher"] = self
+
+    def _slots(self):
+        # Opened per process: a lock taken through an fd inherited across fork
+        # would be shared with the parent and siblings
+        if self._files is None or self._pid != os.getpid():
+            with self._lock:
+                if self._files is None or self._pid != os.getpid():
+                    self._files = [open(os.path.join(self.folder, f"slot{i}.lock"), "a")
+                                   for i in range(self.workers)]
+                    self._semaphore = threading.BoundedSemaphore(self.workers)
+                    self._held = set()
+                    self._pending = 0
+                    self._pid = os.getpid()
+        return self._files
+
+    def _try_acquire(self):
+        files = self._slots()
+        if fcntl is None:
+            return 0 if self._semaphore.acquire(blocking=False) else None
+        with self._lock:
+            # Threads of one process share the fds, so track held slots here too
+            for i, f in enumerate(files):
+                if i in self._held:
+                    continue
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(i)
+                return i
+        return None
+
+    def _release(self, slot: int):
+        if fcntl is None:
+            self._semaphore.release()
+            return
+        with self._lock:
+            fcntl.flock(self._files[slot], fcntl.LOCK_UN)
+            self._held.discard(slot)
+
+    def _acquire(self) -> int:
+        deadline = time.monotonic() + self.wait
+        delay = 0.002
+        while True:
+            slot = self._try_acquire()
+            if slot is not None:
+                return slot
+            if time.monotonic() >= deadline:
+                metrics.inc("requests_shed_total", {"reason": "password_hash"})
+                raise HashingBusy()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+
+    def _run(self, fn, *args):
+        self._slots()
+        with self._lock:
+            if self._pending >= self.workers + self.max_waiting:
+                metrics.inc("requests_shed_total", {"reason": "password_hash"})
+                raise HashingBusy()
+            self._pending += 1
+        try:
+            slot = self._acquire()
+            try:
+                with stage("password_hash"):
+                    return fn(*args)
+            finally:
+                self._release(slot)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return pwhash.split("$", 1)[0] != self.method
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run(check_password_hash, pwhash, password)
+
+
+password_hasher = PasswordHasher()
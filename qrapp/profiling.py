@@ -0,0 +1,144 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+
+from flask import request, g, jsonify, abort, send_from_directory
+from flask_login import login_required, current_user
+
+PROFILE_HEADER = "X-Profile"
+
+# cProfile may only run for one thread at a time on newer Pythons, so each
+# worker profiles at most one request concurrently and skips the rest.
+_active = threading.Lock()
+
+
+def _wants_profile(app) -> bool:
+    token = app.config.get("PROFILE_TOKEN")
+    header = request.headers.get(PROFILE_HEADER)
+    if token and header and hmac.compare_digest(header, token):
+        return True
+    rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _rotate(folder: str, keep: int):
+    """Keep the newest `keep` profiles; a .prof and its .mem.txt count as one."""
+    profiles = {}
+    for entry in os.scandir(folder):
+        name = entry.name.removesuffix(".mem.txt").removesuffix(".prof")
+        profiles.setdefault(name, []).append(entry)
+    newest = sorted(profiles, key=lambda n: max(e.stat().st_mtime for e in profiles[n]), reverse=True)
+    for name in newest[keep:]:
+        for entry in profiles[name]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _stop_tracing():
+    # Tracing slows every allocation; only keep it on while a profile runs
+    if g.pop("profile_started_tracing", False):
+        tracemalloc.stop()
+
+
+def _profile_name(endpoint: str) -> str:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return f"{stamp}-{int(time.time() * 1000) % 1000:03d}-{os.getpid()}-{endpoint or 'unmatched'}"
+
+
+def setup_profiling(app):
+    """
+    Sample a fraction of requests (PROFILE_SAMPLE_RATE) or any request
+    carrying `X-Profile: <PROFILE_TOKEN>` with cProfile, optionally with a
+    tracemalloc diff (PROFILE_TRACEMALLOC). Results land in PROFILE_FOLDER,
+    keeping the newest PROFILE_KEEP profiles; admins can list and fetch them.
+    """
+    folder = app.config["PROFILE_FOLDER"]
+    os.makedirs(folder, exist_ok=True)
+
+    @app.before_request
+    def start_profile():
+        if not _wants_profile(app) or not _active.acquire(blocking=False):
+            return
+        if app.config.get("PROFILE_TRACEMALLOC"):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                g.profile_started_tracing = True
+            g.profile_snapshot = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        g.profiler = profiler
+        profiler.enable()
+
+    @app.after_request
+    def finish_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        try:
+            name = _profile_name(request.endpoint)
+            profiler.dump_stats(os.path.join(folder, f"{name}.prof"))
+            before = g.pop("profile_snapshot", None)
+            if before is not None:
+                stats = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                with open(os.path.join(folder, f"{name}.mem.txt"), "w") as f:
+                    f.write(f"{request.method} {request.path}\n")
+                    for stat in stats[:50]:
+                        f.write(f"{stat}\n")
+            _rotate(folder, app.config.get("PROFILE_KEEP", 50))
+            response.headers["X-Profile-Id"] = name
+        except OSError as e:
+            app.logger.warning("Could not write profile: %s", e)
+        finally:
+            _stop_tracing()
+            _active.release()
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # after_request is skipped on unhandled errors; don't leak the lock.
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _stop_tracing()
+            _active.release()
+
+    def _require_admin():
+        if not current_user.is_admin:
+            abort(403)
+
+    @app.route("/admin/profiles", methods=["GET"])
+    @login_required
+    def list_profiles():
+        _require_admin()
+        entries = sorted(os.scandir(folder), key=lambda e: e.stat().st_mtime, reverse=True)
+        return jsonify({
+            "success": True,
+            "profiles": [
+                {"name": e.name, "size": e.stat().st_size, "modified": e.stat().st_mtime}
+                for e in entries
+            ],
+        })
+
+    @app.route("/admin/profiles/<name>", methods=["GET"])
+    @login_required
+    def get_profile(name):
+        _require_admin()
+        path = os.path.join(folder, name)
+        if os.path.basename(name) != name or not os.path.isfile(path):
+            abort(404)
+        if name.endswith(".prof") and request.args.get("format") == "text":
+            out = io.StringIO()
+            sort = request.args.get("sort", "cumulative")
+            if sort not in ("cumulative", "tottime", "calls"):
+                sort = "cumulative"
+            pstats.Stats(path, stream=out).sort_stats(sort).print_stats(60)
+            return app.response_class(out.getvalue(), mimetype="text/plain")
+        return send_from_directory(folder, name, as_attachment=True)
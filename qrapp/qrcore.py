@@ -0,0 +1,355 @@
+"""
+Encoder core for generate_qr_png.
+
+Produces exactly the module matrix `qrcode.QRCode.make(fit=True)` would
+(same version fitting, codewords and mask choice) but faster:
+
+- Reed-Solomon uses GF(256) log/antilog tables and, per EC codeword
+  count, a precomputed generator multiplication table.
+- Function patterns, reserved areas, the zig-zag data order and the eight
+  mask patterns are built once per version and cached.
+- The plain black-on-white raster is built from the module matrix in one
+  buffer rather than by drawing a rectangle per module.
+- For mask selection all rows and columns are packed into one big int
+  (one separator bit between lines), so applying a mask is a single XOR
+  and each of the four penalty rules is a handful of shifts, ANDs and
+  popcounts over every line at once instead of module-by-module loops.
+"""
+
+import bisect
+from functools import lru_cache
+from itertools import compress
+
+import qrcode
+from PIL import Image, ImageOps
+from qrcode import exceptions, util
+from qrcode.base import rs_blocks
+
+PAD_BYTES = (0xEC, 0x11)
+
+# GF(256) over x^8 + x^4 + x^3 + x^2 + 1, as used by QR codes
+EXP_TABLE = [0] * 512
+LOG_TABLE = [0] * 256
+_x = 1
+for _i in range(255):
+    EXP_TABLE[_i] = _x
+    LOG_TABLE[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11D
+for _i in range(255, 512):
+    EXP_TABLE[_i] = EXP_TABLE[_i - 255]
+
+# 1:1:3:1:1 finder-like patterns with four light modules on either side,
+# as (shift, dark) pairs from the least significant end of the window
+_FINDER_PATTERNS = [
+    [(j, bit == "1") for j, bit in enumerate(reversed(pattern))]
+    for pattern in ("10111010000", "00001011101")
+]
+_ASCII_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+@lru_cache(maxsize=None)
+def _generator_table(ec_count: int):
+    """
+    For each possible feedback byte, its product with the RS generator
+    polynomial of degree `ec_count` (leading term dropped).
+    """
+    poly = [1]
+    for i in range(ec_count):
+        nxt = poly + [0]
+        for j, coef in enumerate(poly):
+            if coef:
+                nxt[j + 1] ^= EXP_TABLE[LOG_TABLE[coef] + i]
+        poly = nxt
+    gen_logs = [LOG_TABLE[c] for c in poly[1:]]
+    table = [(0,) * ec_count]
+    for factor in range(1, 256):
+        lf = LOG_TABLE[factor]
+        table.append(tuple(EXP_TABLE[lf + g] for g in gen_logs))
+    return table
+
+
+def rs_remainder(data, ec_count: int) -> list:
+    """Reed-Solomon EC codewords for one block of data codewords."""
+    table = _generator_table(ec_count)
+    rem = [0] * ec_count
+    for byte in data:
+        row = table[byte ^ rem[0]]
+        rem = [r ^ p for r, p in zip(rem[1:], row)]
+        rem.append(row[-1])
+    return rem
+
+
+def _kanji_bits(data: bytes):
+    value = 0
+    for i in range(0, len(data), 2):
+        code = (data[i] << 8) | data[i + 1]
+        code -= 0x8140 if code <= 0x9FFC else 0xC140
+        value = (value << 13) | ((code >> 8) * 0xC0 + (code & 0xFF))
+    return value, 13 * (len(data) // 2)
+
+
+def segment_bits(segment):
+    """(value, bit count) of a segment's payload, without mode and length."""
+    data, mode = segment.data, segment.mode
+    if mode == util.MODE_NUMBER:
+        value, nbits = 0, 0
+        for i in range(0, len(data), 3):
+            chunk = data[i:i + 3]
+            width = util.NUMBER_LENGTH[len(chunk)]
+            value = (value << width) | int(chunk)
+            nbits += width
+        return value, nbits
+    if mode == util.MODE_ALPHA_NUM:
+        value, nbits = 0, 0
+        for i in range(0, len(data) - 1, 2):
+            value = (value << 11) | (util.ALPHA_NUM.find(data[i]) * 45 + util.ALPHA_NUM.find(data[i + 1]))
+            nbits += 11
+        if len(data) % 2:
+            value = (value << 6) | util.ALPHA_NUM.find(data[-1])
+            nbits += 6
+        return value, nbits
+    if mode == util.MODE_KANJI:
+        return _kanji_bits(data)
+    return int.from_bytes(data, "big"), 8 * len(data)
+
+
+def fit_version(segments, error_correction: int, payloads=None, start: int = 1) -> int:
+    """Smallest version holding `segments`; mirrors QRCode.best_fit()."""
+    payloads = payloads or [segment_bits(s) for s in segments]
+    while True:
+        sizes = util.mode_sizes_for_version(start)
+        needed = sum(4 + sizes[s.mode] + nbits for s, (_, nbits) in zip(segments, payloads))
+        version = bisect.bisect_left(util.BIT_LIMIT_TABLE[error_correction], needed, start)
+        if version == 41:
+            raise exceptions.DataOverflowError()
+        if sizes is util.mode_sizes_for_version(version):
+            return version
+        start = version
+
+
+def codewords(segments, version: int, error_correction: int, payloads=None) -> list:
+    """Data + EC codewords, interleaved; mirrors qrcode.util.create_data()."""
+    payloads = payloads or [segment_bits(s) for s in segments]
+    sizes = util.mode_sizes_for_version(version)
+    bits, length = 0, 0
+    for segment, (value, nbits) in zip(segments, payloads):
+        width = sizes[segment.mode]
+        bits = (((bits << 4 | segment.mode) << width | len(segment)) << nbits) | value
+        length += 4 + width + nbits
+
+    blocks = rs_blocks(version, error_correction)
+    bit_limit = sum(block.data_count for block in blocks) * 8
+    if length > bit_limit:
+        raise exceptions.DataOverflowError(
+            "Code length overflow. Data size (%s) > size available (%s)" % (length, bit_limit)
+        )
+    terminator = min(bit_limit - length, 4)
+    length += terminator
+    pad = -length % 8
+    bits <<= terminator + pad
+    length += pad
+    data = list(bits.to_bytes(length // 8, "big"))
+    data.extend(PAD_BYTES[i % 2] for i in range((bit_limit - length) // 8))
+
+    dcdata, ecdata, offset = [], [], 0
+    for block in blocks:
+        dc = data[offset:offset + block.data_count]
+        offset += block.data_count
+        dcdata.append(dc)
+        ecdata.append(rs_remainder(dc, block.total_count - block.data_count))
+
+    out = []
+    for group in (dcdata, ecdata):
+        for i in range(max(len(g) for g in group)):
+            out.extend(g[i] for g in group if i < len(g))
+    return out
+
+
+class _Layout:
+    """Per-version function patterns, data module order and mask bitboards."""
+
+    def __init__(self, version: int):
+        n = self.size = version * 4 + 17
+        # qrcode's own setup routines, in test mode (format/version areas light)
+        qr = qrcode.QRCode(version=version)
+        qr.modules_count = n
+        qr.modules = [[None] * n for _ in range(n)]
+        qr.setup_position_probe_pattern(0, 0)
+        qr.setup_position_probe_pattern(n - 7, 0)
+        qr.setup_position_probe_pattern(0, n - 7)
+        qr.setup_position_adjust_pattern()
+        qr.setup_timing_pattern()
+        qr.setup_type_info(True, 0)
+        if version >= 7:
+            qr.setup_type_number(True)
+        grid = qr.modules
+
+        top = n - 1
+        self.fixed_rows = [sum(1 << (top - c) for c in range(n) if grid[r][c]) for r in range(n)]
+        self.fixed_cols = [sum(1 << (top - r) for r in range(n) if grid[r][c]) for c in range(n)]
+
+        # Zig-zag order of data modules, as in QRCode.map_data()
+        order = []
+        row, inc = n - 1, -1
+        for col in range(n - 1, 0, -2):
+            if col <= 6:
+                col -= 1
+            while True:
+                for c in (col, col - 1):
+                    if grid[row][c] is None:
+                        order.append((row, 1 << (top - c), c, 1 << (top - row)))
+                row += inc
+                if row < 0 or row >= n:
+                    row -= inc
+                    inc = -inc
+                    break
+        self.order = order
+
+        self.mask_rows, self.packed_masks = [], []
+        for pattern in range(8):
+            func = util.mask_func(pattern)
+            rows, cols = [0] * n, [0] * n
+            for r, rbit, c, cbit in order:
+                if func(r, c):
+                    rows[r] |= rbit
+                    cols[c] |= cbit
+            self.mask_rows.append(rows)
+            self.packed_masks.append(self.pack(rows, cols))
+        self.packed_fixed = self.pack(self.fixed_rows, self.fixed_cols)
+
+        # Windows of width w that lie inside one line, by lowest bit
+        stride = n + 1
+        def windows(width, lines):
+            return sum(((1 << (n - width + 1)) - 1) << ((2 * n - 1 - t) * stride) for t in lines)
+        self.run_windows = windows(5, range(2 * n))
+        self.finder_windows = windows(11, range(2 * n))
+        # 2x2 blocks: row t paired with row t - 1
+        self.block_windows = windows(2, range(1, n))
+        self.rows_shift = n * stride
+
+    def pack(self, rows, cols) -> int:
+        """Rows then columns, one zero bit between lines, first row on top."""
+        fmt = f"0{self.size}b"
+        return int("0".join([format(x, fmt) for x in rows] + [format(x, fmt) for x in cols]), 2)
+
+
+@lru_cache(maxsize=40)
+def layout(version: int) -> _Layout:
+    return _Layout(version)
+
+
+def penalty(packed: int, lay: _Layout) -> int:
+    """util.lost_point() of a matrix packed by _Layout.pack()."""
+    n = lay.size
+    # Rule 1: runs of 5+ equal modules score 3 + (length - 5)
+    equal = ~(packed ^ (packed >> 1))
+    runs = equal & (equal >> 1) & (equal >> 2) & (equal >> 3) & lay.run_windows
+    points = runs.bit_count() + 2 * (runs & ~(runs << 1)).bit_count()
+
+    # Rule 2: 2x2 blocks of one color score 3 each
+    vertical = ~(packed ^ (packed >> (n + 1)))
+    points += 3 * (vertical & (vertical >> 1) & equal & lay.block_windows).bit_count()
+
+    # Rule 3: finder-like patterns score 40 each
+    shifted = [packed >> j for j in range(11)]
+    for pattern in _FINDER_PATTERNS:
+        hits = lay.finder_windows
+        for j, dark in pattern:
+            hits &= shifted[j] if dark else ~shifted[j]
+        points += 40 * hits.bit_count()
+
+    # Rule 4: 10 per 5% the dark share deviates from 50%
+    dark = (packed >> lay.rows_shift).bit_count()
+    percent = float(dark) / (n ** 2)
+    points += int(abs(percent * 100 - 50) / 5) * 10
+    return points
+
+
+def encode_rows(segments, error_correction: int, version=None, mask_pattern=None):
+    """
+    Returns (version, mask_pattern, rows, codewords) for `segments`
+    (QRData-like objects with .mode, .data and len()). Each row is an int
+    whose most significant of `size` bits is the leftmost module.
+    """
+    payloads = [segment_bits(s) for s in segments]
+    version = fit_version(segments, error_correction, payloads, start=version or 1)
+    data = codewords(segments, version, error_correction, payloads)
+    lay = layout(version)
+    n = lay.size
+
+    bitstring = format(int.from_bytes(bytes(data), "big"), f"0{len(data) * 8}b")
+    rows, cols = [0] * n, [0] * n
+    for r, rbit, c, cbit in compress(lay.order, bitstring.encode("ascii").translate(_ASCII_BITS)):
+        rows[r] |= rbit
+        cols[c] |= cbit
+
+    if mask_pattern is None:
+        best = None
+        packed = lay.pack(rows, cols)
+        for pattern in range(8):
+            points = penalty(lay.packed_fixed | packed ^ lay.packed_masks[pattern], lay)
+            if best is None or points < best:
+                best, mask_pattern = points, pattern
+
+    final = [f | d ^ m for f, d, m in zip(lay.fixed_rows, rows, lay.mask_rows[mask_pattern])]
+    return version, mask_pattern, final, data
+
+
+def encode(segments, error_correction: int, version=None, mask_pattern=None):
+    """
+    Returns (version, mask_pattern, modules, codewords) for `segments`
+    (QRData-like objects with .mode, .data and len()).
+    """
+    version, mask_pattern, rows, data = encode_rows(segments, error_correction, version, mask_pattern)
+    fmt = f"0{version * 4 + 17}b"
+    modules = [[bit == "1" for bit in format(row, fmt)] for row in rows]
+    return version, mask_pattern, modules, data
+
+
+def pack_rows(rows, size: int) -> bytes:
+    """Rows from encode_rows as MSB-first bytes, each row padded to whole bytes."""
+    row_bytes = (size + 7) // 8
+    pad = row_bytes * 8 - size
+    return b"".join((row << pad).to_bytes(row_bytes, "big") for row in rows)
+
+
+def make_qr(segments, error_correction: int, box_size: int = 10, border: int = 4, version=None) -> qrcode.QRCode:
+    """
+    A compiled qrcode.QRCode for `segments`, ready for make_image(), with
+    modules computed by this core instead of QRCode.make().
+    """
+    qr = qrcode.QRCode(error_correction=error_correction, box_size=box_size, border=border)
+    qr.data_list = list(segments)
+    version, mask_pattern, modules, data = encode(qr.data_list, qr.error_correction, version=version)
+    qr.version = version
+    qr.modules = modules
+    qr.modules_count = len(modules)
+    # Real format and version information, written by qrcode itself
+    qr.setup_type_info(False, mask_pattern)
+    if version >= 7:
+        qr.setup_type_number(False)
+    qr.data_cache = data
+    return qr
+
+
+def rasterize_mask(modules, box_size: int, border: int) -> Image.Image:
+    """
+    Black-on-white "L" image of `modules`, pixel-identical to
+    make_image(fill_color="black", back_color="white").convert("L") but
+    built from one bytes buffer instead of a rectangle per module.
+    """
+    n = len(modules)
+    dark = bytes([0, 255])
+    raw = b"".join(bytes(dark[not m] for m in row) for row in modules)
+    img = Image.frombytes("L", (n, n), raw)
+    if border:
+        img = ImageOps.expand(img, border=border, fill=255)
+    side = (n + 2 * border) * box_size
+    return img.resize((side, side), Image.NEAREST)
+
+
+def default_segments(data):
+    """The segments `QRCode.add_data(data)` would produce."""
+    return list(util.optimal_data_chunks(data, minimum=20))
@@ -1,22 +1,96 @@
 import os
-from flask import current_app, request, render_template, jsonify, send_from_directory, url_for, abort
+from flask import current_app, request, render_template, jsonify, send_from_directory, url_for, abort, redirect, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.exceptions import BadRequest
 
 from . import bp  # <-- import the blueprint
-from .validators import is_valid_url_or_text, normalize_error_correction, clamp_int, clamp_float, looks_like_url
-from .utils import save_upload, parse_colors, generate_qr_png, image_to_data_uri, persist_generated, cleanup_old_files
+from .validators import is_valid_url_or_text, normalize_error_correction, clamp_int, clamp_float, looks_like_url, is_hex_color
+from .utils import (save_upload, parse_colors, render_qr_png_bytes, png_to_data_uri, persist_png, cleanup_old_files, sweep_cache_folders, preview_matrix, check_fits,
+                    ensure_thumbnail, thumbnail_paths, THUMBNAIL_SIZES)
 from .models import db, QRCode
-from .limiter import limiter
+from .limiter import limiter, generate_rate_limit, generate_cost_limit, generate_cost, labels_cost, preview_rate_limit, user_key
 from .csrf import csrf
+from .history_cache import history_cache
+from .database import save_qrcodes, delete_qrcodes
+from .tasks import background, remove_files
+from .monitoring import stage
+from .budget import RenderBusy
+from .admission import load_shedder, label_sheet_cost
+from .counters import download_counter, click_counter
+from .dynamic import link_cache, new_slug, is_slug
+from .idempotency import IDEMPOTENCY_HEADER, idempotent_response, request_fingerprint
+from .styles import PATTERN_STYLES, EYE_STYLES, GRADIENT_DIRECTIONS
+from .frames import Frame, FRAME_STYLES, FRAME_GRADIENT_DIRECTIONS, MIN_THICKNESS, MAX_THICKNESS
+from .labels import ID_CHUNK, content_labels, label_sheet_pdf, sheet_from_options, stored_labels
 
 @bp.before_app_request
 def maybe_cleanup():
+    if request.endpoint == "qr.resolve":  # the redirect hot path never touches files
+        return
     try:
         cleanup_old_files()
+        sweep_cache_folders()
     except Exception as e:
         current_app.logger.debug("Cleanup skipped: %s", e)
 
+def _history_response(key, build):
+    """
+    Serve a per-user history JSON body from the history cache.
+    `build` is only called (and the DB only queried) when the user's history
+    version changed since the body was cached. The version doubles as ETag.
+    """
+    user_id = current_user.id
+    version = history_cache.version(user_id)
+    etag = history_cache.etag(user_id, version)
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        body = history_cache.get(user_id, key, version)
+        if body is None:
+            body = jsonify(build()).get_data()
+            history_cache.set(user_id, key, version, body)
+        resp = current_app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+class DictForm:
+    """Gives a plain dict (JSON body, CSV row) the request.form get(type=) interface."""
+    def __init__(self, d): self.d = d
+    def get(self, k, default=None, type=None):
+        v = self.d.get(k, default)
+        if type is int:
+            try: return int(v)
+            except: return default
+        if type is float:
+            try: return float(v)
+            except: return default
+        if type is str:
+            return "" if v is None else str(v)
+        return v
+
+def parse_render_options(data):
+    """generate form/JSON fields -> render_qr_png_bytes kwargs, validated like the API."""
+    return _render_kwargs(_extract_form_payload(DictForm(data), files={}))
+
+HISTORY_SORT_COLUMNS = {
+    "created_at": QRCode.created_at,
+    "content": QRCode.content,
+    "downloads": QRCode.downloads,
+}
+
+def _history_order(args):
+    """(ORDER BY clauses, cache key part) from sort_by / sort_order query args."""
+    sort_by = args.get("sort_by", "created_at")
+    if sort_by not in HISTORY_SORT_COLUMNS:
+        sort_by = "created_at"
+    sort_order = "asc" if args.get("sort_order", "desc").lower() == "asc" else "desc"
+    column = HISTORY_SORT_COLUMNS[sort_by]
+    primary = column.asc() if sort_order == "asc" else column.desc()
+    # Newest first among equal counts/contents keeps pages stable
+    clauses = (primary,) if sort_by == "created_at" else (primary, QRCode.created_at.desc())
+    return clauses, (sort_by, sort_order)
+
 def _extract_form_payload(form, files):
     content = form.get("content", "", type=str)
     if not is_valid_url_or_text(content):
@@ -46,29 +120,79 @@ def _extract_form_payload(form, files):
 
     return dict(content=content, ec=ec, size_px=size_px, box_size=box_size, margin=margin,
                 fg_hex=fg_hex, bg_hex=bg_hex, rounded=rounded, logo_path=logo_path,
-                logo_size=logo_size, duplicate_count=duplicate_count, auto_duplicate=auto_duplicate)
+                logo_size=logo_size, duplicate_count=duplicate_count, auto_duplicate=auto_duplicate,
+                style=_extract_style(form, fg_hex), frame=_extract_frame(form, fg_hex, bg_hex))
+
+def _form_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == "true"
+
+def _extract_style(form, fg_hex):
+    """
+    Pattern/eye shapes and gradient fill. Only non-default values are kept,
+    so plain codes keep their existing render keys.
+    """
+    style = {}
+    pattern_style = form.get("pattern_style", "square")
+    if pattern_style in PATTERN_STYLES and pattern_style != "square":
+        style["pattern_style"] = pattern_style
+    eye_style = form.get("eye_style", "square")
+    if eye_style in EYE_STYLES and eye_style != "square":
+        style["eye_style"] = eye_style
+    if _form_bool(form.get("gradient_enabled", False)):
+        start, end = form.get("gradient_start", fg_hex), form.get("gradient_end", fg_hex)
+        if not (is_hex_color(start) and is_hex_color(end)):
+            raise ValueError("Invalid gradient color.")
+        direction = form.get("gradient_direction", "horizontal")
+        style.update(gradient_enabled=True, gradient_start=start, gradient_end=end,
+                     gradient_direction=direction if direction in GRADIENT_DIRECTIONS else "horizontal")
+    return style
+
+def _extract_frame(form, fg_hex, bg_hex):
+    if not _form_bool(form.get("frame_enabled", False)):
+        return None
+    style = form.get("frame_style", "none")
+    if style not in FRAME_STYLES:
+        return None
+    thickness = clamp_int(form.get("frame_thickness", 4), MIN_THICKNESS, MAX_THICKNESS, 4)
+    color = form.get("frame_color", fg_hex)
+    if not is_hex_color(color):
+        raise ValueError("Invalid frame color.")
+    if not (_form_bool(form.get("frame_gradient_enabled", False)) or style == "gradient"):
+        return Frame(style, thickness, color)
+    start, end = form.get("frame_gradient_start", color), form.get("frame_gradient_end", bg_hex)
+    if not (is_hex_color(start) and is_hex_color(end)):
+        raise ValueError("Invalid frame gradient color.")
+    direction = form.get("frame_gradient_direction", "horizontal")
+    if direction not in FRAME_GRADIENT_DIRECTIONS:
+        direction = "horizontal"
+    return Frame(style, thickness, color, start, end, direction)
+
+def _render_kwargs(p):
+    return dict(data=p["content"], size_px=p["size_px"], error_correction=p["ec"],
+                fg=p["fg_hex"], bg=p["bg_hex"], box_size=p["box_size"],
+                border=p["margin"], rounded_ratio=p["rounded"], logo_path=p["logo_path"],
+                logo_size_percent=p["logo_size"], frame=p["frame"], **p["style"])
 
 @bp.route("/generate", methods=["POST"])
 @login_required
-@limiter.limit("100 per minute" if os.getenv("FLASK_ENV", "").lower() == "development" else "10 per minute")
+@load_shedder.guard
+@limiter.limit(generate_rate_limit)
+@limiter.limit(generate_cost_limit, key_func=user_key, cost=generate_cost)
 @csrf.exempt
 def generate():
     try:
         p = _extract_form_payload(request.form, request.files)
-        img = generate_qr_png(
-            data=p["content"], size_px=p["size_px"], error_correction=p["ec"],
-            fg=p["fg_hex"], bg=p["bg_hex"], box_size=p["box_size"],
-            border=p["margin"], rounded_ratio=p["rounded"], logo_path=p["logo_path"],
-            logo_size_percent=p["logo_size"]
-        )
-        data_uri = image_to_data_uri(img)
-        qid, _ = persist_generated(img)
+        png = render_qr_png_bytes(**_render_kwargs(p))
+        data_uri = png_to_data_uri(png)
+        qid, _ = persist_png(png)
         dl_url = url_for("qr.download", id=qid, _external=False)
 
         # Save to database
-        qr_entry = QRCode(id=qid, content=p["content"], user_id=current_user.id)
-        db.session.add(qr_entry)
-        db.session.commit()
+        with stage("db_commit"):
+            save_qrcodes([dict(id=qid, content=p["content"], user_id=current_user.id)])
+        history_cache.bump(current_user.id)
 
         if request.accept_mimetypes.best == "application/json":
             return jsonify({"id": qid, "download_url": dl_url, "data_uri": data_uri}), 201
@@ -82,7 +206,7 @@ def generate():
         )
     except ValueError as ve:
         raise BadRequest(str(ve))
-    except BadRequest:
+    except (BadRequest, RenderBusy):
         raise
     except Exception as e:
         current_app.logger.exception("Generation error: %s", e)
@@ -98,6 +222,7 @@ def download(id):
     path = os.path.join(folder, filename)
     if not os.path.isfile(path):
         abort(404)
+    download_counter.add(id)
     return send_from_directory(folder, filename, as_attachment=True, mimetype="image/png")
 
 # Add the API endpoint that the frontend expects
@@ -124,8 +249,25 @@ def api_download(id):
     if format_type not in ['png']:
         format_type = 'png'
     
+    download_counter.add(id)
     return send_from_directory(folder, filename, as_attachment=True, mimetype="image/png")
 
+@bp.route("/thumb/<id>", methods=["GET"])
+@login_required
+def thumbnail(id):
+    """Small rendition for listings. Generated ids never change content, so it is cached for good."""
+    if not id or len(id) < 8 or not id.isalnum():
+        abort(404)
+    size = request.args.get("s", THUMBNAIL_SIZES[0], type=int)
+    if size not in THUMBNAIL_SIZES:
+        size = THUMBNAIL_SIZES[0]
+    path = ensure_thumbnail(id, size)
+    if path is None:
+        abort(404)
+    resp = send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype="image/png")
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
+
 @bp.route("/dashboard", methods=["GET"])
 @login_required
 def dashboard():
@@ -134,7 +276,9 @@ def dashboard():
 
 @bp.route("/api/generate", methods=["POST"])
 @login_required
-@limiter.limit("100 per minute" if os.getenv("FLASK_ENV", "").lower() == "development" else "10 per minute")
+@load_shedder.guard
+@limiter.limit(generate_rate_limit)
+@limiter.limit(generate_cost_limit, key_func=user_key, cost=generate_cost)
 @csrf.exempt
 def api_generate():
     try:
@@ -148,36 +292,132 @@ def api_generate():
             data = request.get_json(force=True, silent=False) or {}
             files = {}
 
-        class Proxy:
-            def __init__(self, d): self.d = d
-            def get(self, k, default=None, type=None):
-                v = self.d.get(k, default)
-                if type is int:
-                    try: return int(v)
-                    except: return default
-                if type is float:
-                    try: return float(v)
-                    except: return default
-                if type is str:
-                    return "" if v is None else str(v)
-                return v
-
-        p = _extract_form_payload(Proxy(data), files=files)
+        # Retried requests carrying the same Idempotency-Key get the original response
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key:
+            return idempotent_response(
+                current_user.id, key, request_fingerprint(data, files),
+                lambda: _api_generate(data, files),
+            )
+        payload, status = _api_generate(data, files)
+        return jsonify(payload), status
+    except RenderBusy:
+        raise
+    except Exception as e:
+        current_app.logger.exception("API error: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+@bp.route("/api/preview", methods=["POST"])
+@login_required
+@limiter.limit(preview_rate_limit, key_func=user_key)
+@csrf.exempt
+def api_preview():
+    """Encode-only live preview: bit-packed module matrix, nothing persisted."""
+    data = request.get_json(silent=True) or request.form
+    content = str(data.get("content") or "")
+    if not is_valid_url_or_text(content):
+        return jsonify({"error": "Please provide text or a valid URL."}), 400
+    try:
+        ec = normalize_error_correction(data.get("error_correction", "M"))
+        return jsonify(preview_matrix(content, ec, logo=_form_bool(data.get("logo", False))))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+@bp.route("/api/labels", methods=["POST"])
+@login_required
+@load_shedder.guard
+@limiter.limit(generate_rate_limit)
+@limiter.limit(generate_cost_limit, key_func=user_key, cost=labels_cost)
+@csrf.exempt
+def api_labels():
+    """
+    N-up label sheets as a PDF, streamed page by page.
+    Body: {"contents": ["..." | {"content", "caption"}, ...]} or {"ids": [...]},
+    plus sheet fields (page, columns, rows, margin_mm, gap_mm, caption,
+    font_size, dpi) and any generate field applied to every code.
+    """
+    data = request.get_json(silent=True) or {}
+    contents, ids = data.get("contents"), data.get("ids")
+    if bool(contents) == bool(ids):
+        return jsonify({"error": "Provide either contents or ids"}), 400
+    entries = contents or ids
+    if not isinstance(entries, list):
+        return jsonify({"error": "contents/ids must be a list"}), 400
+    max_cost = current_app.config.get("LABELS_MAX_COST", 2500)
+    if len(entries) > max_cost:  # every label costs at least 1
+        return jsonify({"error": f"At most {max_cost} labels per request"}), 400
+    options = {k: v for k, v in data.items() if k not in ("contents", "ids")}
+
+    # Everything is checked before the first byte goes out; errors can't be reported mid-stream
+    try:
+        sheet = sheet_from_options(data)
+        # Bounded so the whole stream finishes well inside the worker timeout
+        if label_sheet_cost(len(entries), sheet.code_pixels()) > max_cost:
+            return jsonify({"error": f"Too many labels at {sheet.dpi} dpi; "
+                                     "split them across requests or lower the dpi"}), 400
+        if ids:
+            if not all(isinstance(i, str) for i in ids):
+                return jsonify({"error": "ids must be a list of strings"}), 400
+            unique = list(dict.fromkeys(ids))
+            contents = [
+                content
+                for i in range(0, len(unique), ID_CHUNK)
+                for (content,) in QRCode.query.with_entities(QRCode.content).filter(
+                    QRCode.id.in_(unique[i:i + ID_CHUNK]), QRCode.user_id == current_user.id)
+            ]
+            if len(contents) != len(unique):
+                abort(404)
+            labels = stored_labels(ids, options, user_id=current_user.id)
+        else:
+            pairs = []
+            for item in contents:
+                if isinstance(item, dict):
+                    content = str(item.get("content") or "")
+                    pairs.append((content, str(item.get("caption") or content)))
+                else:
+                    pairs.append((str(item), str(item)))
+            for content, _ in pairs:
+                if not is_valid_url_or_text(content):
+                    return jsonify({"error": f"Invalid content: {content[:50]!r}"}), 400
+            contents = [content for content, _ in pairs]
+            labels = content_labels(pairs, options)
+        # Stored codes whose file was cleaned up are re-rendered with these options too
+        render = parse_render_options(dict(options, content=contents[0]))
+        for content in contents:
+            check_fits(content, render["error_correction"], logo=bool(render["logo_path"]))
+    except BadRequest as e:
+        return jsonify({"error": e.description}), 400
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    resp = current_app.response_class(stream_with_context(label_sheet_pdf(labels, sheet)),
+                                      mimetype="application/pdf")
+    resp.headers["Content-Disposition"] = 'attachment; filename="labels.pdf"'
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def _api_generate(data, files):
+    """Render, persist and record one API request. Returns (payload, status)."""
+    try:
+        p = _extract_form_payload(DictForm(data), files=files)
+        dynamic = _form_bool(data.get("dynamic", False))
+        if dynamic:
+            # Encode a short redirect URL; the content becomes its editable target
+            if not looks_like_url(p["content"]):
+                raise ValueError("Dynamic QR codes need an http(s) URL.")
+            p["target"], p["slug"] = p["content"], new_slug()
+            p["content"] = _short_url(p["slug"])
         
         # Generate the primary QR code
-        img = generate_qr_png(
-            data=p["content"], size_px=p["size_px"], error_correction=p["ec"],
-            fg=p["fg_hex"], bg=p["bg_hex"], box_size=p["box_size"],
-            border=p["margin"], rounded_ratio=p["rounded"], logo_path=p["logo_path"],
-            logo_size_percent=p["logo_size"]
-        )
-        data_uri = image_to_data_uri(img)
-        qid, _ = persist_generated(img)
+        png = render_qr_png_bytes(**_render_kwargs(p))
+        data_uri = png_to_data_uri(png)
+        qid, _ = persist_png(png)
         dl_url = url_for("qr.download", id=qid, _external=False)
 
-        # Save primary QR to database
-        qr_entry = QRCode(id=qid, content=p["content"], user_id=current_user.id)
-        db.session.add(qr_entry)
+        # Primary QR row; saved together with any duplicates below
+        rows = [dict(id=qid, content=p["content"], user_id=current_user.id)]
+        if dynamic:
+            rows[0].update(slug=p["slug"], target=p["target"])
         
         # Handle automatic duplication
         duplicates = []
@@ -185,27 +425,30 @@ def api_generate():
             duplicate_count = p["duplicate_count"] if p["duplicate_count"] > 1 else 2  # Default to 2 if auto_duplicate is true
             
             for i in range(1, duplicate_count):  # Start from 1 since we already have the original
-                # Generate duplicate QR code with same parameters
-                duplicate_img = generate_qr_png(
-                    data=p["content"], size_px=p["size_px"], error_correction=p["ec"],
-                    fg=p["fg_hex"], bg=p["bg_hex"], box_size=p["box_size"],
-                    border=p["margin"], rounded_ratio=p["rounded"], logo_path=p["logo_path"],
-                    logo_size_percent=p["logo_size"]
-                )
-                duplicate_qid, _ = persist_generated(duplicate_img)
+                # Generate duplicate QR code with same parameters; dynamic copies
+                # get their own slug so each can be retargeted or deleted alone
+                dup = dict(p, slug=new_slug()) if dynamic else p
+                if dynamic:
+                    dup["content"] = _short_url(dup["slug"])
+                duplicate_png = render_qr_png_bytes(**_render_kwargs(dup))
+                duplicate_qid, _ = persist_png(duplicate_png)
                 duplicate_dl_url = url_for("qr.download", id=duplicate_qid, _external=False)
                 
-                # Save duplicate to database
-                duplicate_entry = QRCode(id=duplicate_qid, content=p["content"], user_id=current_user.id)
-                db.session.add(duplicate_entry)
+                rows.append(dict(id=duplicate_qid, content=dup["content"], user_id=current_user.id))
+                if dynamic:
+                    rows[-1].update(slug=dup["slug"], target=dup["target"])
                 
                 duplicates.append({
                     "id": duplicate_qid,
                     "download_url": duplicate_dl_url,
-                    "data_uri": image_to_data_uri(duplicate_img)
+                    "data_uri": png_to_data_uri(duplicate_png)
                 })
+                if dynamic:
+                    duplicates[-1].update(short_url=dup["content"], target_url=dup["target"])
         
-        db.session.commit()
+        with stage("db_commit"):
+            save_qrcodes(rows)
+        history_cache.bump(current_user.id)
 
         # Return response with original and duplicates
         response_data = {
@@ -215,13 +458,72 @@ def api_generate():
             "duplicates": duplicates,
             "total_generated": 1 + len(duplicates)
         }
+        if dynamic:
+            response_data.update(short_url=p["content"], target_url=p["target"])
         
-        return jsonify(response_data), 201
+        return response_data, 201
+    except RenderBusy:
+        raise
     except ValueError as ve:
-        return jsonify({"error": str(ve)}), 400
+        return {"error": str(ve)}, 400
     except Exception as e:
         current_app.logger.exception("API error: %s", e)
-        return jsonify({"error": "Internal server error"}), 500
+        return {"error": "Internal server error"}, 500
+
+def _short_url(slug):
+    base = current_app.config.get("DYNAMIC_BASE_URL")
+    if base:
+        return f"{base.rstrip('/')}/r/{slug}"
+    return url_for("qr.resolve", slug=slug, _external=True)
+
+@bp.route("/r/<slug>", methods=["GET"])
+@limiter.exempt
+def resolve(slug):
+    """
+    Redirect a dynamic code to its current target. Public and sessionless:
+    one small read and a dict lookup when the slug is cached, clicks are counted
+    in batches.
+    """
+    link = link_cache.resolve(slug) if is_slug(slug) else None
+    if link is None:
+        abort(404)
+    qid, target = link
+    click_counter.add(qid)
+    # 302, not 301: browsers cache permanent redirects and would miss edits
+    resp = redirect(target, code=302)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def _target_payload(qr):
+    # clicks lag the redirects by up to one COUNTER_FLUSH_SECONDS
+    return {'success': True, 'id': qr.id, 'short_url': qr.content, 'target_url': qr.target, 'clicks': qr.clicks}
+
+@bp.route("/api/qr/<id>/target", methods=["GET"])
+@login_required
+def api_get_target(id):
+    """A dynamic code's target and click count, read uncached."""
+    qr = QRCode.query.filter_by(id=id, user_id=current_user.id).first()
+    if not qr or not qr.slug:
+        return jsonify({'success': False, 'error': 'Dynamic QR code not found'}), 404
+    return jsonify(_target_payload(qr))
+
+@bp.route("/api/qr/<id>/target", methods=["PUT"])
+@login_required
+@csrf.exempt
+def api_update_target(id):
+    """Point a dynamic code at a new URL."""
+    data = request.get_json(silent=True) or {}
+    target = str(data.get("target_url") or "").strip()
+    if not looks_like_url(target):
+        return jsonify({'success': False, 'error': 'Please provide an http(s) URL.'}), 400
+    qr = QRCode.query.filter_by(id=id, user_id=current_user.id).first()
+    if not qr or not qr.slug:
+        return jsonify({'success': False, 'error': 'Dynamic QR code not found'}), 404
+    qr.target = target
+    db.session.commit()
+    link_cache.bump(qr.slug)
+    history_cache.bump(current_user.id)
+    return jsonify(_target_payload(qr))
 
 @bp.route("/api/qr/user", methods=["GET"])
 @login_required
@@ -229,27 +531,34 @@ def api_get_user_qrs():
     try:
         page = request.args.get('page', 1, type=int)
         limit = min(request.args.get('limit', 10, type=int), 50)  # Cap at 50
-        
-        qrs = QRCode.query.filter_by(user_id=current_user.id)\
-                         .order_by(QRCode.created_at.desc())\
-                         .paginate(page=page, per_page=limit, error_out=False)
-        
-        qr_list = []
-        for qr in qrs.items:
-            qr_list.append({
-                'id': qr.id,
-                'content': qr.content,
-                'created_at': qr.created_at.isoformat(),
-                'download_url': url_for('qr.download', id=qr.id, _external=False)
-            })
-        
-        return jsonify({
-            'success': True,
-            'qrs': qr_list,
-            'total': qrs.total,
-            'page': page,
-            'pages': qrs.pages
-        })
+        order, order_key = _history_order(request.args)
+
+        def build():
+            qrs = QRCode.query.filter_by(user_id=current_user.id)\
+                             .order_by(*order)\
+                             .paginate(page=page, per_page=limit, error_out=False)
+
+            qr_list = []
+            for qr in qrs.items:
+                qr_list.append({
+                    'id': qr.id,
+                    'content': qr.content,
+                    'created_at': qr.created_at.isoformat(),
+                    'downloads': qr.downloads,
+                    'target_url': qr.target,
+                    'download_url': url_for('qr.download', id=qr.id, _external=False),
+                    'thumbnail_url': url_for('qr.thumbnail', id=qr.id, _external=False)
+                })
+
+            return {
+                'success': True,
+                'qrs': qr_list,
+                'total': qrs.total,
+                'page': page,
+                'pages': qrs.pages
+            }
+
+        return _history_response(("user", page, limit) + order_key, build)
     except Exception as e:
         current_app.logger.exception("API error: %s", e)
         return jsonify({'success': False, 'error': 'Failed to fetch QR codes'}), 500
@@ -263,25 +572,56 @@ def api_delete_qr(id):
         if not qr:
             return jsonify({'success': False, 'error': 'QR code not found'}), 404
         
-        # Delete the file
-        filename = f"{id}.png"
-        folder = current_app.config["GENERATED_FOLDER"]
-        path = os.path.join(folder, filename)
-        if os.path.isfile(path):
-            try:
-                os.remove(path)
-            except OSError:
-                pass
-        
-        # Delete from database
+        # Delete from database; the file is removed in the background
+        slug = qr.slug
         db.session.delete(qr)
         db.session.commit()
+        history_cache.bump(current_user.id)
+        if slug:
+            link_cache.bump(slug)
+
+        folder = current_app.config["GENERATED_FOLDER"]
+        background.submit(remove_files, [os.path.join(folder, f"{id}.png")] + thumbnail_paths(folder, id))
         
         return jsonify({'success': True})
     except Exception as e:
         current_app.logger.exception("API error: %s", e)
         return jsonify({'success': False, 'error': 'Failed to delete QR code'}), 500
 
+@bp.route("/api/qr/bulk-delete", methods=["POST"])
+@login_required
+@csrf.exempt
+def api_bulk_delete_qrs():
+    """
+    Delete many of the current user's QR codes in one request.
+    Body: {"ids": [...]} or {"q": "<search text>"} (both narrows the ids).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get("ids")
+        query = (data.get("q") or "").strip()
+
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, str) for i in ids)):
+            return jsonify({'success': False, 'error': 'ids must be a list of strings'}), 400
+        if not ids and not query:
+            return jsonify({'success': False, 'error': 'Provide ids or a search query'}), 400
+
+        deleted = delete_qrcodes(current_user.id, ids=ids or None, query=query or None)
+        if deleted:
+            history_cache.bump(current_user.id)
+            link_cache.bump(*(slug for _, slug in deleted if slug))
+            folder = current_app.config["GENERATED_FOLDER"]
+            paths = []
+            for qid, _ in deleted:
+                paths.append(os.path.join(folder, f"{qid}.png"))
+                paths.extend(thumbnail_paths(folder, qid))
+            background.submit(remove_files, paths)
+
+        return jsonify({'success': True, 'deleted': len(deleted)})
+    except Exception as e:
+        current_app.logger.exception("API error: %s", e)
+        return jsonify({'success': False, 'error': 'Failed to delete QR codes'}), 500
+
 @bp.route("/api/qr/search", methods=["GET"])
 @login_required
 def api_search_qrs():
@@ -292,10 +632,11 @@ def api_search_qrs():
         
         if not query:
             return jsonify({'success': True, 'qrs': []})
+        order, _ = _history_order(request.args)
         
         qrs = QRCode.query.filter_by(user_id=current_user.id)\
                          .filter(QRCode.content.contains(query))\
-                         .order_by(QRCode.created_at.desc())\
+                         .order_by(*order)\
                          .paginate(page=page, per_page=limit, error_out=False)
         
         qr_list = []
@@ -304,7 +645,10 @@ def api_search_qrs():
                 'id': qr.id,
                 'content': qr.content,
                 'created_at': qr.created_at.isoformat(),
-                'download_url': url_for('qr.download', id=qr.id, _external=False)
+                'downloads': qr.downloads,
+                'target_url': qr.target,
+                'download_url': url_for('qr.download', id=qr.id, _external=False),
+                'thumbnail_url': url_for('qr.thumbnail', id=qr.id, _external=False)
             })
         
         return jsonify({
@@ -322,28 +666,34 @@ def api_search_qrs():
 @login_required
 def api_dashboard():
     try:
-        qrs = QRCode.query.filter_by(user_id=current_user.id)\
-                         .order_by(QRCode.created_at.desc())\
-                         .limit(10).all()
-        
-        qr_list = []
-        for qr in qrs:
-            qr_list.append({
-                'id': qr.id,
-                'content': qr.content,
-                'created_at': qr.created_at.isoformat(),
-                'download_url': url_for('qr.download', id=qr.id, _external=False)
-            })
-        
-        return jsonify({
-            'success': True,
-            'user': {
-                'id': current_user.id,
-                'username': current_user.username,
-                'isAdmin': current_user.is_admin
-            },
-            'qrs': qr_list
-        })
+        def build():
+            qrs = QRCode.query.filter_by(user_id=current_user.id)\
+                             .order_by(QRCode.created_at.desc())\
+                             .limit(10).all()
+
+            qr_list = []
+            for qr in qrs:
+                qr_list.append({
+                    'id': qr.id,
+                    'content': qr.content,
+                    'created_at': qr.created_at.isoformat(),
+                    'downloads': qr.downloads,
+                    'target_url': qr.target,
+                    'download_url': url_for('qr.download', id=qr.id, _external=False),
+                    'thumbnail_url': url_for('qr.thumbnail', id=qr.id, _external=False)
+                })
+
+            return {
+                'success': True,
+                'user': {
+                    'id': current_user.id,
+                    'username': current_user.username,
+                    'isAdmin': current_user.is_admin
+                },
+                'qrs': qr_list
+            }
+
+        return _history_response(("dashboard",), build)
     except Exception as e:
         current_app.logger.exception("API error: %s", e)
         return jsonify({'success': False, 'error': 'Failed to fetch dashboard data'}), 500
@@ -0,0 +1,195 @@
+"""
+Minimum-bit splitting of QR content into numeric, alphanumeric, byte and
+Kanji segments.
+
+qrcode's add_data() only splits off numeric/alphanumeric runs of 20+
+characters; for URLs and product codes the optimal split is often one or
+more versions smaller. The optimizer is the usual dynamic program over
+characters (costs in 1/6 bit so numeric's 10/3 and alphanumeric's 11/2
+bits per character stay integral), run once per version class because
+the character-count field width depends on the version.
+"""
+
+import bisect
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from qrcode import util
+from qrcode.exceptions import DataOverflowError
+
+from .qrcore import default_segments, fit_version, segment_bits
+
+MODES = (util.MODE_8BIT_BYTE, util.MODE_ALPHA_NUM, util.MODE_NUMBER, util.MODE_KANJI)
+_ALPHA_NUM = frozenset(util.ALPHA_NUM.decode("ascii"))
+# (first version, last version) sharing one set of character-count widths
+VERSION_CLASSES = ((1, 9), (10, 26), (27, 40))
+
+
+class Segment:
+    """One QR data segment; quacks like qrcode.util.QRData for qrapp.qrcore."""
+
+    __slots__ = ("mode", "data", "chars")
+
+    def __init__(self, mode: int, data: bytes, chars: int):
+        self.mode, self.data, self.chars = mode, data, chars
+
+    def __len__(self):
+        return self.chars
+
+    def __repr__(self):
+        return f"Segment(mode={self.mode}, data={self.data!r})"
+
+
+class SegmentPlan(NamedTuple):
+    segments: list
+    version: int
+    default_version: int
+
+    @property
+    def versions_saved(self) -> int:
+        return self.default_version - self.version
+
+    @property
+    def modules_saved(self) -> int:
+        """Difference in symbol modules (size squared) against qrcode's split."""
+        return (self.default_version * 4 + 17) ** 2 - (self.version * 4 + 17) ** 2
+
+
+# Shift JIS also covers Greek, Cyrillic and box drawing, which many non-Japanese
+# scanners misdecode in Kanji mode; only Japanese script is worth the 13-bit form
+KANJI_RANGES = (
+    (0x3000, 0x30FF),  # CJK punctuation, hiragana, katakana
+    (0x3400, 0x4DBF),  # CJK extension A
+    (0x4E00, 0x9FFF),  # CJK unified ideographs
+    (0xF900, 0xFAFF),  # CJK compatibility ideographs
+    (0xFF01, 0xFF9F),  # full-width forms, half-width katakana
+)
+
+
+def _kanji_bytes(ch: str) -> Optional[bytes]:
+    code = ord(ch)
+    if not any(lo <= code <= hi for lo, hi in KANJI_RANGES):
+        return None
+    try:
+        encoded = ch.encode("shift_jis")
+    except UnicodeEncodeError:
+        return None
+    if len(encoded) != 2:
+        return None
+    code = (encoded[0] << 8) | encoded[1]
+    if 0x8140 <= code <= 0x9FFC or 0xE040 <= code <= 0xEBBF:
+        return encoded
+    return None
+
+
+def _utf8_len(ch: str) -> int:
+    code = ord(ch)
+    return 1 if code < 0x80 else 2 if code < 0x800 else 3 if code < 0x10000 else 4
+
+
+def _char_modes(text: str, widths: dict, kanji: bool) -> list:
+    """Index into MODES of every character in a minimum-bit encoding of `text`."""
+    head = [(4 + widths[m]) * 6 for m in MODES]
+    prev = head[:]
+    choices = []
+    for ch in text:
+        cur = [prev[0] + _utf8_len(ch) * 48, None, None, None]
+        came = [0, None, None, None]
+        if ch in _ALPHA_NUM:
+            cur[1], came[1] = prev[1] + 33, 1
+            if "0" <= ch <= "9":
+                cur[2], came[2] = prev[2] + 20, 2
+        elif kanji and ord(ch) >= 0x80 and _kanji_bytes(ch) is not None:
+            cur[3], came[3] = prev[3] + 78, 3
+        # Cheapest mode to end a segment in after this character (whole bits),
+        # then start a new segment in each mode from there
+        best, frm = None, 0
+        for m in range(4):
+            if cur[m] is not None:
+                rounded = (cur[m] + 5) // 6 * 6
+                if best is None or rounded < best:
+                    best, frm = rounded, m
+        for to in range(4):
+            cost = best + head[to]
+            if cur[to] is None or cost < cur[to]:
+                cur[to], came[to] = cost, frm
+        choices.append(came)
+        prev = cur
+
+    mode = min(range(4), key=lambda m: prev[m])
+    modes = [0] * len(text)
+    for i in range(len(text) - 1, -1, -1):
+        mode = choices[i][mode]
+        modes[i] = mode
+    return modes
+
+
+def _build_segments(text: str, modes: list) -> list:
+    segments = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if i < len(text) and modes[i] == modes[start]:
+            continue
+        chunk = text[start:i]
+        mode = MODES[modes[start]]
+        if mode == util.MODE_KANJI:
+            data = b"".join(_kanji_bytes(ch) for ch in chunk)
+        else:
+            data = chunk.encode("utf-8")
+        segments.append(Segment(mode, data, len(chunk) if mode != util.MODE_8BIT_BYTE else len(data)))
+        start = i
+    return segments
+
+
+def uppercase_url_host(text: str) -> str:
+    """
+    Uppercase the scheme and host of an http(s) URL. Both are
+    case-insensitive, and uppercase lets them use alphanumeric mode.
+    """
+    try:
+        parts = urlsplit(text)
+    except ValueError:
+        return text
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc or not parts.netloc.isascii():
+        return text
+    if "@" in parts.netloc:  # userinfo is case-sensitive
+        return text
+    prefix = f"{parts.scheme}://{parts.netloc}"
+    if not text.startswith(prefix):
+        return text
+    return prefix.upper() + text[len(prefix):]
+
+
+def optimal_segments(text: str, error_correction: int, kanji: bool = True):
+    """
+    (segments, version) for the smallest version any segmentation of
+    `text` fits in.
+    """
+    limits = util.BIT_LIMIT_TABLE[error_correction]
+    # No segmentation beats 10 bits per 3 characters
+    lower_bound = len(text) * 10 // 3
+    for first, last in VERSION_CLASSES:
+        if limits[last] < lower_bound and last < 40:
+            continue
+        widths = util.mode_sizes_for_version(first)
+        segments = _build_segments(text, _char_modes(text, widths, kanji))
+        needed = sum(4 + widths[s.mode] + segment_bits(s)[1] for s in segments)
+        version = bisect.bisect_left(limits, needed, first)
+        if version <= last:
+            return segments, version
+    # Too long for any version; let the encoder raise its overflow error
+    return segments, 40
+
+
+def plan_segments(text: str, error_correction: int, uppercase_url: bool = False, kanji: bool = True) -> SegmentPlan:
+    """Optimal segments plus how they compare with qrcode's default split."""
+    try:
+        default_version = fit_version(default_segments(text), error_correction)
+    except DataOverflowError:
+        default_version = 41
+    if uppercase_url:
+        text = uppercase_url_host(text)
+    segments, version = optimal_segments(text, error_correction, kanji=kanji)
+    if version > default_version:  # never worse than qrcode's own split
+        return SegmentPlan(default_segments(text), default_version, default_version)
+    return SegmentPlan(segments, version, default_version)
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: cross-worker sharing is unavailable
+    fcntl = None
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution.
+    The first caller (the leader) runs the function; callers arriving while
+    it is in flight wait and receive the same result or exception.
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns (result, shared) where shared is True for waiting callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+
+def _read_fresh(path: str, ttl: float):
+    try:
+        if time.time() - os.stat(path).st_mtime > ttl:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _publish(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def shared_across_workers(folder: str, key: str, ttl: float, fn, should_publish=None):
+    """
+    Cross-process variant for bytes results: an flock on <key>.lock elects
+    one process to run `fn`; it publishes the bytes as <key>.bin and
+    processes that queued on the lock reuse them for `ttl` seconds.
+    `should_publish(result)` can veto publishing (e.g. error responses).
+    Returns (result, shared).
+    """
+    result_path = os.path.join(folder, f"{key}.bin")
+    cached = _read_fresh(result_path, ttl)
+    if cached is not None:
+        return cached, True
+
+    os.makedirs(folder, exist_ok=True)
+    if fcntl is None:
+        result = fn()
+        if should_publish is None or should_publish(result):
+            _publish(result_path, result)
+        return result, False
+
+    lock_path = os.path.join(folder, f"{key}.lock")
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            cached = _read_fresh(result_path, ttl)
+            if cached is not None:
+                return cached, True
+            result = fn()
+            if should_publish is None or should_publish(result):
+                _publish(result_path, result)
+            os.utime(lock_path)
+            return result, False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+render_flight = SingleFlight()
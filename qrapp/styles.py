@@ -0,0 +1,119 @@
+"""
+Module shapes, finder-eye shapes and gradient fills for generate_qr_png.
+
+Everything is done with whole-image Pillow operations: a module shape is
+drawn once as a small stamp, tiled over the symbol and multiplied with
+the upscaled module grid; finder eyes are one precomputed stamp pasted
+three times; gradients are a resized ramp mapped through a color LUT.
+Stamps and tiles are cached, so a styled render costs a few image-wide
+passes on top of a plain one rather than per-module or per-pixel Python.
+"""
+
+from functools import lru_cache
+
+from PIL import Image, ImageChops, ImageDraw, ImageOps
+
+PATTERN_STYLES = ("square", "circle", "rounded")
+EYE_STYLES = ("square", "circle", "rounded")
+GRADIENT_DIRECTIONS = ("horizontal", "vertical", "diagonal")
+DEFAULT_ROUNDED_RATIO = 0.3
+
+# Shapes are drawn at this multiple of their final size, then box-reduced
+_SUPERSAMPLE = 4
+
+
+def _draw_shape(draw, box, shape: str, radius: float):
+    if shape == "circle":
+        draw.ellipse(box, fill=255)
+    elif shape == "rounded":
+        draw.rounded_rectangle(box, radius=radius, fill=255)
+    else:
+        draw.rectangle(box, fill=255)
+
+
+@lru_cache(maxsize=32)
+def module_stamp(shape: str, box_size: int, radius_ratio: float) -> Image.Image:
+    """One module's ink ("L", 255 = dark) as a box_size square."""
+    side = box_size * _SUPERSAMPLE
+    img = Image.new("L", (side, side), 0)
+    _draw_shape(ImageDraw.Draw(img), (0, 0, side - 1, side - 1), shape, side * radius_ratio)
+    return img.reduce(_SUPERSAMPLE)
+
+
+@lru_cache(maxsize=32)
+def eye_stamp(shape: str, box_size: int) -> Image.Image:
+    """A 7x7-module finder pattern (ring + 3x3 ball) in the given shape."""
+    unit = box_size * _SUPERSAMPLE
+    side = 7 * unit
+    img = Image.new("L", (side, side), 0)
+    _draw_shape(ImageDraw.Draw(img), (0, 0, side - 1, side - 1), shape, 2 * unit)
+    hole = Image.new("L", (side, side), 0)
+    _draw_shape(ImageDraw.Draw(hole), (unit, unit, side - unit - 1, side - unit - 1), shape, 1.5 * unit)
+    img = ImageChops.subtract(img, hole)
+    _draw_shape(ImageDraw.Draw(img), (2 * unit, 2 * unit, side - 2 * unit - 1, side - 2 * unit - 1), shape, unit)
+    return img.reduce(_SUPERSAMPLE)
+
+
+@lru_cache(maxsize=8)
+def _module_tile(shape: str, box_size: int, count: int, radius_ratio: float) -> Image.Image:
+    """`module_stamp` repeated over a count x count module grid."""
+    stamp = module_stamp(shape, box_size, radius_ratio)
+    strip = Image.new("L", (count * box_size, box_size), 0)
+    for i in range(count):
+        strip.paste(stamp, (i * box_size, 0))
+    tile = Image.new("L", (count * box_size, count * box_size), 0)
+    for j in range(count):
+        tile.paste(strip, (0, j * box_size))
+    return tile
+
+
+def eye_origins(count: int):
+    """(row, col) of the three finder patterns' top-left modules."""
+    return ((0, 0), (0, count - 7), (count - 7, 0))
+
+
+def styled_mask(modules, box_size: int, border: int, pattern_style: str = "square",
+                eye_style: str = "square", radius_ratio: float = 0.0) -> Image.Image:
+    """
+    Black-on-white "L" mask of the symbol (dark = 0), the same convention
+    as the plain raster, with shaped data modules and finder eyes. Square
+    modules with a `radius_ratio` keep their rounding, as they do unstyled.
+    """
+    n = len(modules)
+    if pattern_style == "square" and radius_ratio > 0.0:
+        pattern_style = "rounded"
+    radius_ratio = radius_ratio or DEFAULT_ROUNDED_RATIO
+    grid = bytearray(255 if m else 0 for row in modules for m in row)
+    for r0, c0 in eye_origins(n):
+        for r in range(r0, r0 + 7):
+            grid[r * n + c0:r * n + c0 + 7] = bytes(7)
+
+    ink = Image.frombytes("L", (n, n), bytes(grid)).resize((n * box_size, n * box_size), Image.NEAREST)
+    if pattern_style != "square":
+        ink = ImageChops.multiply(ink, _module_tile(pattern_style, box_size, n, radius_ratio))
+
+    eye = eye_stamp(eye_style, box_size)
+    for r0, c0 in eye_origins(n):
+        ink.paste(eye, (c0 * box_size, r0 * box_size))
+
+    if border:
+        ink = ImageOps.expand(ink, border=border * box_size, fill=0)
+    return ImageOps.invert(ink)
+
+
+def gradient_fill(size, start: str, end: str, direction: str = "horizontal") -> Image.Image:
+    """RGB image of `size` blending start -> end along `direction`."""
+    ramp = Image.linear_gradient("L")  # 256x256, dark at the top
+    if direction == "horizontal":
+        ramp = ramp.transpose(Image.Transpose.TRANSPOSE)
+    elif direction == "diagonal":
+        ramp = ImageChops.add(ramp, ramp.transpose(Image.Transpose.TRANSPOSE), scale=2)
+    ramp = ramp.resize(size, Image.BILINEAR)
+    return ImageOps.colorize(ramp, start, end)
+
+
+def apply_gradient(mask: Image.Image, start: str, end: str, direction: str, bg: str) -> Image.Image:
+    """Color a black-on-white mask with a gradient foreground over `bg`."""
+    fill = gradient_fill(mask.size, start, end, direction)
+    back = Image.new("RGB", mask.size, bg)
+    return Image.composite(back, fill, mask)
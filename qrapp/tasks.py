@@ -0,0 +1,103 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """
+    Single daemon thread that runs fire-and-forget jobs (file removal and
+    similar housekeeping) outside the request. The thread is started lazily
+    and restarted after fork, so every gunicorn worker gets its own.
+    """
+
+    def __init__(self, name: str = "qrapp-background"):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        self._ensure_thread()
+        self._queue.put((func, args, kwargs))
+
+    def join(self):
+        """Block until all submitted jobs have run (used by tests and shutdown)."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.warning("Background job %s failed: %s", getattr(func, "__name__", func), e)
+            finally:
+                self._queue.task_done()
+
+
+background = BackgroundWorker()
+
+
+def remove_files(paths):
+    """Best-effort unlink of generated files; missing files are ignored."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def remove_expired(folders):
+    """Remove files last modified before their folder's cutoff, for (directory, cutoff) pairs."""
+    for directory, cutoff in folders:
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class PeriodicSweep:
+    """
+    Queues remove_expired on the background worker at most once per
+    `interval` seconds per process, for folders too large to list on every
+    request.
+    """
+
+    def __init__(self):
+        self._due = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_run(self, interval: float, folders):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._due:
+                return False
+            self._due = now + interval
+        background.submit(remove_expired, list(folders))
+        return True
+
+
+cache_sweep = PeriodicSweep()
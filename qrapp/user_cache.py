@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event
+
+from .monitoring import metrics
+
+SESSION_KEY = "_qr_user"
+
+
+class CachedUser(UserMixin):
+    """Lightweight stand-in for `User` used as `current_user` on requests."""
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+    def record(self):
+        return (self.id, self.username, self.is_admin)
+
+
+class UserCache:
+    """
+    TTL/LRU cache of lightweight user records for the Flask-Login user loader.
+
+    Entries are dropped when a `User` row is updated or deleted in this
+    worker; other workers pick changes up after USER_CACHE_TTL seconds.
+    With USER_SESSION_FASTPATH enabled the record is also stored in the
+    (signed) session cookie and trusted for USER_SESSION_MAX_AGE seconds, so
+    steady-state requests identify the caller without touching the DB.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.session_fastpath = False
+        self.session_max_age = 300
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, user_model):
+        self.ttl = app.config.get("USER_CACHE_TTL", self.ttl)
+        self.max_entries = app.config.get("USER_CACHE_SIZE", self.max_entries)
+        self.session_fastpath = app.config.get("USER_SESSION_FASTPATH", False)
+        self.session_max_age = app.config.get("USER_SESSION_MAX_AGE", self.session_max_age)
+        self._user_model = user_model
+        self.clear()
+
+        if not getattr(user_model, "_user_cache_hooked", False):
+            event.listen(user_model, "after_update", self._on_change)
+            event.listen(user_model, "after_delete", self._on_change)
+            user_logged_in.connect(self._on_login)
+            user_logged_out.connect(self._on_logout)
+            user_model._user_cache_hooked = True
+        app.extensions["user_cache"] = self
+
+    def _on_change(self, mapper, connection, target):
+        self.invalidate(target.id)
+
+    def _on_login(self, sender, user, **extra):
+        self.invalidate(user.id)
+        if self.session_fastpath:
+            self._store_in_session(CachedUser(user.id, user.username, user.is_admin))
+
+    def _on_logout(self, sender, user, **extra):
+        session.pop(SESSION_KEY, None)
+
+    def _store_in_session(self, user):
+        session[SESSION_KEY] = [*user.record(), int(time.time())]
+
+    def _from_session(self, user_id):
+        rec = session.get(SESSION_KEY)
+        if not rec or len(rec) != 4 or rec[0] != user_id:
+            return None
+        if time.time() - rec[3] > self.session_max_age:
+            return None
+        return CachedUser(rec[0], rec[1], rec[2])
+
+    def load(self, user_id):
+        """User loader body: session fast path, then cache, then the DB."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        if self.session_fastpath:
+            user = self._from_session(user_id)
+            if user is not None:
+                metrics.inc("cache_hits_total", {"cache": "session_user"})
+                return user
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                user = CachedUser(*entry[1])
+            else:
+                user = None
+
+        metrics.inc("cache_hits_total" if user is not None else "cache_misses_total", {"cache": "user"})
+        if user is None:
+            from .models import db
+            row = db.session.get(self._user_model, user_id)
+            if row is None:
+                self.invalidate(user_id)
+                return None
+            user = CachedUser(row.id, row.username, row.is_admin)
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, user.record())
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if self.session_fastpath:
+            self._store_in_session(user)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
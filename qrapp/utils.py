@@ -1,18 +1,28 @@
 import base64
+import hashlib
 import io
+import json
 import os
+import threading
 import time
 import uuid
 from typing import Tuple, Optional
 
-from PIL import Image, ImageOps, ImageDraw, ImageFilter
+from PIL import Image, ImageColor, ImageOps, ImageDraw, ImageFilter
 import qrcode
-from qrcode.image.styledpil import StyledPilImage
-from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
+from qrcode.exceptions import DataOverflowError
 from werkzeug.utils import secure_filename
 from flask import current_app
 
 from .validators import is_hex_color
+from .monitoring import track_qr_generation, stage, metrics
+from .singleflight import render_flight, shared_across_workers
+from .budget import render_budget
+from .qrcore import make_qr, default_segments, fit_version, rasterize_mask, encode_rows, pack_rows
+from .segmentation import plan_segments
+from .styles import styled_mask, apply_gradient
+from .frames import Frame, apply_frame
+from .tasks import cache_sweep, remove_expired
 
 def allowed_file(filename: str) -> bool:
     if not filename or "." not in filename:
@@ -104,7 +114,7 @@ def process_logo_for_qr(logo_path: str, target_size: int, logo_size_percent: int
     - Optimize for scanability
     """
     try:
-        with Image.open(logo_path) as logo:
+        with stage("logo_process"), Image.open(logo_path) as logo:
             logo = logo.convert("RGBA")
             
             # Calculate logo size based on percentage of QR code
@@ -144,6 +154,7 @@ def process_logo_for_qr(logo_path: str, target_size: int, logo_size_percent: int
         current_app.logger.warning("Logo processing failed: %s", e)
         raise ValueError(f"Failed to process logo: {str(e)}")
 
+@track_qr_generation()
 def generate_qr_png(
     data: str,
     size_px: int,
@@ -154,7 +165,13 @@ def generate_qr_png(
     border: int,
     rounded_ratio: float,
     logo_path: Optional[str] = None,
-    logo_size_percent: int = 20
+    logo_size_percent: int = 20,
+    pattern_style: str = "square",
+    eye_style: str = "square",
+    gradient_enabled: bool = False,
+    gradient_start: str = "#000000",
+    gradient_end: str = "#000000",
+    gradient_direction: str = "horizontal"
 ) -> Image.Image:
     """
     Build a QR code image (Pillow Image) with optional rounded modules and enhanced logo overlay.
@@ -170,42 +187,70 @@ def generate_qr_png(
         rounded_ratio: Ratio for rounded corners (0.0-0.5)
         logo_path: Path to logo file
         logo_size_percent: Logo size as percentage of QR code (5-30%)
+        pattern_style: Data module shape (square, circle, rounded)
+        eye_style: Finder pattern shape (square, circle, rounded)
+        gradient_enabled: Fill modules with a gradient instead of fg
+        gradient_start / gradient_end: Gradient colors (hex)
+        gradient_direction: horizontal, vertical or diagonal
     """
     # Use higher error correction when logo is present for better scanability
     if logo_path and error_correction in ['L', 'M']:
         current_app.logger.info(f"Upgrading error correction from {error_correction} to Q for logo compatibility")
         error_correction = 'Q'  # Upgrade to Q for better logo compatibility
     
-    # Configure QR builder
-    qr = qrcode.QRCode(
-        version=None,  # auto-detect optimal version
-        error_correction=ec_mapping(error_correction),
-        box_size=box_size,
-        border=border
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-
-    # Use StyledPilImage for rounded modules if requested
-    if rounded_ratio > 0.0:
-        img = qr.make_image(
-            image_factory=StyledPilImage,
-            module_drawer=RoundedModuleDrawer(radius_ratio=rounded_ratio),
-            fill_color=fg,
-            back_color=bg
-        )
-    else:
-        img = qr.make_image(
-            fill_color=fg,
-            back_color=bg
-        )
+    config = current_app.config
+    native = config.get("NATIVE_ENCODER_ENABLED", True)
+    with stage("encode"):
+        if native:
+            segments, version = segments_for(data, ec_mapping(error_correction))
+            try:
+                qr = make_qr(segments, ec_mapping(error_correction), box_size, border, version=version)
+            except DataOverflowError:
+                raise ValueError("Content is too long to fit in a QR code.")
+        else:
+            qr = qrcode.QRCode(
+                version=None,  # auto-detect optimal version
+                error_correction=ec_mapping(error_correction),
+                box_size=box_size,
+                border=border
+            )
+            qr.add_data(data)
+            qr.make(fit=True)
 
-    # Convert to RGBA for compositing and resizing
-    img = img.convert("RGBA")
+    # Work on a one-byte-per-pixel "L" mask (dark modules = 0) until colors
+    # or a logo are actually needed; RGBA copies at 4096px are 64MB each.
+    styled = pattern_style != "square" or eye_style != "square"
+    with stage("rasterize"):
+        if styled:
+            img = styled_mask(qr.modules, box_size, border, pattern_style, eye_style, rounded_ratio)
+        elif rounded_ratio > 0.0:
+            # Styled drawers are only needed for rounded modules; import lazily.
+            from qrcode.image.styledpil import StyledPilImage
+            from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
+            img = qr.make_image(
+                image_factory=StyledPilImage,
+                module_drawer=RoundedModuleDrawer(radius_ratio=rounded_ratio),
+                fill_color=fg,
+                back_color=bg
+            ).convert("L")
+            # StyledPilImage paints with its default black-on-white color mask
+            fg, bg = "#000000", "#FFFFFF"
+        elif native:
+            img = rasterize_mask(qr.modules, box_size, border)
+        else:
+            img = qr.make_image(fill_color="black", back_color="white").convert("L")
 
     # Resize to requested size_px (maintain square)
     if size_px:
-        img = img.resize((size_px, size_px), Image.LANCZOS)
+        with stage("resize"):
+            img = img.resize((size_px, size_px), Image.LANCZOS)
+
+    if gradient_enabled:
+        with stage("colorize"):
+            img = apply_gradient(img, gradient_start, gradient_end, gradient_direction, bg)
+    else:
+        # Map the mask to a fg/bg palette image, still one byte per pixel
+        img = colorize_mask(img, fg, bg)
 
     # Enhanced logo overlay with proper sizing and positioning
     if logo_path:
@@ -217,8 +262,12 @@ def generate_qr_png(
             logo_x = (img.width - processed_logo.width) // 2
             logo_y = (img.height - processed_logo.height) // 2
             
-            # Composite the logo onto the QR code
-            img.alpha_composite(processed_logo, (logo_x, logo_y))
+            # Composite the logo onto the QR code; the base is opaque, so RGB
+            # plus the logo's alpha as paste mask is enough
+            with stage("logo_composite"):
+                composed = img.convert("RGB")
+                composed.paste(processed_logo, (logo_x, logo_y), processed_logo)
+                img = composed
             
             current_app.logger.info(f"Successfully applied logo: {processed_logo.width}x{processed_logo.height} "
                                   f"({logo_size_percent}% of {size_px}px QR code)")
@@ -230,25 +279,238 @@ def generate_qr_png(
 
     return img
 
-def image_to_data_uri(pil_img: Image.Image) -> str:
-    buf = io.BytesIO()
-    pil_img.save(buf, format="PNG")
-    b64 = base64.b64encode(buf.getvalue()).decode("ascii")
-    return f"data:image/png;base64,{b64}"
+def colorize_mask(mask: Image.Image, fg: str, bg: str) -> Image.Image:
+    """
+    Turn a black-on-white "L" mask into a "P" image whose palette ramps
+    from fg (0) to bg (255), which matches resizing the colored image.
+    Converts `mask` in place.
+    """
+    fg_rgb, bg_rgb = ImageColor.getrgb(fg)[:3], ImageColor.getrgb(bg)[:3]
+    palette = []
+    for i in range(256):
+        palette.extend(round(f + (b - f) * i / 255) for f, b in zip(fg_rgb, bg_rgb))
+    mask.putpalette(palette)
+    return mask
+
+def estimate_render_bytes(
+    data: str,
+    size_px: int,
+    error_correction: str,
+    box_size: int,
+    border: int,
+    rounded_ratio: float,
+    logo_path: Optional[str] = None,
+    logo_size_percent: int = 20,
+    pattern_style: str = "square",
+    eye_style: str = "square",
+    gradient_enabled: bool = False,
+    frame: Optional[Frame] = None,
+    **_
+) -> int:
+    """
+    Conservative peak memory of one generate_qr_png + PNG encode, from the
+    parameters alone. The QR version is bounded assuming byte mode.
+    """
+    from qrcode.util import BIT_LIMIT_TABLE
+    if logo_path and error_correction in ("L", "M"):
+        error_correction = "Q"
+    limits = BIT_LIMIT_TABLE[ec_mapping(error_correction)]
+    nbytes = len(data.encode("utf-8"))
+    version = 40
+    for v in range(1, 41):
+        if 4 + (8 if v < 10 else 16) + 8 * nbytes <= limits[v]:
+            version = v
+            break
+    native = ((version * 4 + 17) + 2 * border) * box_size
+    out = size_px or native
+    # Pillow keeps RGB in 4 bytes per pixel, "1"/"L"/"P" in one
+    peak = native * native * (4 if rounded_ratio > 0.0 else 1)  # qrcode raster
+    peak += native * native                                     # "L" mask
+    peak += out * out                                           # resized mask / palette image
+    peak += out * out // 2                                      # PNG encoder buffers
+    if pattern_style != "square" or eye_style != "square":
+        peak += 2 * native * native                             # module tile + shaped ink
+    if gradient_enabled:
+        peak += 3 * out * out * 4                               # fill, background, result (RGB)
+    if logo_path:
+        logo_side = out * min(30, logo_size_percent) // 100 + 1
+        peak += out * out * 4 + logo_side * logo_side * 4 * 4
+    if frame is not None:
+        framed = out + 2 * frame.padding()
+        peak += framed * framed * (4 + 3)                       # RGBA canvas + RGB result
+    return peak
+
+def segments_for(data: str, ec: int, record: bool = True):
+    """
+    (segments, version or None) to encode `data` with. Uses the optimal
+    mixed-mode split (QR_OPTIMAL_SEGMENTS) and, with `record`, counts how
+    many versions and modules it saved over qrcode's default split;
+    otherwise qrcode's own split, so the output matches qrcode exactly.
+    """
+    config = current_app.config
+    if not config.get("QR_OPTIMAL_SEGMENTS", True):
+        return default_segments(data), None
+    plan = plan_segments(data, ec, uppercase_url=config.get("QR_UPPERCASE_URL_HOST", False),
+                         kanji=config.get("QR_KANJI_SEGMENTS", True))
+    if record and plan.versions_saved > 0 and plan.default_version <= 40:
+        metrics.inc("qr_segment_versions_saved_total", amount=plan.versions_saved)
+        metrics.inc("qr_segment_modules_saved_total", amount=plan.modules_saved)
+    return plan.segments, plan.version
+
+def check_fits(data: str, error_correction: str, logo: bool = False) -> None:
+    """Raise generate_qr_png's ValueError up front if `data` is too long for any version."""
+    if logo and error_correction in ("L", "M"):
+        error_correction = "Q"
+    segments, _ = segments_for(data, ec_mapping(error_correction), record=False)
+    try:
+        fit_version(segments, ec_mapping(error_correction))
+    except DataOverflowError:
+        raise ValueError("Content is too long to fit in a QR code.")
 
-def persist_generated(pil_img: Image.Image) -> Tuple[str, str]:
+def preview_matrix(data: str, error_correction: str, logo: bool = False) -> dict:
     """
-    Saves the generated image under instance/generated with a UUID filename.
-    Returns (id, absolute_path).
+    Module matrix of the code generate_qr_png would draw for `data`, for
+    client-side preview drawing: rows are bit-packed MSB-first, each padded
+    to whole bytes, base64 encoded. No image is rendered or stored.
+    """
+    if logo and error_correction in ("L", "M"):
+        error_correction = "Q"  # same upgrade generate_qr_png applies
+    with stage("encode"):
+        segments, version = segments_for(data, ec_mapping(error_correction))
+        try:
+            version, mask, rows, _ = encode_rows(segments, ec_mapping(error_correction), version)
+        except DataOverflowError:
+            raise ValueError("Content is too long to fit in a QR code.")
+    size = version * 4 + 17
+    return {
+        "version": version,
+        "error_correction": error_correction,
+        "mask": mask,
+        "size": size,
+        "modules": base64.b64encode(pack_rows(rows, size)).decode("ascii"),
+    }
+
+def encode_png(pil_img: Image.Image) -> bytes:
+    with stage("png_encode"):
+        buf = io.BytesIO()
+        pil_img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def png_to_data_uri(png: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+
+def persist_png(png: bytes) -> Tuple[str, str]:
+    """
+    Writes already-encoded PNG bytes under instance/generated with a UUID
+    filename. Returns (id, absolute_path).
     """
     out_dir = current_app.config["GENERATED_FOLDER"]
     os.makedirs(out_dir, exist_ok=True)
     _id = uuid.uuid4().hex
-    filename = f"{_id}.png"
-    abs_path = os.path.join(out_dir, filename)
-    pil_img.save(abs_path, format="PNG")
+    abs_path = os.path.join(out_dir, f"{_id}.png")
+    with stage("disk_write"):
+        with open(abs_path, "wb") as f:
+            f.write(png)
     return _id, abs_path
 
+THUMBNAIL_SIZES = (128, 256)
+
+def thumbnail_paths(folder: str, qid: str):
+    """Every thumbnail rendition of `qid` that may exist next to its PNG."""
+    return [os.path.join(folder, f"{qid}.thumb{size}.png") for size in THUMBNAIL_SIZES]
+
+def ensure_thumbnail(qid: str, size: int) -> Optional[str]:
+    """
+    Path of the `size` px thumbnail of generated code `qid`, rendered from
+    the full PNG on first request and stored beside it. Thumbnails are
+    palette PNGs (one byte per pixel, usually 2-16 colours), a few KB each.
+    Returns None when the original does not exist.
+    """
+    folder = current_app.config["GENERATED_FOLDER"]
+    thumb_path = os.path.join(folder, f"{qid}.thumb{size}.png")
+    if os.path.isfile(thumb_path):
+        metrics.inc("cache_hits_total", {"cache": "thumbnail"})
+        return thumb_path
+    source = os.path.join(folder, f"{qid}.png")
+    if not os.path.isfile(source):
+        return None
+
+    metrics.inc("cache_misses_total", {"cache": "thumbnail"})
+    with stage("thumbnail"):
+        with Image.open(source) as img:
+            # An integer reduce() first keeps the LANCZOS pass cheap at 4096px
+            factor = max(1, min(img.size) // (size * 2))
+            thumb = img.convert("RGB").reduce(factor) if factor > 1 else img.convert("RGB")
+            thumb.thumbnail((size, size), Image.LANCZOS)
+        thumb = thumb.quantize(colors=16, method=Image.Quantize.MEDIANCUT)
+        tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        thumb.save(tmp_path, format="PNG", optimize=True)
+        os.replace(tmp_path, thumb_path)
+    return thumb_path
+
+def render_key(**params) -> str:
+    """Stable hash of everything that affects the rendered PNG."""
+    logo_path = params.pop("logo_path", None)
+    if logo_path:
+        with open(logo_path, "rb") as f:
+            params["logo_sha256"] = hashlib.sha256(f.read()).hexdigest()
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def render_qr_png_bytes(
+    data: str,
+    size_px: int,
+    error_correction: str,
+    fg: str,
+    bg: str,
+    box_size: int,
+    border: int,
+    rounded_ratio: float,
+    logo_path: Optional[str] = None,
+    logo_size_percent: int = 20,
+    frame: Optional[Frame] = None,
+    **style
+) -> bytes:
+    """
+    generate_qr_png + a single PNG encode, admitted through the worker's
+    render memory budget (RENDER_MEMORY_BUDGET_MB). Concurrent requests with an
+    identical render key share one in-flight render (SINGLE_FLIGHT_ENABLED),
+    optionally across workers through a file lock (SINGLE_FLIGHT_CROSS_WORKER).
+    A `frame` is composited over the result from the frame layer cache.
+    """
+    params = dict(data=data, size_px=size_px, error_correction=error_correction, fg=fg, bg=bg,
+                  box_size=box_size, border=border, rounded_ratio=rounded_ratio,
+                  logo_path=logo_path, logo_size_percent=logo_size_percent, **style)
+
+    def render() -> bytes:
+        # Large renders queue on the worker's memory budget instead of piling up
+        with render_budget.reserve(estimate_render_bytes(frame=frame, **params)):
+            img = generate_qr_png(**params)
+            if frame is not None:
+                img = apply_frame(img, frame, bg)
+            return encode_png(img)
+
+    config = current_app.config
+    if not config.get("SINGLE_FLIGHT_ENABLED", True):
+        return render()
+
+    key = render_key(**params) if frame is None else render_key(frame=frame, **params)
+    if config.get("SINGLE_FLIGHT_CROSS_WORKER"):
+        def compute() -> bytes:
+            png, shared = shared_across_workers(
+                config["RENDER_SHARE_FOLDER"], key, config["RENDER_SHARE_TTL"], render
+            )
+            if shared:
+                metrics.inc("cache_hits_total", {"cache": "render_shared"})
+            return png
+    else:
+        compute = render
+
+    png, shared = render_flight.do(key, compute)
+    if shared:
+        metrics.inc("cache_hits_total", {"cache": "singleflight"})
+    return png
+
 def cleanup_old_files():
     """
     Best-effort cleanup of old files from uploads and generated directories.
@@ -256,16 +518,19 @@ def cleanup_old_files():
     """
     max_age = current_app.config.get("CLEANUP_MAX_AGE_HOURS", 2)
     cutoff = time.time() - (max_age * 3600)
-    for key in ("UPLOAD_FOLDER", "GENERATED_FOLDER"):
-        directory = current_app.config[key]
-        try:
-            for name in os.listdir(directory):
-                path = os.path.join(directory, name)
-                if os.path.isfile(path):
-                    try:
-                        if os.path.getmtime(path) < cutoff:
-                            os.remove(path)
-                    except OSError:
-                        pass
-        except FileNotFoundError:
-            continue
+    remove_expired((current_app.config[key], cutoff) for key in ("UPLOAD_FOLDER", "GENERATED_FOLDER"))
+
+def sweep_cache_folders():
+    """
+    Expire shared renders and idempotency records on the background worker,
+    at most every CACHE_SWEEP_SECONDS per worker: the idempotency folder holds
+    two files per key for IDEMPOTENCY_TTL, too many to list per request.
+    """
+    config = current_app.config
+    now = time.time()
+    # Shared render results only need to outlive a burst of identical requests.
+    share_cutoff = now - max(60, config.get("RENDER_SHARE_TTL", 10) * 6)
+    idempotency_cutoff = now - config.get("IDEMPOTENCY_TTL", 86400)
+    folders = [(config.get(key), cutoff) for key, cutoff in (("RENDER_SHARE_FOLDER", share_cutoff),
+                                                             ("IDEMPOTENCY_FOLDER", idempotency_cutoff))]
+    return cache_sweep.maybe_run(config.get("CACHE_SWEEP_SECONDS", 300), [f for f in folders if f[0]])
@@ -0,0 +1,52 @@
+"""
+Version counters shared by all workers through small files.
+
+A version file is an array of 8-byte little-endian counters. bump_version
+increments one slot in place under an flock, so the file never grows past
+its highest slot; read_version preads the slot without locking. A missing
+file or slot reads as 0.
+"""
+
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: bumps are not serialized across processes
+    fcntl = None
+
+_COUNTER = struct.Struct("<Q")
+
+
+def _read(fd: int, slot: int) -> int:
+    data = os.pread(fd, _COUNTER.size, slot * _COUNTER.size)
+    return _COUNTER.unpack(data)[0] if len(data) == _COUNTER.size else 0
+
+
+def read_version(path: str, slot: int = 0) -> int:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return 0
+    try:
+        return _read(fd, slot)
+    finally:
+        os.close(fd)
+
+
+def bump_versions(path: str, slots) -> None:
+    """Increment several counters under one lock. Call after the commit."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)  # released by close()
+        for slot in sorted(set(slots)):
+            os.pwrite(fd, _COUNTER.pack(_read(fd, slot) + 1), slot * _COUNTER.size)
+    finally:
+        os.close(fd)
+
+
+def bump_version(path: str, slot: int = 0) -> int:
+    """Increment one counter and return its new value. Call after the commit."""
+    bump_versions(path, (slot,))
+    return read_version(path, slot)
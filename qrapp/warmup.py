@@ -0,0 +1,53 @@
+import gc
+import os
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+# Representative renders: every EC level, plain and rounded modules, small
+# and large outputs, and a logo so LANCZOS/blur/alpha paths get initialized.
+WARMUP_CASES = [
+    dict(data="https://example.com/warmup", size_px=256, error_correction="M", rounded_ratio=0.0, logo=False),
+    dict(data="WARMUP-0123456789", size_px=512, error_correction="L", rounded_ratio=0.0, logo=False),
+    dict(data="https://example.com/warmup?rounded=1", size_px=512, error_correction="Q", rounded_ratio=0.3, logo=False),
+    dict(data="https://example.com/warmup?logo=1", size_px=1024, error_correction="H", rounded_ratio=0.0, logo=True),
+]
+
+
+def _make_logo(folder: str) -> str:
+    path = os.path.join(folder, "warmup-logo.png")
+    img = Image.new("RGBA", (128, 128), (0, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse((8, 8, 120, 120), fill=(30, 90, 200, 255))
+    img.save(path)
+    return path
+
+
+def warmup(app) -> float:
+    """
+    Render a handful of representative codes so Pillow/qrcode lazy imports,
+    filter tables and zlib state are initialized, then freeze the GC so a
+    preloading master hands that state to forked workers copy-on-write.
+    Returns the seconds spent.
+    """
+    from .utils import encode_png, generate_qr_png, png_to_data_uri
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp, app.test_request_context("/"):
+        logo_path = _make_logo(tmp)
+        for case in WARMUP_CASES:
+            img = generate_qr_png(
+                data=case["data"], size_px=case["size_px"],
+                error_correction=case["error_correction"], fg="#000000", bg="#FFFFFF",
+                box_size=10, border=4, rounded_ratio=case["rounded_ratio"],
+                logo_path=logo_path if case["logo"] else None,
+            )
+            png_to_data_uri(encode_png(img))  # the encode path requests take
+    elapsed = time.perf_counter() - start
+
+    # Objects created so far are long-lived; keeping them out of GC passes
+    # stops collections from dirtying shared pages in the workers.
+    gc.collect()
+    gc.freeze()
+    app.logger.info("Warm-up rendered %d codes in %.0f ms", len(WARMUP_CASES), elapsed * 1000)
+    return elapsed
@@ -0,0 +1,43 @@
+import pytest
+from app import create_app
+from qrapp.models import db
+from qrapp.limiter import limiter
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app(instance_path=str(tmp_path / "instance"))
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(limiter, "enabled", False)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture()
+def auth_client(app):
+    """Test client logged in as a freshly registered user."""
+    client = app.test_client()
+    resp = client.post("/auth/api/register", json={"username": "alice", "password": "secret123"})
+    assert resp.status_code == 200
+    return client
+
+def _post_generate(client, content="hello", headers=None, **fields):
+    return client.post("/api/generate", json=dict({"content": content, "size_px": 128}, **fields), headers=headers)
+
+@pytest.fixture()
+def post_generate():
+    """POST /api/generate through a client; returns the response. Fields override the 128px default."""
+    return _post_generate
+
+@pytest.fixture()
+def generate():
+    """Create a code through a client and return its id."""
+    def generate(client, content="hello", **fields):
+        resp = _post_generate(client, content, **fields)
+        assert resp.status_code == 201, resp.get_json()
+        return resp.get_json()["id"]
+    return generate
@@ -0,0 +1,42 @@
+import time
+from qrapp.admission import render_cost, load_shedder
+from qrapp.limiter import limiter
+
+def test_cost_grows_with_size_copies_and_logo():
+    # the unit: one plain 512px render; cost follows output pixels
+    assert render_cost(512) == 1
+    assert render_cost(128) == render_cost(256) == 1
+    assert render_cost(1024) == 4
+    assert render_cost(4096) == 64
+    assert render_cost(512, copies=3) == 3
+    assert render_cost(4096, copies=10, logo=True) == 960
+    assert render_cost(1024, logo=True) > render_cost(1024)
+
+def test_per_user_cost_limit_weights_large_renders(app, auth_client, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", True)
+    app.config["RATELIMIT_GENERATE_LIMIT"] = "100 per minute"
+    app.config["RATELIMIT_GENERATE_COST_LIMIT"] = "70 per minute"
+    big = {"content": "big", "size_px": 4096}
+    assert auth_client.post("/api/generate", json=big).status_code == 201
+    resp = auth_client.post("/api/generate", json=big)
+    assert resp.status_code == 429
+    assert "Retry-After" in resp.headers
+    # a small render still fits in what is left of the budget
+    assert auth_client.post("/api/generate", json={"content": "small", "size_px": 128}).status_code == 201
+
+def test_sheds_when_recent_latency_is_high(app, auth_client, monkeypatch):
+    monkeypatch.setattr(load_shedder, "max_latency", 0.5)
+    now = time.monotonic()
+    for _ in range(10):
+        load_shedder._samples.append((now, 2.0))
+    resp = auth_client.post("/api/generate", json={"content": "x", "size_px": 128})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(load_shedder.retry_after)
+    # samples age out of the window and requests are admitted again
+    monkeypatch.setattr(load_shedder, "window", 0.0)
+    assert auth_client.post("/api/generate", json={"content": "x", "size_px": 128}).status_code == 201
+
+def test_sheds_when_queue_is_full(app, auth_client, monkeypatch):
+    monkeypatch.setattr(load_shedder, "max_in_flight", 1)
+    monkeypatch.setattr(load_shedder, "_in_flight", 1)
+    assert auth_client.post("/api/generate", json={"content": "x", "size_px": 128}).status_code == 503
@@ -7,7 +7,7 @@ from qrapp.models import User, QRCode
 
 @pytest.fixture()
 def client(tmp_path):
-    app = create_app()
+    app = create_app(instance_path=str(tmp_path / "instance"))
     # redirect instance folders into tmp
     app.config["UPLOAD_FOLDER"] = tmp_path / "uploads"
     app.config["GENERATED_FOLDER"] = tmp_path / "generated"
@@ -79,3 +79,11 @@ def test_user_login(client):
         "password": "testpass"
     })
     assert resp.status_code == 302  # redirect to home
+
+def test_generate_rate_limit_is_configurable(app, auth_client, monkeypatch):
+    from qrapp.limiter import limiter
+    monkeypatch.setattr(limiter, "enabled", True)
+    app.config["RATELIMIT_GENERATE_LIMIT"] = "2 per minute"
+    codes = [auth_client.post("/api/generate", json={"content": "x", "size_px": 128}).status_code
+             for _ in range(3)]
+    assert codes == [201, 201, 429]
@@ -0,0 +1,68 @@
+import json
+import os
+import zipfile
+
+from PIL import Image
+
+def _write_csv(path, n, bad=None):
+    with open(path, "w") as f:
+        f.write("content,name,size_px\n")
+        for i in range(n):
+            f.write(f"https://example.com/{i},code{i},{'x' if i == bad else 128}\n")
+
+def test_renders_csv_into_sharded_directory(app, tmp_path):
+    src = tmp_path / "in.csv"
+    _write_csv(src, 6)
+    out = tmp_path / "out"
+    result = app.test_cli_runner().invoke(args=["generate-batch", str(src), "--out", str(out), "--workers", "2",
+                                                "--set", "pattern_style=circle"])
+    assert result.exit_code == 0, result.output
+    files = sorted(os.listdir(out / "0000"))
+    assert files == sorted(f"code{i}.png" for i in range(6))
+    assert Image.open(out / "0000" / "code0.png").size == (128, 128)
+    assert json.loads((tmp_path / "out.checkpoint.json").read_text())["done"] == 6
+    # neither the pool workers nor the command leave a per-process metrics file behind
+    assert [n for n in os.listdir(app.config["METRICS_FOLDER"]) if n != "metrics_archive.db"] == []
+
+def test_resumes_after_checkpoint(app, tmp_path):
+    src = tmp_path / "in.ndjson"
+    src.write_text("".join(json.dumps({"content": f"item {i}", "size_px": 128}) + "\n" for i in range(5)))
+    out = tmp_path / "out"
+    (tmp_path / "out.checkpoint.json").write_text(json.dumps({"input": str(src), "done": 3, "failed": 0}))
+    result = app.test_cli_runner().invoke(args=["generate-batch", str(src), "--out", str(out), "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    assert sorted(os.listdir(out / "0000")) == ["0000003.png", "0000004.png"]
+
+def test_zip_output_and_failed_records(app, tmp_path):
+    src = tmp_path / "in.csv"
+    _write_csv(src, 4, bad=None)
+    src.write_text(src.read_text() + "  ,empty,128\n")
+    target = tmp_path / "codes.zip"
+    result = app.test_cli_runner().invoke(args=["generate-batch", str(src), "--zip", str(target), "--workers", "1"])
+    assert result.exit_code == 1
+    assert "record 5" in result.output
+    with zipfile.ZipFile(target) as z:
+        assert sorted(z.namelist()) == sorted(f"0000/code{i}.png" for i in range(4))
+
+def test_requires_exactly_one_output(app, tmp_path):
+    src = tmp_path / "in.csv"
+    _write_csv(src, 1)
+    result = app.test_cli_runner().invoke(args=["generate-batch", str(src)])
+    assert result.exit_code != 0 and "--out" in result.output
+
+def test_duplicate_names_get_index_suffix(app, tmp_path):
+    src = tmp_path / "in.ndjson"
+    src.write_text("".join(json.dumps({"content": f"item {i}", "name": "same", "size_px": 128}) + "\n"
+                           for i in range(3)))
+    target = tmp_path / "codes.zip"
+    result = app.test_cli_runner().invoke(args=["generate-batch", str(src), "--zip", str(target), "--workers", "2"])
+    assert result.exit_code == 0, result.output
+    with zipfile.ZipFile(target) as z:
+        assert sorted(z.namelist()) == ["0000/same-0000001.png", "0000/same-0000002.png", "0000/same.png"]
+
+    # resuming mid-shard still knows "same" was taken by record 0
+    out = tmp_path / "out"
+    (tmp_path / "out.checkpoint.json").write_text(json.dumps({"input": str(src), "done": 2, "failed": 0}))
+    result = app.test_cli_runner().invoke(args=["generate-batch", str(src), "--out", str(out), "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    assert os.listdir(out / "0000") == ["same-0000002.png"]
@@ -0,0 +1,59 @@
+import threading
+import time
+import pytest
+from qrapp.budget import MemoryBudget, RenderBusy, render_budget
+from qrapp.utils import generate_qr_png, estimate_render_bytes
+
+def _budget(limit_bytes, timeout=1.0):
+    budget = MemoryBudget()
+    budget.limit, budget.timeout = limit_bytes, timeout
+    return budget
+
+def test_reservations_queue_until_memory_is_released(app):
+    budget = _budget(100)
+    order = []
+    with app.app_context():
+        with budget.reserve(80):
+            def second():
+                with app.app_context(), budget.reserve(50):
+                    order.append("second")
+            t = threading.Thread(target=second)
+            t.start()
+            time.sleep(0.05)
+            assert budget.waiting == 1 and order == []
+            order.append("first-done")
+        t.join()
+    assert order == ["first-done", "second"]
+    assert budget.in_use == 0
+
+def test_oversized_job_runs_alone_and_timeout_raises(app):
+    budget = _budget(100, timeout=0.05)
+    with app.app_context():
+        with budget.reserve(10_000):
+            assert budget.in_use == 100
+            with pytest.raises(RenderBusy):
+                with budget.reserve(1):
+                    pass
+        assert budget.in_use == 0
+
+def test_estimate_grows_with_size_and_logo():
+    base = dict(data="https://example.com", size_px=512, error_correction="M", box_size=10, border=4, rounded_ratio=0.0)
+    small = estimate_render_bytes(**base)
+    assert estimate_render_bytes(**dict(base, size_px=4096)) > 16 * small
+    assert estimate_render_bytes(**base, logo_path="logo.png") > small
+
+def test_render_stays_in_palette_mode_with_requested_colors(app):
+    with app.test_request_context("/"):
+        img = generate_qr_png(data="hello", size_px=256, error_correction="M", fg="#FF0000",
+                              bg="#00FF00", box_size=10, border=4, rounded_ratio=0.0)
+    assert img.mode == "P"
+    colors = {c for _, c in img.convert("RGB").getcolors(65536)}
+    assert (255, 0, 0) in colors and (0, 255, 0) in colors
+
+def test_api_returns_503_with_retry_after_when_budget_is_exhausted(app, auth_client, monkeypatch):
+    monkeypatch.setattr(render_budget, "timeout", 0.05)
+    with app.app_context(), render_budget.reserve(render_budget.limit):
+        resp = auth_client.post("/api/generate", json={"content": "busy", "size_px": 128})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"]
+    assert "busy" in resp.get_json()["error"]
@@ -0,0 +1,32 @@
+import os
+from qrapp.tasks import background
+
+def test_bulk_delete_by_ids_removes_rows_and_files(app, auth_client, generate):
+    ids = [generate(auth_client, f"item {i}") for i in range(3)]
+    resp = auth_client.post("/api/qr/bulk-delete", json={"ids": ids[:2] + ["missing"]})
+    assert resp.status_code == 200
+    assert resp.get_json()["deleted"] == 2
+
+    background.join()
+    folder = app.config["GENERATED_FOLDER"]
+    assert not os.path.exists(os.path.join(folder, f"{ids[0]}.png"))
+    assert os.path.exists(os.path.join(folder, f"{ids[2]}.png"))
+    assert [q["id"] for q in auth_client.get("/api/qr/user").get_json()["qrs"]] == [ids[2]]
+
+def test_bulk_delete_by_search_is_scoped_to_user(app, auth_client, generate):
+    generate(auth_client, "campaign-a 1")
+    generate(auth_client, "campaign-a 2")
+    keep = generate(auth_client, "other")
+
+    other = app.test_client()
+    other.post("/auth/api/register", json={"username": "bob", "password": "secret123"})
+    generate(other, "campaign-a bob")
+
+    resp = auth_client.post("/api/qr/bulk-delete", json={"q": "campaign-a"})
+    assert resp.get_json()["deleted"] == 2
+    assert [q["id"] for q in auth_client.get("/api/qr/user").get_json()["qrs"]] == [keep]
+    assert other.get("/api/qr/user").get_json()["total"] == 1
+
+def test_bulk_delete_requires_selection(auth_client):
+    assert auth_client.post("/api/qr/bulk-delete", json={}).status_code == 400
+    assert auth_client.post("/api/qr/bulk-delete", json={"ids": "abc"}).status_code == 400
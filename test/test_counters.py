@@ -0,0 +1,47 @@
+from qrapp.counters import download_counter
+from qrapp.models import db, QRCode
+
+def _downloads(app, qid):
+    with app.app_context():
+        return db.session.get(QRCode, qid).downloads
+
+def test_downloads_are_batched_until_flush(app, auth_client, generate):
+    qid = generate(auth_client, "https://example.com/counted")
+    for _ in range(3):
+        assert auth_client.get(f"/download/{qid}").status_code == 200
+    assert auth_client.get(f"/api/qr/{qid}/download").status_code == 200
+    assert download_counter.pending(qid) == 4
+    assert _downloads(app, qid) == 0
+
+    assert download_counter.flush() == 1
+    assert _downloads(app, qid) == 4
+    assert download_counter.pending(qid) == 0
+
+def test_unbatched_mode_writes_through(app, auth_client, generate):
+    download_counter.enabled = False
+    try:
+        qid = generate(auth_client, "https://example.com/direct")
+        auth_client.get(f"/download/{qid}")
+        assert _downloads(app, qid) == 1
+    finally:
+        download_counter.enabled = True
+
+def test_history_sorts_by_downloads(app, auth_client, generate):
+    ids = [generate(auth_client, f"https://example.com/{i}") for i in range(3)]
+    for qid, hits in zip(ids, (1, 3, 2)):
+        for _ in range(hits):
+            auth_client.get(f"/download/{qid}")
+    download_counter.flush()
+
+    body = auth_client.get("/api/qr/user?sort_by=downloads").get_json()
+    assert [q["id"] for q in body["qrs"]] == [ids[1], ids[2], ids[0]]
+    assert [q["downloads"] for q in body["qrs"]] == [3, 2, 1]
+    body = auth_client.get("/api/qr/search?q=example&sort_by=downloads&sort_order=asc").get_json()
+    assert [q["id"] for q in body["qrs"]] == [ids[0], ids[2], ids[1]]
+
+def test_flush_invalidates_cached_listings(app, auth_client, generate):
+    qid = generate(auth_client, "https://example.com/cached")
+    assert auth_client.get("/api/qr/user").get_json()["qrs"][0]["downloads"] == 0
+    auth_client.get(f"/download/{qid}")
+    download_counter.flush()
+    assert auth_client.get("/api/qr/user").get_json()["qrs"][0]["downloads"] == 1
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+from sqlalchemy import event, text
+from app import create_app
+from qrapp.models import db, QRCode
+from qrapp.database import group_writer, engine_options
+
+def test_sqlite_runs_in_wal_mode(app):
+    with app.app_context():
+        mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+    assert mode.lower() == "wal"
+
+def test_unknown_synchronous_level_fails_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "NORMAL; DROP TABLE user")
+    with pytest.raises(ValueError, match="SQLITE_SYNCHRONOUS"):
+        create_app(instance_path=str(tmp_path))
+
+def test_postgres_gets_sized_pool(app):
+    config = dict(app.config, SQLALCHEMY_DATABASE_URI="postgresql://u:p@db/qr")
+    opts = engine_options(config)
+    assert opts["pool_size"] == app.config["DB_POOL_SIZE"]
+    assert opts["pool_pre_ping"] is True
+
+def test_group_commit_coalesces_concurrent_inserts(app, monkeypatch):
+    monkeypatch.setattr(group_writer, "enabled", True)
+    monkeypatch.setattr(group_writer, "window_ms", 50.0)
+    with app.app_context():
+        engine = db.engine
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    threads = [
+        threading.Thread(target=group_writer.submit,
+                         args=([dict(id=f"{i:032x}", content=f"c{i}", user_id=None)],))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with app.app_context():
+        assert QRCode.query.count() == 8
+    assert len(commits) < 8
+
+def test_generate_through_group_writer(auth_client, monkeypatch):
+    monkeypatch.setattr(group_writer, "enabled", True)
+    resp = auth_client.post("/api/generate", json={"content": "grouped", "size_px": 128, "duplicate_count": 3})
+    assert resp.status_code == 201
+    listed = auth_client.get("/api/qr/user").get_json()
+    assert listed["total"] == 3
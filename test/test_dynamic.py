@@ -0,0 +1,103 @@
+from qrapp.counters import click_counter
+from qrapp.dynamic import link_cache
+from qrapp.models import db, QRCode
+
+def _create(client, target="https://example.com/landing"):
+    resp = client.post("/api/generate", json={"content": target, "size_px": 128, "dynamic": True})
+    assert resp.status_code == 201
+    return resp.get_json()
+
+def test_dynamic_code_encodes_short_url_and_redirects(app, auth_client):
+    body = _create(auth_client)
+    assert body["target_url"] == "https://example.com/landing"
+    slug = body["short_url"].rsplit("/", 1)[1]
+    with app.app_context():
+        assert db.session.get(QRCode, body["id"]).content == body["short_url"]
+
+    resp = app.test_client().get(f"/r/{slug}")
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "https://example.com/landing"
+    assert "Set-Cookie" not in resp.headers
+
+def test_edit_invalidates_cached_target(app, auth_client):
+    body = _create(auth_client)
+    slug = body["short_url"].rsplit("/", 1)[1]
+    visitor = app.test_client()
+    visitor.get(f"/r/{slug}")  # now cached
+
+    resp = auth_client.put(f"/api/qr/{body['id']}/target", json={"target_url": "https://example.com/new"})
+    assert resp.status_code == 200
+    assert visitor.get(f"/r/{slug}").headers["Location"] == "https://example.com/new"
+
+    auth_client.delete(f"/api/qr/{body['id']}")
+    assert visitor.get(f"/r/{slug}").status_code == 404
+
+def test_clicks_are_counted_in_batches(app, auth_client):
+    body = _create(auth_client)
+    slug = body["short_url"].rsplit("/", 1)[1]
+    visitor = app.test_client()
+    for _ in range(5):
+        visitor.get(f"/r/{slug}")
+    assert click_counter.pending(body["id"]) == 5
+    click_counter.flush()
+    with app.app_context():
+        assert db.session.get(QRCode, body["id"]).clicks == 5
+    resp = auth_client.get(f"/api/qr/{body['id']}/target")
+    assert resp.get_json()["clicks"] == 5
+    assert resp.get_json()["target_url"] == "https://example.com/landing"
+
+def test_resolve_hits_the_cache(app, auth_client):
+    slug = _create(auth_client)["short_url"].rsplit("/", 1)[1]
+    with app.test_request_context():
+        first = link_cache.resolve(slug)
+        link_cache._entries[slug] = (link_cache.version(slug), ("x", "https://cached.example"))
+        assert link_cache.resolve(slug) == ("x", "https://cached.example")
+        assert first[1] == "https://example.com/landing"
+
+def test_rejects_non_urls_and_unknown_slugs(app, auth_client):
+    resp = auth_client.post("/api/generate", json={"content": "plain text", "dynamic": True})
+    assert resp.status_code == 400
+    assert app.test_client().get("/r/ZZZZZZZZ").status_code == 404
+    assert app.test_client().get("/r/not-a-slug").status_code == 404
+    plain = auth_client.post("/api/generate", json={"content": "https://example.com/static"}).get_json()
+    resp = auth_client.put(f"/api/qr/{plain['id']}/target", json={"target_url": "https://example.com/x"})
+    assert resp.status_code == 404
+
+def test_invalidation_is_per_slug(app, auth_client):
+    a, b = _create(auth_client), _create(auth_client, "https://example.com/other")
+    slug_a, slug_b = (x["short_url"].rsplit("/", 1)[1] for x in (a, b))
+    with app.app_context():
+        before_a, before_b = link_cache.version(slug_a), link_cache.version(slug_b)
+
+    static = auth_client.post("/api/generate", json={"content": "static", "size_px": 128}).get_json()
+    assert auth_client.post("/api/qr/bulk-delete", json={"ids": [static["id"]]}).get_json()["deleted"] == 1
+    auth_client.put(f"/api/qr/{a['id']}/target", json={"target_url": "https://example.com/new"})
+    with app.app_context():
+        assert link_cache.version(slug_a) == before_a + 1
+        if link_cache._slot(slug_a) != link_cache._slot(slug_b):
+            assert link_cache.version(slug_b) == before_b
+
+    assert auth_client.post("/api/qr/bulk-delete", json={"ids": [b["id"]]}).get_json()["deleted"] == 1
+    with app.app_context():
+        assert link_cache.version(slug_b) > before_b
+    assert app.test_client().get(f"/r/{slug_b}").status_code == 404
+
+def test_click_flush_keeps_history_cache(app, auth_client):
+    slug = _create(auth_client)["short_url"].rsplit("/", 1)[1]
+    etag = auth_client.get("/api/qr/user").headers["ETag"]
+    app.test_client().get(f"/r/{slug}")
+    click_counter.flush()
+    assert auth_client.get("/api/qr/user", headers={"If-None-Match": etag}).status_code == 304
+
+def test_dynamic_duplicates_get_their_own_slugs(app, auth_client):
+    body = auth_client.post("/api/generate", json={"content": "https://example.com/dup", "size_px": 128,
+                                                   "dynamic": True, "duplicate_count": 3}).get_json()
+    urls = {body["short_url"]} | {d["short_url"] for d in body["duplicates"]}
+    assert len(urls) == 3
+    dup = body["duplicates"][0]
+    resp = auth_client.put(f"/api/qr/{dup['id']}/target", json={"target_url": "https://example.com/moved"})
+    assert resp.status_code == 200
+    auth_client.delete(f"/api/qr/{body['id']}")
+    visitor = app.test_client()
+    assert visitor.get(f"/r/{dup['short_url'].rsplit('/', 1)[1]}").headers["Location"] == "https://example.com/moved"
+    assert visitor.get(f"/r/{body['short_url'].rsplit('/', 1)[1]}").status_code == 404
@@ -0,0 +1,48 @@
+import io
+
+from PIL import Image
+from qrapp.frames import Frame, FRAME_STYLES, apply_frame, build_frame_layer, frame_cache
+from qrapp.monitoring import metrics
+
+def _symbol(size=200):
+    return Image.new("RGB", (size, size), "#ffffff")
+
+def test_every_style_builds_a_layer_transparent_over_the_symbol():
+    for style in FRAME_STYLES:
+        frame = Frame(style, 6, "#336699", *(("#ff0000", "#0000ff", "radial") if style == "gradient" else ()))
+        layer = build_frame_layer(frame, (200, 200))
+        pad = frame.padding()
+        assert layer.size == (200 + 2 * pad, 200 + 2 * pad)
+        alpha = layer.getchannel("A")
+        assert alpha.crop((pad, pad, pad + 200, pad + 200)).getextrema() == (0, 0)
+        assert alpha.getextrema()[1] == 255
+
+def _frame_hits():
+    return metrics.collect().get(("cache_hits_total", (("cache", "frame"),)), 0)
+
+def test_layer_is_built_once_and_reused(app):
+    frame = Frame("neon", 5, "#00ff88")
+    with app.app_context():
+        first = frame_cache.get(frame, (300, 300))
+        assert frame_cache.get(frame, (300, 300)) is first
+        hits = _frame_hits()
+        out = apply_frame(_symbol(300), frame, "#ffffff")
+        assert _frame_hits() == hits + 1
+    assert out.mode == "RGB" and out.size == first.size
+
+def test_cache_stays_within_its_byte_budget(monkeypatch):
+    monkeypatch.setattr(frame_cache, "max_bytes", 3 * 220 * 220 * 4)
+    try:
+        for size in range(100, 160, 10):
+            frame_cache.get(Frame("simple", 10, "#000000"), (size, size))
+        assert frame_cache.size_bytes <= frame_cache.max_bytes
+    finally:
+        frame_cache.clear()
+
+def test_api_returns_framed_png(auth_client):
+    resp = auth_client.post("/api/generate", json={
+        "content": "https://example.com/frame", "size_px": 256, "frame_enabled": True,
+        "frame_style": "shadow", "frame_thickness": 8, "frame_color": "#112233"})
+    assert resp.status_code == 201
+    img = Image.open(io.BytesIO(auth_client.get(resp.get_json()["download_url"]).data))
+    assert img.size == (256 + 2 * Frame("shadow", 8).padding(),) * 2
@@ -0,0 +1,36 @@
+import os
+
+def test_dashboard_etag_and_304(auth_client):
+    first = auth_client.get("/api/dashboard")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = auth_client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+def test_generate_and_delete_invalidate_history(auth_client, generate):
+    empty = auth_client.get("/api/qr/user")
+    assert empty.get_json()["qrs"] == []
+
+    qid = generate(auth_client)
+    listed = auth_client.get("/api/qr/user")
+    assert listed.headers["ETag"] != empty.headers["ETag"]
+    assert [q["id"] for q in listed.get_json()["qrs"]] == [qid]
+
+    stale = auth_client.get("/api/qr/user", headers={"If-None-Match": empty.headers["ETag"]})
+    assert stale.status_code == 200
+
+    assert auth_client.delete(f"/api/qr/{qid}").status_code == 200
+    assert auth_client.get("/api/qr/user").get_json()["qrs"] == []
+
+def test_version_file_stays_fixed_size(tmp_path):
+    from qrapp.versions import bump_version, read_version
+    path = str(tmp_path / "1.ver")
+    assert read_version(path) == 0
+    for _ in range(100):
+        bump_version(path)
+    assert read_version(path) == 100
+    assert os.path.getsize(path) == 8
+    assert read_version(path, slot=3) == 0
+    assert bump_version(path, slot=3) == 1 and read_version(path) == 100
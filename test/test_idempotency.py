@@ -0,0 +1,60 @@
+import os
+import time
+
+from qrapp.models import QRCode
+from qrapp.tasks import background, cache_sweep
+
+URL = "https://example.com/idem"
+
+def _key(key):
+    return {"Idempotency-Key": key}
+
+def test_replay_returns_original_response_without_new_rows(app, auth_client, post_generate):
+    first = post_generate(auth_client, URL, headers=_key("retry-1"))
+    assert first.status_code == 201
+    assert first.headers["Idempotent-Replayed"] == "false"
+
+    second = post_generate(auth_client, URL, headers=_key("retry-1"))
+    assert second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.get_json() == first.get_json()
+
+    with app.app_context():
+        assert QRCode.query.count() == 1
+
+def test_different_keys_generate_separately(app, auth_client, post_generate):
+    a = post_generate(auth_client, URL, headers=_key("a")).get_json()["id"]
+    assert a != post_generate(auth_client, URL, headers=_key("b")).get_json()["id"]
+    with app.app_context():
+        assert QRCode.query.count() == 2
+
+def test_key_reused_with_different_body_is_rejected(auth_client, post_generate):
+    assert post_generate(auth_client, URL, headers=_key("same")).status_code == 201
+    resp = post_generate(auth_client, "https://example.com/other", headers=_key("same"))
+    assert resp.status_code == 422
+
+def test_requests_without_key_are_not_deduplicated(app, auth_client, post_generate):
+    post_generate(auth_client, URL)
+    post_generate(auth_client, URL)
+    with app.app_context():
+        assert QRCode.query.count() == 2
+
+def test_expired_records_are_swept_off_the_request_path(app, auth_client, monkeypatch, post_generate):
+    assert post_generate(auth_client, URL, headers=_key("old")).status_code == 201
+    folder = app.config["IDEMPOTENCY_FOLDER"]
+    stale = time.time() - app.config["IDEMPOTENCY_TTL"] - 60
+    for name in os.listdir(folder):
+        os.utime(os.path.join(folder, name), (stale, stale))
+
+    monkeypatch.setattr(cache_sweep, "_due", 0.0)
+    auth_client.get("/api/dashboard")
+    background.join()
+    assert os.listdir(folder) == []
+
+    # until CACHE_SWEEP_SECONDS pass, requests don't list the folder again
+    leftover = os.path.join(folder, "leftover.bin")
+    open(leftover, "wb").close()
+    os.utime(leftover, (stale, stale))
+    auth_client.get("/api/dashboard")
+    background.join()
+    assert os.path.exists(leftover)
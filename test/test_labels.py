@@ -0,0 +1,122 @@
+import os
+import re
+import zlib
+from contextlib import contextmanager
+
+from qrapp.budget import render_budget
+from qrapp.labels import Label, Sheet, label_sheet_pdf
+from qrapp.limiter import limiter
+from qrapp.routes import parse_render_options
+
+def _check_pdf(pdf):
+    """Structure a reader relies on: header, xref offsets pointing at objects, trailer."""
+    assert pdf.startswith(b"%PDF-1.4")
+    assert pdf.rstrip().endswith(b"%%EOF")
+    xref_at = int(pdf.rsplit(b"startxref", 1)[1].split()[0])
+    assert pdf[xref_at:].startswith(b"xref")
+    entries = re.findall(rb"(\d{10}) 00000 n ", pdf[xref_at:])
+    for num, offset in enumerate(entries, start=1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj" % num)
+    return int(re.search(rb"/Type /Pages /Count (\d+)", pdf).group(1))
+
+def _labels(n):
+    return (Label(parse_render_options({"content": f"https://example.com/{i}"}), f"item ({i})")
+            for i in range(n))
+
+def test_pages_hold_grid_and_stream_lazily(app):
+    with app.app_context():
+        sheet = Sheet(columns=2, rows=3, dpi=72)
+        chunks = label_sheet_pdf(_labels(13), sheet)
+        pdf = b"".join(chunks)
+    assert _check_pdf(pdf) == 3  # 6 + 6 + 1
+    assert pdf.count(b"/Subtype /Image") == 13
+    # default black-on-white codes are stored as greyscale
+    assert b"/DeviceGray" in pdf and b"/DeviceRGB" not in pdf
+
+def test_captions_are_escaped(app):
+    with app.app_context():
+        pdf = b"".join(label_sheet_pdf(_labels(1), Sheet(columns=1, rows=1, dpi=72)))
+    stream = re.search(rb"obj\n<< /Filter /FlateDecode /Length \d+ >>\nstream\n(.*?)\nendstream", pdf, re.S).group(1)
+    assert b"(item \\(0\\)) Tj" in zlib.decompress(stream)
+
+def test_api_streams_stored_codes(app, auth_client):
+    ids = [auth_client.post("/api/generate", json={"content": f"code {i}", "size_px": 128}).get_json()["id"]
+           for i in range(3)]
+    resp = auth_client.post("/api/labels", json={"ids": ids, "columns": 2, "rows": 2, "dpi": 72})
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/pdf"
+    assert resp.is_streamed
+    pdf = resp.get_data()
+    assert _check_pdf(pdf) == 1
+    assert pdf.count(b"/Subtype /Image") == 3
+
+def test_api_validates_before_streaming(auth_client):
+    assert auth_client.post("/api/labels", json={"contents": ["x"], "columns": 50}).status_code == 400
+    assert auth_client.post("/api/labels", json={"contents": ["ok", "  "]}).status_code == 400
+    assert auth_client.post("/api/labels", json={"ids": ["doesnotexist"]}).status_code == 404
+    assert auth_client.post("/api/labels", json={}).status_code == 400
+    # every content is encode-checked, not just the first
+    resp = auth_client.post("/api/labels", json={"contents": ["ok", "x" * 5000]})
+    assert resp.status_code == 400 and "too long" in resp.get_json()["error"]
+    stored = auth_client.post("/api/generate", json={"content": "y" * 2300, "error_correction": "L",
+                                                     "size_px": 128}).get_json()["id"]
+    assert auth_client.post("/api/labels", json={"ids": [stored], "error_correction": "H"}).status_code == 400
+
+def test_pages_reserve_render_budget(app, monkeypatch):
+    reserved = []
+
+    @contextmanager
+    def reserve(nbytes):
+        reserved.append(nbytes)
+        yield
+
+    monkeypatch.setattr(render_budget, "reserve", reserve)
+    with app.app_context():
+        b"".join(label_sheet_pdf(_labels(5), Sheet(columns=2, rows=1, dpi=72)))
+    assert len(reserved) == 3 and all(n > 0 for n in reserved)
+
+def test_api_charges_cost_per_label(app, auth_client, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", True)
+    app.config["RATELIMIT_GENERATE_LIMIT"] = "100 per minute"
+    app.config["RATELIMIT_GENERATE_COST_LIMIT"] = "10 per minute"
+    body = {"contents": [f"code {i}" for i in range(6)], "dpi": 72}
+    assert auth_client.post("/api/labels", json=body).status_code == 200
+    assert auth_client.post("/api/labels", json=body).status_code == 429
+    # the 4 units left still admit a smaller sheet
+    assert auth_client.post("/api/labels", json=dict(body, contents=["a", "b", "c"])).status_code == 200
+
+def test_api_caps_cost_per_request(app, auth_client):
+    app.config["LABELS_MAX_COST"] = 20
+    contents = [f"code {i}" for i in range(12)]
+    assert auth_client.post("/api/labels", json={"contents": contents * 2}).status_code == 400
+    # 12 labels fit at 300 dpi (1 unit each) but not at 600 dpi (2 units each)
+    assert auth_client.post("/api/labels", json={"contents": contents}).status_code == 200
+    resp = auth_client.post("/api/labels", json={"contents": contents, "dpi": 600})
+    assert resp.status_code == 400 and "dpi" in resp.get_json()["error"]
+
+def test_cli_ids_keep_their_captions(app, auth_client, tmp_path):
+    ids = [auth_client.post("/api/generate", json={"content": f"code {i}", "size_px": 128}).get_json()["id"]
+           for i in range(2)]
+    src = tmp_path / "ids.csv"
+    src.write_text(f"id,caption\n{ids[0]},Shelf A\n{ids[1]},\n")
+    out = tmp_path / "sheet.pdf"
+    result = app.test_cli_runner().invoke(args=["label-sheet", str(src), str(out), "--ids", "--dpi", "72"])
+    assert result.exit_code == 0, result.output
+    pdf = out.read_bytes()
+    text = b"".join(zlib.decompress(m) for m in re.findall(
+        rb"obj\n<< /Filter /FlateDecode /Length \d+ >>\nstream\n(.*?)\nendstream", pdf, re.S))
+    assert b"(Shelf A) Tj" in text
+    assert b"(code 1) Tj" in text  # no caption: the stored content
+
+def test_cli_writes_pdf(app, tmp_path):
+    src = tmp_path / "codes.txt"
+    src.write_text("".join(f"https://example.com/{i}\n" for i in range(5)))
+    out = tmp_path / "sheet.pdf"
+    result = app.test_cli_runner().invoke(args=["label-sheet", str(src), str(out), "--grid", "2x2",
+                                                "--dpi", "72", "--set", "fg_color=#003366"])
+    assert result.exit_code == 0, result.output
+    assert "Wrote 2 page(s)" in result.output
+    pdf = out.read_bytes()
+    assert _check_pdf(pdf) == 2
+    assert [n for n in os.listdir(app.config["METRICS_FOLDER"]) if n != "metrics_archive.db"] == []
+    assert b"/DeviceRGB" in pdf
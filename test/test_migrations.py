@@ -0,0 +1,48 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import Migrate, upgrade
+
+from app import create_app
+from qrapp.models import db, QRCode
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "migrations")
+INITIAL = "ed28ac4c85c9"
+
+@pytest.fixture()
+def bare_app(tmp_path, monkeypatch):
+    """App over an empty database whose schema comes only from migrations."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app(instance_path=str(tmp_path / "instance"))
+    Migrate(app, db, directory=MIGRATIONS)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def test_upgrade_adds_downloads_to_existing_rows(bare_app):
+    with bare_app.app_context():
+        upgrade(directory=MIGRATIONS, revision=INITIAL)
+        with db.engine.begin() as conn:
+            conn.execute(sa.text("INSERT INTO qr_code (id, content) VALUES ('old', 'x')"))
+        upgrade(directory=MIGRATIONS)
+        inspector = sa.inspect(db.engine)
+        columns = {c["name"] for c in inspector.get_columns("qr_code")}
+        assert "downloads" in columns
+        assert "ix_qr_code_user_downloads" in {i["name"] for i in inspector.get_indexes("qr_code")}
+        with db.engine.connect() as conn:
+            assert conn.execute(sa.text("SELECT downloads FROM qr_code WHERE id = 'old'")).scalar() == 0
+
+def test_upgrade_reaches_the_model_schema(bare_app):
+    with bare_app.app_context():
+        upgrade(directory=MIGRATIONS, revision=INITIAL)
+        with db.engine.begin() as conn:
+            conn.execute(sa.text("INSERT INTO qr_code (id, content) VALUES ('old', 'x')"))
+        upgrade(directory=MIGRATIONS)
+        with db.engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), db.metadata) == []
+        old = db.session.get(QRCode, "old")
+        assert (old.slug, old.target, old.clicks) == (None, None, 0)
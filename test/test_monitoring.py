@@ -0,0 +1,78 @@
+import math
+import os
+from qrapp.models import db, User
+from qrapp.monitoring import Metrics, _MmapValues, clear_metric_files, mark_process_dead, quantile
+
+def _metric(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_quantile_interpolates_within_bucket():
+    buckets = [(0.1, 50.0), (0.2, 100.0), (math.inf, 100.0)]
+    assert quantile(0.5, buckets) == 0.1
+    assert abs(quantile(0.75, buckets) - 0.15) < 1e-9
+    assert quantile(0.5, []) is None
+
+def test_metrics_aggregate_across_process_files(tmp_path):
+    a, b = Metrics(), Metrics()
+    a.folder = b.folder = str(tmp_path)
+    a.inc("qr_codes_generated_total")
+    # simulate a second worker writing its own file
+    b._pid, b._values = os.getpid(), _MmapValues(str(tmp_path / "metrics_other.db"))
+    b.inc("qr_codes_generated_total", amount=2)
+    b.observe("http_request_duration_seconds", 0.03, {"endpoint": "qr.download"})
+
+    text = a.render_prometheus()
+    assert _metric(text, "qr_codes_generated_total ") == 3
+    assert 'http_request_duration_seconds_bucket{endpoint="qr.download",le="0.05"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="qr.download",le="+Inf"} 1' in text
+    summary = a.summary()["http_request_duration_seconds"]["endpoint=qr.download"]
+    assert summary["count"] == 1 and 0.025 <= summary["p99"] <= 0.05
+
+def test_dead_process_files_fold_into_archive(tmp_path):
+    a = Metrics()
+    a.folder = str(tmp_path)
+    for pid in (101, 102):
+        values = _MmapValues(str(tmp_path / f"metrics_{pid}.db"))
+        values.inc(a._key("qr_codes_generated_total", None), 2)
+        values.close()
+    mark_process_dead(str(tmp_path), 101)
+    mark_process_dead(str(tmp_path), 102)
+    assert sorted(os.listdir(tmp_path)) == ["metrics_archive.db"]
+    assert _metric(a.render_prometheus(), "qr_codes_generated_total ") == 4
+
+    clear_metric_files(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+def test_metrics_endpoint_exposes_prometheus_text(auth_client):
+    before = auth_client.get("/metrics").get_data(as_text=True)
+    auth_client.post("/api/generate", json={"content": "metrics", "size_px": 128})
+    text = auth_client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert _metric(text, "qr_codes_generated_total ") == _metric(before, "qr_codes_generated_total ") + 1
+    assert 'endpoint="qr.api_generate"' in text
+
+def test_metrics_summary_is_admin_only(app, auth_client):
+    assert app.test_client().get("/metrics/summary").status_code in (302, 401)
+    assert auth_client.get("/metrics/summary").status_code == 403
+    with app.app_context():
+        User.query.filter_by(username="alice").first().is_admin = True
+        db.session.commit()
+    assert "latency" in auth_client.get("/metrics/summary").get_json()
+
+def test_generate_emits_server_timing(auth_client):
+    resp = auth_client.post("/api/generate", json={"content": "timed", "size_px": 128})
+    header = resp.headers["Server-Timing"]
+    for name in ("encode", "rasterize", "resize", "png_encode", "disk_write", "db_commit", "total"):
+        assert f"{name};dur=" in header
+    text = auth_client.get("/metrics").get_data(as_text=True)
+    assert 'qr_render_stage_seconds_count{stage="encode"}' in text
+
+def test_stage_timing_can_be_disabled(auth_client, monkeypatch):
+    from qrapp.monitoring import metrics
+    monkeypatch.setattr(metrics, "stage_timing", False)
+    resp = auth_client.post("/api/generate", json={"content": "untimed", "size_px": 128})
+    assert resp.status_code == 201
+    assert "Server-Timing" not in resp.headers
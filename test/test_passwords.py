@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from werkzeug.security import generate_password_hash
+
+from bench.login_bench import run_case
+from qrapp.models import db, User
+from app import create_app
+from qrapp.passwords import HashingBusy, PasswordHasher, normalize_method, password_hasher
+
+def test_normalize_method_spells_out_werkzeug_defaults():
+    assert normalize_method("scrypt") == "scrypt:32768:8:1"
+    assert normalize_method("pbkdf2:sha512:1000") == "pbkdf2:sha512:1000"
+    assert normalize_method("pbkdf2").startswith("pbkdf2:sha256:")
+
+def test_login_rehashes_outdated_hashes(app):
+    with app.app_context():
+        user = User(username="bob", password_hash=generate_password_hash("pw123456", "pbkdf2:sha256:1000"))
+        db.session.add(user)
+        db.session.commit()
+
+    client = app.test_client()
+    assert client.post("/auth/api/login", json={"username": "bob", "password": "wrong"}).status_code == 401
+    with app.app_context():
+        assert User.query.filter_by(username="bob").one().password_hash.startswith("pbkdf2:sha256:1000$")
+
+    assert client.post("/auth/api/login", json={"username": "bob", "password": "pw123456"}).status_code == 200
+    with app.app_context():
+        stored = User.query.filter_by(username="bob").one().password_hash
+    assert stored.startswith(password_hasher.method + "$")
+    assert app.test_client().post("/auth/api/login", json={"username": "bob", "password": "pw123456"}).status_code == 200
+
+def test_overflowing_the_queue_returns_503(app, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(password_hasher, "workers", 1)
+    monkeypatch.setattr(password_hasher, "max_waiting", 0)
+    monkeypatch.setattr(password_hasher, "_files", None)
+    blocker = threading.Thread(target=password_hasher._run, args=(release.wait,))
+    blocker.start()
+    try:
+        while password_hasher._pending == 0:
+            time.sleep(0.001)
+        with app.app_context():
+            db.session.add(User(username="x", password_hash=generate_password_hash("y", "pbkdf2:sha256:1")))
+            db.session.commit()
+        resp = app.test_client().post("/auth/api/login", json={"username": "x", "password": "y"},
+                                      headers={"Accept": "application/json"})
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+    finally:
+        release.set()
+        blocker.join()
+        monkeypatch.setattr(password_hasher, "_files", None)
+
+def test_slots_are_shared_across_processes(tmp_path):
+    # Separate instances open their own lock fds, like separate workers
+    a, b = PasswordHasher(), PasswordHasher()
+    for hasher in (a, b):
+        hasher.folder, hasher.workers, hasher.wait = str(tmp_path), 1, 0.05
+    release, started = threading.Event(), threading.Event()
+    blocker = threading.Thread(target=a._run, args=(lambda: (started.set(), release.wait()),))
+    blocker.start()
+    try:
+        started.wait()
+        with pytest.raises(HashingBusy):
+            b._run(lambda: None)
+    finally:
+        release.set()
+        blocker.join()
+    assert b._run(lambda: "ok") == "ok"
+
+def test_invalid_method_fails_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "scrypt:16384")
+    with pytest.raises(ValueError, match="PASSWORD_HASH_METHOD"):
+        create_app(instance_path=str(tmp_path))
+
+def test_busy_rehash_does_not_reject_a_good_login(app, monkeypatch):
+    with app.app_context():
+        user = User(username="carol", password_hash=generate_password_hash("pw", "pbkdf2:sha256:1000"))
+        db.session.add(user)
+        db.session.commit()
+        monkeypatch.setattr(password_hasher, "hash", lambda password: (_ for _ in ()).throw(HashingBusy()))
+        assert user.check_password("pw")
+        assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+
+def test_login_bench_reports_per_core_rate():
+    r = run_case("pbkdf2:sha256:1000", threads=1, seconds=0.05)
+    assert r["method"] == "pbkdf2:sha256:1000"
+    assert r["logins_per_s"] > 0 and r["p50_ms"] <= r["p95_ms"]
@@ -0,0 +1,39 @@
+import base64
+
+from qrapp.models import QRCode
+from qrapp.qrcore import default_segments, encode
+
+def _unpack(body):
+    size = body["size"]
+    packed = base64.b64decode(body["modules"])
+    row_bytes = (size + 7) // 8
+    assert len(packed) == size * row_bytes
+    return [
+        [bool(packed[r * row_bytes + c // 8] & (0x80 >> (c % 8))) for c in range(size)]
+        for r in range(size)
+    ]
+
+def test_preview_matches_the_rendered_symbol(app, auth_client):
+    app.config["QR_OPTIMAL_SEGMENTS"] = False
+    resp = auth_client.post("/api/preview", json={"content": "https://example.com/p", "error_correction": "Q"})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    version, mask, modules, _ = encode(default_segments("https://example.com/p"), 3)  # qrcode's Q constant
+    assert (body["version"], body["mask"], body["error_correction"]) == (version, mask, "Q")
+    assert _unpack(body) == modules
+
+def test_preview_writes_nothing(app, auth_client):
+    auth_client.post("/api/preview", json={"content": "hello"})
+    with app.app_context():
+        assert QRCode.query.count() == 0
+
+def test_logo_upgrades_error_correction(auth_client):
+    assert auth_client.post("/api/preview", json={"content": "x", "logo": True}).get_json()["error_correction"] == "Q"
+
+def test_preview_rejects_bad_input(auth_client):
+    assert auth_client.post("/api/preview", json={"content": " "}).status_code == 400
+    assert auth_client.post("/api/preview", json={"content": "x", "error_correction": "Z"}).status_code == 400
+    assert auth_client.post("/api/preview", json={"content": "x" * 8000}).status_code == 400
+
+def test_preview_requires_login(app):
+    assert app.test_client().post("/api/preview", json={"content": "x"}).status_code in (302, 401)
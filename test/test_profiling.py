@@ -0,0 +1,36 @@
+from qrapp.models import db, User
+
+def _make_admin(app):
+    with app.app_context():
+        User.query.filter_by(username="alice").first().is_admin = True
+        db.session.commit()
+
+def test_token_header_profiles_request(app, auth_client):
+    app.config["PROFILE_TOKEN"] = "s3cret"
+    resp = auth_client.get("/api/dashboard", headers={"X-Profile": "s3cret"})
+    name = resp.headers["X-Profile-Id"]
+
+    assert "X-Profile-Id" not in auth_client.get("/api/dashboard", headers={"X-Profile": "wrong"}).headers
+
+    assert auth_client.get("/admin/profiles").status_code == 403
+    _make_admin(app)
+    listed = auth_client.get("/admin/profiles").get_json()["profiles"]
+    assert f"{name}.prof" in [p["name"] for p in listed]
+
+    text = auth_client.get(f"/admin/profiles/{name}.prof?format=text")
+    assert text.status_code == 200
+    assert "function calls" in text.get_data(as_text=True)
+    assert auth_client.get("/admin/profiles/..%2Fapp.db").status_code == 404
+
+def test_tracemalloc_runs_only_during_profile(app, auth_client):
+    import os
+    import tracemalloc
+    app.config.update(PROFILE_TOKEN="s3cret", PROFILE_TRACEMALLOC=True, PROFILE_KEEP=2)
+    for _ in range(3):
+        resp = auth_client.get("/api/dashboard", headers={"X-Profile": "s3cret"})
+        assert not tracemalloc.is_tracing()
+    name = resp.headers["X-Profile-Id"]
+    files = os.listdir(app.config["PROFILE_FOLDER"])
+    # two profiles kept, each with its allocation diff
+    assert len(files) == 4
+    assert {f"{name}.prof", f"{name}.mem.txt"} <= set(files)
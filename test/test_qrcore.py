@@ -0,0 +1,61 @@
+import random
+import pytest
+import qrcode
+from qrcode.exceptions import DataOverflowError
+from qrapp.qrcore import make_qr, default_segments, rs_remainder
+from qrapp.utils import generate_qr_png
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_/:.%"
+
+def _content(length, seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(ALPHABET) for _ in range(length))
+    # long digit / uppercase runs make qrcode split into several segments
+    return text[:10] + "12345678901234567890123" + "HTTPS://EXAMPLE.COM/ABCDEFGH" + text[10:]
+
+def _reference(data, ec):
+    qr = qrcode.QRCode(error_correction=ec)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+@pytest.mark.parametrize("ec", [0, 1, 2, 3])
+@pytest.mark.parametrize("length", [1, 40, 180, 500, 1100])
+def test_modules_are_bit_identical_to_qrcode(ec, length):
+    data = _content(length, seed=length * 4 + ec)
+    try:
+        ref = _reference(data, ec)
+    except (DataOverflowError, ValueError):
+        with pytest.raises(DataOverflowError):
+            make_qr(default_segments(data), ec)
+        return
+    ours = make_qr(default_segments(data), ec)
+    assert ours.version == ref.version
+    assert ours.data_cache == ref.data_cache
+    assert ours.modules == ref.modules
+
+def test_highest_version_is_bit_identical():
+    data = _content(2850, seed=40)
+    ref = _reference(data, 1)  # ERROR_CORRECT_L
+    assert ref.version == 40
+    assert make_qr(default_segments(data), 1).modules == ref.modules
+
+def test_rs_remainder_matches_known_vector():
+    # ISO/IEC 18004 annex example: "01234567" 1-M
+    data = [16, 32, 12, 86, 97, 128, 236, 17, 236, 17, 236, 17, 236, 17, 236, 17]
+    assert rs_remainder(data, 10) == [165, 36, 212, 193, 237, 54, 199, 135, 44, 85]
+
+def test_rendered_image_matches_qrcode_encoder(app):
+    kwargs = dict(data="https://example.com/encoder", size_px=256, error_correction="M",
+                  fg="#000000", bg="#FFFFFF", box_size=10, border=4, rounded_ratio=0.0)
+    app.config["QR_OPTIMAL_SEGMENTS"] = False  # qrcode's own segmentation
+    with app.test_request_context("/"):
+        native = generate_qr_png(**kwargs)
+        app.config["NATIVE_ENCODER_ENABLED"] = False
+        reference = generate_qr_png(**kwargs)
+    assert native.tobytes() == reference.tobytes()
+
+def test_too_long_content_is_a_validation_error(app):
+    with app.test_request_context("/"), pytest.raises(ValueError):
+        generate_qr_png(data="x" * 5000, size_px=128, error_correction="H", fg="#000000",
+                        bg="#FFFFFF", box_size=10, border=4, rounded_ratio=0.0)
@@ -0,0 +1,32 @@
+from flask import Flask
+from bench.render_bench import build_cases, case_id, compare, run_case
+
+def test_sweep_covers_every_axis_value():
+    ids = {case_id(c) for c in build_cases(grid=False)}
+    assert any("size=4096" in i for i in ids)
+    assert any("logo=30" in i for i in ids)
+    assert any("ec=H" in i for i in ids)
+    assert any("style=circle+gradient" in i for i in ids)
+    assert any("frame=neon" in i for i in ids)
+    # default style/frame keep the ids of older saved baselines
+    assert "len=64,ec=M,size=512,rounded=0.0,logo=0" in ids
+
+def test_styled_and_framed_cases_render():
+    with Flask(__name__).app_context():
+        for style, frame in (("circle+gradient", "none"), ("plain", "neon")):
+            case = dict(content_len=16, ec="L", size_px=128, rounded=0.0, logo=0, style=style, frame=frame)
+            r = run_case(case, logo_path=None, min_time=0.0, min_runs=1, memory=False)
+            assert r["runs"] >= 1
+
+def test_run_case_reports_latency_distribution():
+    with Flask(__name__).app_context():
+        r = run_case(dict(content_len=16, ec="L", size_px=128, rounded=0.0, logo=0),
+                     logo_path=None, min_time=0.0, min_runs=3, memory=False)
+    assert r["runs"] >= 3 and r["ops_per_sec"] > 0
+    assert r["p50_ms"] <= r["p99_ms"]
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"cases": {"a": {"p50_ms": 10.0}, "b": {"p50_ms": 10.0}}}
+    current = {"cases": {"a": {"p50_ms": 10.5}, "b": {"p50_ms": 13.0}}}
+    regressions = compare(current, baseline, threshold=0.10)
+    assert len(regressions) == 1 and regressions[0].startswith("b:")
@@ -0,0 +1,52 @@
+from qrcode import util
+from qrapp.qrcore import make_qr, segment_bits
+from qrapp.segmentation import plan_segments, optimal_segments, uppercase_url_host
+
+EC_M = 0
+
+def _decode(segments):
+    out = []
+    for s in segments:
+        out.append(s.data.decode("shift_jis" if s.mode == util.MODE_KANJI else "utf-8"))
+    return "".join(out)
+
+def test_segments_round_trip_the_text():
+    text = "Order 4006381333931 qty 12 ABC-123 点茗 https://example.com/x?id=0042"
+    segments, _ = optimal_segments(text, EC_M)
+    assert _decode(segments) == text
+    modes = {s.mode for s in segments}
+    assert {util.MODE_NUMBER, util.MODE_8BIT_BYTE, util.MODE_KANJI} <= modes
+
+def test_digit_heavy_content_shrinks_the_version():
+    # digit runs shorter than the 20 qrcode needs before it splits them off
+    text = "id=" + "1234567890123456789x" * 5
+    plan = plan_segments(text, EC_M)
+    assert plan.version < plan.default_version
+    assert plan.modules_saved == (plan.default_version * 4 + 17) ** 2 - (plan.version * 4 + 17) ** 2
+    assert make_qr(plan.segments, EC_M).version == plan.version
+
+def test_never_worse_than_default_split():
+    for text in ["a", "hello world", "https://example.com/path?q=1", "X" * 300, "é" * 50]:
+        plan = plan_segments(text, EC_M)
+        assert plan.version <= plan.default_version
+
+def test_kanji_mode_packs_13_bits_per_character():
+    segments, _ = optimal_segments("点茗", EC_M)
+    assert [s.mode for s in segments] == [util.MODE_KANJI]
+    # ISO/IEC 18004 example: 0x935F -> 0x0D9F, 0xE4AA -> 0x1AAA
+    assert segment_bits(segments[0]) == ((0x0D9F << 13) | 0x1AAA, 26)
+
+def test_greek_and_cyrillic_stay_in_byte_mode():
+    # both map into Shift JIS, but scanners outside Japan misread them as Kanji
+    for text in ("Καλημέρα κόσμε", "Привет, мир", "点茗 и Ω"):
+        segments, _ = optimal_segments(text, EC_M)
+        assert _decode(segments) == text
+        kanji = "".join(s.data.decode("shift_jis") for s in segments if s.mode == util.MODE_KANJI)
+        assert set(kanji) <= set("点茗")
+
+def test_uppercase_url_host_only_touches_scheme_and_host():
+    assert uppercase_url_host("https://example.com/Path?Q=a") == "HTTPS://EXAMPLE.COM/Path?Q=a"
+    assert uppercase_url_host("mailto:someone@example.com") == "mailto:someone@example.com"
+    assert uppercase_url_host("https://user@example.com/") == "https://user@example.com/"
+    plan = plan_segments("https://www.example.com/a", EC_M, uppercase_url=True)
+    assert _decode(plan.segments).startswith("HTTPS://WWW.EXAMPLE.COM")
@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from qrapp.singleflight import SingleFlight, shared_across_workers
+from qrapp import utils
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return b"png"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+
+    assert calls == [1]
+    assert sorted(shared for _, shared in results) == [False] + [True] * 5
+    assert all(r == b"png" for r, _ in results)
+    # nothing is cached after the flight lands
+    assert flight.do("k", lambda: b"new") == (b"new", False)
+
+def test_errors_propagate_and_clear_the_flight():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: 1) == (1, False)
+
+def test_cross_worker_share_reuses_published_bytes(tmp_path):
+    calls = []
+    render = lambda: calls.append(1) or b"bytes"
+    assert shared_across_workers(str(tmp_path), "abc", 10, render) == (b"bytes", False)
+    assert shared_across_workers(str(tmp_path), "abc", 10, render) == (b"bytes", True)
+    assert calls == [1]
+
+def test_identical_generate_requests_render_once(app, auth_client, monkeypatch):
+    renders = []
+    original = utils.generate_qr_png
+
+    def slow_render(**kwargs):
+        renders.append(1)
+        time.sleep(0.2)
+        return original(**kwargs)
+
+    monkeypatch.setattr(utils, "generate_qr_png", slow_render)
+    payload = {"content": "campaign", "size_px": 128}
+    clients = [auth_client] + [app.test_client() for _ in range(3)]
+    for i, c in enumerate(clients[1:]):
+        c.post("/auth/api/register", json={"username": f"user{i}", "password": "secret123"})
+
+    statuses = []
+    threads = [threading.Thread(target=lambda c=c: statuses.append(c.post("/api/generate", json=payload).status_code))
+               for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [201] * 4
+    assert len(renders) < 4
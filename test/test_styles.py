@@ -0,0 +1,60 @@
+import io
+
+from PIL import Image
+from qrapp.qrcore import default_segments, make_qr, rasterize_mask
+from qrapp.styles import styled_mask, gradient_fill
+
+TEXT = "https://example.com/styles"
+
+def _modules():
+    return make_qr(default_segments(TEXT), 0, box_size=10, border=4).modules
+
+def test_square_styles_match_plain_raster():
+    modules = _modules()
+    plain = rasterize_mask(modules, 10, 4)
+    styled = styled_mask(modules, 10, 4, "square", "square")
+    assert styled.tobytes() == plain.tobytes()
+
+def test_shaped_modules_keep_size_and_leave_gaps():
+    modules = _modules()
+    plain = rasterize_mask(modules, 10, 4)
+    for pattern, eye in [("circle", "square"), ("rounded", "circle"), ("square", "rounded")]:
+        img = styled_mask(modules, 10, 4, pattern, eye)
+        assert img.mode == "L" and img.size == plain.size
+        # shaping only ever removes ink
+        dark = sum(img.histogram()[:128])
+        assert 0 < dark < sum(plain.histogram()[:128])
+
+def test_eye_style_keeps_rounded_modules(app):
+    from qrapp.utils import generate_qr_png
+    kwargs = dict(data=TEXT, size_px=0, error_correction="M", fg="#000000", bg="#FFFFFF",
+                  box_size=10, border=4, eye_style="circle")
+    with app.app_context():
+        rounded = generate_qr_png(rounded_ratio=0.4, **kwargs).convert("L")
+        square = generate_qr_png(rounded_ratio=0.0, **kwargs).convert("L")
+    assert rounded.size == square.size
+    assert rounded.tobytes() != square.tobytes()
+    # rounding only removes ink from the square modules
+    assert sum(rounded.histogram()[:128]) < sum(square.histogram()[:128])
+
+def test_gradient_runs_from_start_to_end():
+    fill = gradient_fill((100, 20), "#ff0000", "#0000ff", "horizontal")
+    assert fill.getpixel((0, 10))[0] > 240 and fill.getpixel((99, 10))[2] > 240
+    fill = gradient_fill((20, 100), "#ff0000", "#0000ff", "vertical")
+    assert fill.getpixel((10, 0))[0] > 240 and fill.getpixel((10, 99))[2] > 240
+
+def test_api_accepts_style_fields(auth_client):
+    resp = auth_client.post("/api/generate", json={
+        "content": TEXT, "size_px": 256, "pattern_style": "circle", "eye_style": "rounded",
+        "gradient_enabled": True, "gradient_start": "#ff0000", "gradient_end": "#0000ff",
+        "gradient_direction": "diagonal",
+    })
+    assert resp.status_code == 201
+    png = auth_client.get(resp.get_json()["download_url"]).data
+    img = Image.open(io.BytesIO(png))
+    assert img.mode == "RGB" and img.size == (256, 256)
+
+def test_bad_gradient_color_is_rejected(auth_client):
+    resp = auth_client.post("/api/generate", json={
+        "content": TEXT, "gradient_enabled": "true", "gradient_start": "red"})
+    assert resp.status_code == 400
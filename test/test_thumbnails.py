@@ -0,0 +1,47 @@
+import io
+import os
+
+from PIL import Image
+
+THUMB_URL = "https://example.com/thumb"
+
+def test_thumbnail_is_small_cached_and_immutable(app, auth_client, generate):
+    qid = generate(auth_client, THUMB_URL, size_px=1024)
+    resp = auth_client.get(f"/thumb/{qid}")
+    assert resp.status_code == 200
+    assert "immutable" in resp.headers["Cache-Control"]
+    img = Image.open(io.BytesIO(resp.data))
+    assert img.size == (128, 128) and img.mode == "P"
+    assert os.path.isfile(os.path.join(app.config["GENERATED_FOLDER"], f"{qid}.thumb128.png"))
+    assert auth_client.get(f"/thumb/{qid}?s=256").status_code == 200
+    # unknown sizes fall back to the default rendition
+    assert Image.open(io.BytesIO(auth_client.get(f"/thumb/{qid}?s=999").data)).size == (128, 128)
+
+def test_history_apis_return_thumbnail_urls(auth_client, generate):
+    qid = generate(auth_client, THUMB_URL, size_px=256)
+    for url in ("/api/qr/user", "/api/dashboard", "/api/qr/search?q=thumb"):
+        qrs = auth_client.get(url).get_json()["qrs"]
+        assert qrs[0]["thumbnail_url"] == f"/thumb/{qid}"
+
+def test_missing_code_and_deleted_thumbnails(app, auth_client, generate):
+    assert auth_client.get("/thumb/0123456789abcdef").status_code == 404
+    qid = generate(auth_client, THUMB_URL, size_px=256)
+    auth_client.get(f"/thumb/{qid}")
+    assert auth_client.delete(f"/api/qr/{qid}").status_code == 200
+    from qrapp.tasks import background
+    background.join()
+    assert not os.path.exists(os.path.join(app.config["GENERATED_FOLDER"], f"{qid}.thumb128.png"))
+
+def test_concurrent_first_hits_in_one_worker(app, auth_client, generate):
+    from concurrent.futures import ThreadPoolExecutor
+    from qrapp.utils import ensure_thumbnail
+    qid = generate(auth_client, THUMB_URL, size_px=1024)
+
+    def first_hit(_):
+        with app.app_context():
+            return ensure_thumbnail(qid, 256)
+
+    with ThreadPoolExecutor(8) as pool:
+        paths = list(pool.map(first_hit, range(8)))
+    assert len(set(paths)) == 1 and os.path.isfile(paths[0])
+    assert not [f for f in os.listdir(app.config["GENERATED_FOLDER"]) if f.endswith(".tmp")]
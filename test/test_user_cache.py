@@ -0,0 +1,36 @@
+from sqlalchemy import event
+from qrapp.models import db, User
+from qrapp.user_cache import user_cache
+
+def _count_user_selects(app):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    def before(conn, cursor, statement, params, context, executemany):
+        if "FROM user" in statement:
+            statements.append(statement)
+    event.listen(engine, "before_cursor_execute", before)
+    return statements
+
+def test_user_loader_is_cached(app, auth_client):
+    selects = _count_user_selects(app)
+    auth_client.get("/auth/api/user")
+    auth_client.get("/auth/api/user")
+    assert len(selects) <= 1
+
+def test_user_update_invalidates_cache(app, auth_client):
+    assert auth_client.get("/auth/api/user").get_json()["user"]["isAdmin"] is False
+    with app.app_context():
+        user = User.query.filter_by(username="alice").first()
+        user.is_admin = True
+        db.session.commit()
+    assert auth_client.get("/auth/api/user").get_json()["user"]["isAdmin"] is True
+
+def test_session_fastpath_skips_db(app, auth_client, monkeypatch):
+    monkeypatch.setattr(user_cache, "session_fastpath", True)
+    auth_client.get("/auth/api/user")  # stores the record in the session
+    user_cache.clear()
+    selects = _count_user_selects(app)
+    resp = auth_client.get("/auth/api/user")
+    assert resp.get_json()["user"]["username"] == "alice"
+    assert selects == []
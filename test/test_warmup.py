@@ -0,0 +1,15 @@
+import gc
+from qrapp.warmup import warmup, WARMUP_CASES
+
+def test_warmup_renders_cases_and_freezes_gc(app, monkeypatch):
+    frozen = []
+    monkeypatch.setattr(gc, "freeze", lambda: frozen.append(True))
+    assert warmup(app) > 0
+    assert frozen == [True]
+    assert any(c["rounded_ratio"] for c in WARMUP_CASES) and any(c["logo"] for c in WARMUP_CASES)
+
+def test_styled_drawers_are_not_imported_eagerly():
+    import subprocess, sys
+    code = "import sys, qrapp.utils; print('qrcode.image.styledpil' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"